@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+乱打の和音選択: 候補表方式と従来方式（レーンのリストを毎回組み立てる）の比較
+- 全パターン設定で和音・遷移（前の和音→次の和音）の出現分布の差（全変動距離）を表示
+- 1和音あたりの選択時間を計測
+"""
+import random
+import time
+from collections import Counter
+
+from generate_random_bmson import PATTERN_CONFIGS
+from random_patterns import RandomPatternGenerator, chord_mask
+
+
+def legacy_next_chord(rng, chord_sizes, recent_notes):
+    """従来方式の和音選択（RandomPatternGenerator.generate_notesの旧実装）"""
+    chord_size = rng.choice(chord_sizes)
+
+    if recent_notes:
+        prev_chord_size = len(recent_notes[-1])
+        total_size = prev_chord_size + chord_size
+        allowed_repeat = max(0, total_size - 6)
+    else:
+        allowed_repeat = 0
+
+    available_lanes = list(range(1, 8))
+
+    if recent_notes:
+        last_chord = recent_notes[-1]
+        if allowed_repeat == 0:
+            forbidden_lanes = last_chord
+        else:
+            if len(last_chord) > allowed_repeat:
+                allowed_lanes = rng.sample(last_chord, allowed_repeat)
+                forbidden_lanes = [lane for lane in last_chord if lane not in allowed_lanes]
+            else:
+                forbidden_lanes = []
+        available_lanes = [lane for lane in available_lanes if lane not in forbidden_lanes]
+
+    if len(available_lanes) >= chord_size:
+        selected_lanes = rng.sample(available_lanes, chord_size)
+    else:
+        selected_lanes = rng.sample(range(1, 8), chord_size)
+
+    recent_notes.append(selected_lanes)
+    if len(recent_notes) > 1:
+        recent_notes.pop(0)
+    return selected_lanes
+
+
+def run_legacy(chord_sizes, steps, seed):
+    rng = random.Random(seed)
+    recent_notes = []
+    return [chord_mask(legacy_next_chord(rng, chord_sizes, recent_notes)) for _ in range(steps)]
+
+
+def run_table(chord_sizes, steps, seed):
+    generator = RandomPatternGenerator(chord_sizes, random.Random(seed))
+    return [generator.next_chord() for _ in range(steps)]
+
+
+def transition_counts(chords):
+    """(前の和音, 次の和音) の出現回数"""
+    return Counter(zip(chords, chords[1:]))
+
+
+def overlap_counts(transitions):
+    """縦連数（前の和音と重なるレーン数）の出現回数"""
+    counts = Counter()
+    for (prev, chord), count in transitions.items():
+        counts[bin(prev & chord).count("1")] += count
+    return counts
+
+
+def total_variation(a, b):
+    """2つの出現回数の分布の全変動距離"""
+    total_a = sum(a.values())
+    total_b = sum(b.values())
+    return 0.5 * sum(abs(a[key] / total_a - b[key] / total_b) for key in set(a) | set(b))
+
+
+def main(steps=200000):
+    print(f"和音選択 {steps}回の比較\n")
+    for chord_sizes, pattern_name, _ in PATTERN_CONFIGS:
+        start = time.perf_counter()
+        legacy = run_legacy(chord_sizes, steps, 1)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        table = run_table(chord_sizes, steps, 2)
+        table_time = time.perf_counter() - start
+
+        legacy_transitions = transition_counts(legacy)
+        table_transitions = transition_counts(table)
+        chord_tv = total_variation(Counter(legacy), Counter(table))
+        transition_tv = total_variation(legacy_transitions, table_transitions)
+        overlap_tv = total_variation(overlap_counts(legacy_transitions), overlap_counts(table_transitions))
+        print(f"=== {pattern_name} ===")
+        print(f"  従来: {legacy_time / steps * 1e6:.2f}us/和音  候補表: {table_time / steps * 1e6:.2f}us/和音"
+              f"  ({legacy_time / table_time:.1f}倍)")
+        print(f"  分布の差 和音: {chord_tv:.4f}  遷移: {transition_tv:.4f}  縦連数: {overlap_tv:.4f}")
+
+
+if __name__ == "__main__":
+    main()
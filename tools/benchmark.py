@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+生成処理のベンチマーク
+各段階（トリル・階段・乱打の生成、ゴミノート、JSON書き出し、全譜面ビルド）の
+ノート数/秒とピークメモリをBPM・長さ毎に計測してJSONに保存し、
+保存済みのベースラインと比較して性能の劣化を検出する
+
+  python benchmark.py run --output bench.json
+  python benchmark.py compare baseline.json bench.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bmson_writer import write_bmson
+from build_all import build, list_jobs
+from chart_data import NoteColumns
+from generate_bmson import create_bmson
+from generate_random_bmson import PATTERN_CONFIGS
+from generate_stair_bmson import stair_measure_count
+from random_patterns import RandomPatternGenerator
+from stair_patterns import StairPatternGenerator
+from trash_layer import np, place_trash
+from trill_patterns import generate_bmson_notes
+
+# (BPM, 長さ（分）) の組
+SIZES = [(120, 2), (240, 2), (240, 10)]
+QUICK_SIZES = [(240, 2)]
+
+# 劣化とみなす変化率の既定値
+DEFAULT_THRESHOLD = 0.2
+
+
+def _count_notes(result):
+    """生成結果のノート数（NoteColumnsのタプルまたはNoteColumns）"""
+    if isinstance(result, NoteColumns):
+        return len(result)
+    return sum(len(part) for part in result if isinstance(part, NoteColumns))
+
+
+def measure(func, repeat=3):
+    """func() を repeat 回実行し、(最短時間, ノート数, ピークメモリ（バイト）) を返す
+
+    時間はtracemallocなしで計り、ピークメモリは別の1回で計る
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+        del result
+
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    notes = _count_notes(result) if result is not None else 0
+    return best, notes, peak
+
+
+def stage_cases(sizes):
+    """(段階名, パラメータ, 計測する関数, 処理するノート数) を列挙
+
+    処理するノート数がNoneなら関数の戻り値のノート数を使う
+    """
+    for bpm, minutes in sizes:
+        params = {"bpm": bpm, "minutes": minutes}
+
+        yield "trill", dict(params, vectorized=False), lambda: generate_bmson_notes(
+            bpm, minutes, vectorized=False, rng=random.Random(0)), None
+        if np is not None:
+            yield "trill", dict(params, vectorized=True), lambda: generate_bmson_notes(
+                bpm, minutes, vectorized=True, rng=random.Random(0)), None
+
+        total_measures = stair_measure_count(bpm, minutes)
+        yield "stair", params, lambda: NoteColumns(
+            *StairPatternGenerator(rng=random.Random(0)).generate_measures(total_measures)), None
+
+        for chord_sizes, _, suffix in PATTERN_CONFIGS:
+            yield "random", dict(params, pattern=suffix), lambda chord_sizes=chord_sizes: (
+                RandomPatternGenerator(chord_sizes, random.Random(0)).generate_notes(bpm, minutes)), None
+
+        # ゴミノートは基本譜面（トリル）のノート数あたりで計る
+        base, _, _ = generate_bmson_notes(bpm, minutes, rng=random.Random(0))
+        for trash_type in ("4th", "8th"):
+            for vectorized in ([False, True] if np is not None else [False]):
+                yield "trash", dict(params, trash_type=trash_type, vectorized=vectorized), (
+                    lambda trash_type=trash_type, vectorized=vectorized, base=base:
+                    place_trash(base, trash_type, random.Random(0), vectorized=vectorized)), len(base)
+
+        bmson = create_bmson(bpm, include_scratch=True, include_trash=True, seed=0, duration_minutes=minutes)
+        notes = sum(len(channel["notes"]) for channel in bmson["sound_channels"])
+        for compact in (True, False):
+            def write(bmson=bmson, compact=compact):
+                write_bmson(io.StringIO(), bmson, compact)
+            yield "write", dict(params, compact=compact), write, notes
+
+
+def run_stage(name, params, func, notes, repeat):
+    """1段階を計測した結果"""
+    seconds, result_notes, peak = measure(func, repeat)
+    notes = result_notes if notes is None else notes
+    return {
+        "stage": name,
+        "params": params,
+        "notes": notes,
+        "seconds": seconds,
+        "notes_per_sec": notes / seconds if seconds > 0 else 0.0,
+        "peak_bytes": peak,
+    }
+
+
+def run_build(workers=None):
+    """全譜面を一時ディレクトリに強制ビルドした時間"""
+    jobs = list_jobs()
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        stdout = sys.stdout
+        sys.stdout = io.StringIO()
+        try:
+            build(jobs, output_dir, workers, seed=0, force=True, sound_mode=None)
+        finally:
+            sys.stdout = stdout
+        seconds = time.perf_counter() - start
+    return {
+        "stage": "build",
+        "params": {"charts": len(jobs), "workers": workers or os.cpu_count()},
+        "notes": len(jobs),
+        "seconds": seconds,
+        "notes_per_sec": len(jobs) / seconds,
+        "peak_bytes": None,
+    }
+
+
+def result_key(result):
+    """比較用の結果の識別子"""
+    params = ",".join(f"{key}={value}" for key, value in sorted(result["params"].items()))
+    return f"{result['stage']}[{params}]"
+
+
+def run(sizes, repeat=3, include_build=True, stages=None):
+    """全段階を計測し、実行環境の情報と結果を返す"""
+    results = []
+    for name, params, func, notes in stage_cases(sizes):
+        if stages and name not in stages:
+            continue
+        result = run_stage(name, params, func, notes, repeat)
+        results.append(result)
+        print(f"{result_key(result)}: {result['notes_per_sec']:,.0f} notes/sec, "
+              f"peak {result['peak_bytes'] / 1024:,.0f} KB", file=sys.stderr)
+    if include_build and (not stages or "build" in stages):
+        result = run_build()
+        results.append(result)
+        print(f"{result_key(result)}: {result['seconds']:.2f}s "
+              f"({result['notes_per_sec']:.1f} charts/sec)", file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": np.__version__ if np is not None else None,
+            "cpu_count": os.cpu_count(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """ベースラインとの比較
+
+    戻り値: (識別子, 指標, ベースラインの値, 今回の値, 変化率) のうち
+    スループットが threshold 以上低下、またはピークメモリが threshold 以上増加したもの
+    """
+    base_results = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        key = result_key(result)
+        base = base_results.get(key)
+        if base is None:
+            continue
+        if base["notes_per_sec"] > 0:
+            change = result["notes_per_sec"] / base["notes_per_sec"] - 1
+            if change <= -threshold:
+                regressions.append((key, "notes_per_sec", base["notes_per_sec"], result["notes_per_sec"], change))
+        if base.get("peak_bytes") and result.get("peak_bytes") is not None:
+            change = result["peak_bytes"] / base["peak_bytes"] - 1
+            if change >= threshold:
+                regressions.append((key, "peak_bytes", base["peak_bytes"], result["peak_bytes"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成処理のベンチマーク")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="計測してJSONに保存")
+    run_parser.add_argument("--output", help="結果の出力先（省略時は標準出力）")
+    run_parser.add_argument("--quick", action="store_true", help="BPM240・2分のみ計測")
+    run_parser.add_argument("--repeat", type=int, default=3, help="時間計測の繰り返し回数（最短を採用）")
+    run_parser.add_argument("--stage", action="append",
+                            choices=["trill", "stair", "random", "trash", "write", "build"],
+                            help="計測する段階（複数指定可、省略時は全て）")
+    run_parser.add_argument("--no-build", action="store_true", help="全譜面ビルドを計測しない")
+
+    compare_parser = commands.add_parser("compare", help="ベースラインと比較")
+    compare_parser.add_argument("baseline", help="ベースラインの結果")
+    compare_parser.add_argument("current", help="今回の結果")
+    compare_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                                help="劣化とみなす変化率（0.2で20%%）")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(QUICK_SIZES if args.quick else SIZES, args.repeat, not args.no_build, args.stage)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        else:
+            json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+            print()
+        return
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    for key, metric, base_value, value, change in regressions:
+        print(f"REGRESSION {key} {metric}: {base_value:,.0f} -> {value:,.0f} ({change:+.0%})")
+    print(f"{len(regressions)} regressions (threshold {args.threshold:.0%})")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+BMSONの遅延読み込み
+ファイルをメモリマップし、最上位のキーの位置だけを走査して
+info は開いた時点で、sound_channels の各ノート配列は要求されたときに
+列指向の NoteColumns へ変換する（要求されないチャンネルは変換しない）
+ノートが x, y, l, c の順のBMSON（bmson_writer の compact / pretty 形式など）は
+空白を除いた骨格を確かめてから数値だけを切り出し、それ以外の書き方は json で読む
+
+  with BmsonReader(path) as reader:
+      reader.info["init_bpm"]
+      for name, notes in reader.channels(["handclap.wav"]):
+          ...
+"""
+import json
+import mmap
+import re
+
+from chart_data import NoteColumns
+
+_WHITESPACE = re.compile(rb'\s*')
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"')
+_SCALAR = re.compile(rb'[^,}\]\s]+')
+_CONTAINER_TOKEN = re.compile(rb'["\[\]{}]')
+
+_JSON_WHITESPACE = b' \t\r\n'
+_DIGITS = b'-0123456789'
+# 数値を除いたノート1つの骨格
+_NOTE_SKELETON = b'{"x":,"y":,"l":,"c":}'
+# 数値以外を空白にする変換表
+_NUMBERS_ONLY = bytes(code if code in _DIGITS else 0x20 for code in range(256))
+
+
+class BmsonFormatError(ValueError):
+    """BMSONとして読めないファイル"""
+
+
+def _skip_whitespace(buf, pos):
+    return _WHITESPACE.match(buf, pos).end()
+
+
+def _expect(buf, pos, char):
+    """空白の後に char があることを確かめ、その次の位置を返す"""
+    pos = _skip_whitespace(buf, pos)
+    if buf[pos:pos + 1] != char:
+        raise BmsonFormatError(f"expected {char.decode()} at byte {pos}")
+    return pos + 1
+
+
+def _value_end(buf, pos):
+    """pos から始まるJSONの値の終わりの位置"""
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        return _STRING.match(buf, pos).end()
+    if first not in (b'{', b'['):
+        match = _SCALAR.match(buf, pos)
+        if match is None:
+            raise BmsonFormatError(f"expected a value at byte {pos}")
+        return match.end()
+    depth = 0
+    while True:
+        token = _CONTAINER_TOKEN.search(buf, pos)
+        if token is None:
+            raise BmsonFormatError("unterminated value")
+        char = token.group()
+        if char == b'"':
+            pos = _STRING.match(buf, token.start()).end()
+            continue
+        pos = token.end()
+        depth += 1 if char in (b'{', b'[') else -1
+        if depth == 0:
+            return pos
+
+
+def _members(buf, pos, value_end):
+    """pos のオブジェクトの [(キー, 値の開始, 値の終わり), ...] とオブジェクトの終わりの位置
+
+    value_end(buf, 値の開始, キー) で値の終わりを求める
+    """
+    members = []
+    pos = _skip_whitespace(buf, _expect(buf, pos, b'{'))
+    if buf[pos:pos + 1] == b'}':
+        return members, pos + 1
+    while True:
+        match = _STRING.match(buf, pos)
+        if match is None:
+            raise BmsonFormatError(f"expected a key at byte {pos}")
+        key = json.loads(match.group())
+        start = _skip_whitespace(buf, _expect(buf, match.end(), b':'))
+        end = value_end(buf, start, key)
+        members.append((key, start, end))
+        pos = _skip_whitespace(buf, end)
+        if buf[pos:pos + 1] == b'}':
+            return members, pos + 1
+        pos = _skip_whitespace(buf, _expect(buf, pos, b','))
+
+
+def _member_end(buf, pos, key):
+    """チャンネルのメンバーの値の終わり
+
+    ノートは数値と真偽値だけを持つため、ノート配列は次の ] までを1回の検索で読み飛ばす
+    （途中に [ があれば通常の走査）
+    """
+    if key == "notes" and buf[pos:pos + 1] == b'[':
+        end = buf.find(b']', pos) + 1
+        if end and buf.find(b'[', pos + 1, end) == -1:
+            return end
+    return _value_end(buf, pos)
+
+
+def parse_notes(data):
+    """ノート配列のJSON（バイト列）を NoteColumns に変換"""
+    compact = data.translate(None, _JSON_WHITESPACE)
+    count = compact.count(b'{')
+    skeleton = compact.translate(None, _DIGITS).replace(b'true', b'').replace(b'false', b'')
+    if skeleton != b'[' + b','.join([_NOTE_SKELETON] * count) + b']':
+        # キーの順序や種類が違うノートがあれば通常のJSONとして読む
+        return NoteColumns.from_notes(json.loads(data))
+    # 数値だけを並べ直したJSON配列として一度に整数へ変換
+    values = compact.replace(b'true', b'1').replace(b'false', b'0').translate(_NUMBERS_ONLY).split()
+    values = json.loads(b'[' + b','.join(values) + b']')
+    return NoteColumns(values[0::4], values[1::4], values[2::4], values[3::4])
+
+
+class LazyChannel:
+    """1サウンドチャンネル（ノート配列はファイル上の位置だけを持つ）"""
+    __slots__ = ("reader", "name", "start", "end")
+
+    def __init__(self, reader, name, start, end):
+        self.reader = reader
+        self.name = name
+        self.start = start
+        self.end = end
+
+    @property
+    def size(self):
+        """ノート配列のバイト数"""
+        return self.end - self.start
+
+    def notes(self):
+        """ノート配列を NoteColumns に変換"""
+        return parse_notes(self.reader._buf[self.start:self.end])
+
+
+class BmsonReader:
+    """メモリマップしたBMSONファイル
+
+    info: 開いた時点で読み込んだinfo
+    sound_channels: LazyChannelのリスト
+    reader["bpm_events"] など他の最上位のキーは参照時に読み込む
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空のファイルはメモリマップできない
+            self._file.close()
+            raise BmsonFormatError(f"empty file: {path}")
+        try:
+            self._spans = {}
+            self.sound_channels = []
+            for key, start, end in _members(self._buf, 0, self._top_level_end)[0]:
+                self._spans[key] = (start, end)
+            self.info = self["info"] if "info" in self._spans else {}
+        except BaseException:
+            self.close()
+            raise
+
+    def _top_level_end(self, buf, pos, key):
+        if key != "sound_channels":
+            return _value_end(buf, pos)
+        # チャンネル毎の name と notes の位置を記録
+        pos = _expect(buf, pos, b'[')
+        pos = _skip_whitespace(buf, pos)
+        if buf[pos:pos + 1] == b']':
+            return pos + 1
+        while True:
+            members, pos = _members(buf, pos, _member_end)
+            name = None
+            notes = None
+            for member, start, end in members:
+                if member == "name":
+                    name = json.loads(buf[start:end])
+                elif member == "notes":
+                    notes = (start, end)
+            if notes is None:
+                raise BmsonFormatError(f"sound channel without notes: {name}")
+            self.sound_channels.append(LazyChannel(self, name, *notes))
+            pos = _skip_whitespace(buf, pos)
+            if buf[pos:pos + 1] == b']':
+                return pos + 1
+            pos = _skip_whitespace(buf, _expect(buf, pos, b','))
+
+    def __getitem__(self, key):
+        """最上位のキーの値（sound_channels以外）"""
+        if key == "sound_channels":
+            raise KeyError("use channels() for sound_channels")
+        start, end = self._spans[key]
+        return json.loads(self._buf[start:end])
+
+    def get(self, key, default=None):
+        return self[key] if key in self._spans and key != "sound_channels" else default
+
+    def channel_names(self):
+        return [channel.name for channel in self.sound_channels]
+
+    def channels(self, names=None):
+        """(チャンネル名, NoteColumns) を順に返す（names指定時はその名前のチャンネルだけ変換）"""
+        for channel in self.sound_channels:
+            if names is None or channel.name in names:
+                yield channel.name, channel.notes()
+
+    def to_bmson(self, names=None):
+        """ノートをNoteColumnsで持つBMSONの辞書（names指定時はそのチャンネルだけ）"""
+        bmson = {key: self[key] for key in self._spans if key != "sound_channels"}
+        bmson["sound_channels"] = [{"name": name, "notes": notes} for name, notes in self.channels(names)]
+        return bmson
+
+    def close(self):
+        if getattr(self, "_buf", None) is not None and not self._buf.closed:
+            self._buf.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+BMSONストリーミング書き出し
+ヘッダ部は一度だけJSON化し、ノート配列（NoteColumnsまたはノート辞書のリスト）は
+1ノートずつ文字列化してファイルへ直接流す
+- compact: 空白なし（既定）
+- pretty: json.dump(indent=2, ensure_ascii=False) と同一のバイト列
+小節毎に生成されるノートは層毎に一時ファイルへ溜めてから連結する（write_bmson_stream）
+ファイルへの保存は一時ファイルに書いてから置き換える（途中で止まっても書きかけの譜面を残さない）
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+from itertools import islice
+
+from chart_data import NoteColumns, NoteLayers
+
+# 一度に書き出すノート数
+CHUNK_SIZE = 4096
+
+COMPACT_NOTE = '{"x":%d,"y":%d,"l":%d,"c":%s}'
+PRETTY_NOTE = (
+    '{\n'
+    '          "x": %d,\n'
+    '          "y": %d,\n'
+    '          "l": %d,\n'
+    '          "c": %s\n'
+    '        }'
+)
+
+
+def _format_notes(notes, template):
+    """ノートをJSON文字列のチャンク単位で生成（NoteColumns・NoteLayersまたはノート辞書のリスト）"""
+    if isinstance(notes, (NoteColumns, NoteLayers)):
+        rows = notes.rows()
+    else:
+        rows = ((n["x"], n["y"], n["l"], n["c"]) for n in notes)
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield [template % (x, y, l, "true" if c else "false") for x, y, l, c in chunk]
+
+
+def _write_notes(f, notes, template, opening, separator, closing):
+    """ノート配列を書き出し、書き出したノート数を返す（空ならjson.dumpと同じく[]）"""
+    chunks = _format_notes(notes, template)
+    first = next(chunks, None)
+    if first is None:
+        f.write('[]')
+        return 0
+
+    f.write(opening)
+    f.write(separator.join(first))
+    count = len(first)
+    for chunk in chunks:
+        f.write(separator)
+        f.write(separator.join(chunk))
+        count += len(chunk)
+    f.write(closing)
+    return count
+
+
+def write_bmson(f, bmson, compact=True):
+    """BMSONをテキストファイルオブジェクトに書き出す
+
+    sound_channels以外のキーはヘッダとしてまとめてJSON化し、
+    sound_channelsは各チャンネルのノートを逐次書き出す
+    """
+    def write_channel(index, channel, template, opening, separator, closing):
+        _write_notes(f, channel["notes"], template, opening, separator, closing)
+
+    _write_document(f, bmson, compact, write_channel)
+
+
+def _write_document(f, bmson, compact, write_channel):
+    """ヘッダとチャンネルの枠を書き出し、各チャンネルのノート配列は write_channel に任せる
+
+    write_channel(チャンネル番号, チャンネル, ノートの書式, 開き, 区切り, 閉じ)
+    """
+    header = {key: value for key, value in bmson.items() if key != "sound_channels"}
+    channels = bmson.get("sound_channels", [])
+
+    if compact:
+        if header:
+            f.write(json.dumps(header, ensure_ascii=False, separators=(',', ':'))[:-1])
+            f.write(',"sound_channels":[')
+        else:
+            f.write('{"sound_channels":[')
+        for index, channel in enumerate(channels):
+            if index:
+                f.write(',')
+            name = json.dumps(channel["name"], ensure_ascii=False)
+            f.write(f'{{"name":{name},"notes":')
+            write_channel(index, channel, COMPACT_NOTE, '[', ',', ']')
+            f.write('}')
+        f.write(']}')
+        return
+
+    if header:
+        f.write(json.dumps(header, indent=2, ensure_ascii=False)[:-2])
+        f.write(',\n  "sound_channels": ')
+    else:
+        f.write('{\n  "sound_channels": ')
+    if not channels:
+        f.write('[]\n}')
+        return
+    f.write('[\n')
+    for index, channel in enumerate(channels):
+        if index:
+            f.write(',\n')
+        name = json.dumps(channel["name"], ensure_ascii=False)
+        f.write(f'    {{\n      "name": {name},\n      "notes": ')
+        write_channel(index, channel, PRETTY_NOTE, '[\n        ', ',\n        ', '\n      ]')
+        f.write('\n    }')
+    f.write('\n  ]\n}')
+
+
+def write_bmson_stream(f, bmson, layers, measures, compact=True):
+    """小節毎に生成されるノートを一定のメモリで書き出す
+
+    bmson: ヘッダとチャンネル名（sound_channelsのnotesは使わない）
+    layers: 層毎の書き込み先チャンネル番号（同じチャンネルの層はこの順に連結）
+    measures: 小節毎に層毎のNoteColumnsのタプルを返すイテラブル
+    各層のノートは書式化して一時ファイルに溜め、全小節の生成後にチャンネル順に連結する
+    ヘッダも全小節の生成後に書き出すため、measures は最後に info を書き換えてよい（難易度など）
+    """
+    template = COMPACT_NOTE if compact else PRETTY_NOTE
+    separator = ',' if compact else ',\n        '
+    spools = [tempfile.TemporaryFile('w+', encoding='utf-8') for _ in layers]
+    counts = [0] * len(layers)
+    try:
+        # 各ノートの前に区切りを付けて層毎に溜める
+        for measure in measures:
+            for layer, notes in enumerate(measure):
+                for chunk in _format_notes(notes, template):
+                    spools[layer].write(separator)
+                    spools[layer].write(separator.join(chunk))
+                    counts[layer] += len(chunk)
+
+        def write_channel(index, channel, template, opening, separator, closing):
+            channel_layers = [layer for layer, target in enumerate(layers) if target == index and counts[layer]]
+            if not channel_layers:
+                f.write('[]')
+                return
+            f.write(opening)
+            for position, layer in enumerate(channel_layers):
+                spool = spools[layer]
+                spool.seek(0)
+                # チャンネルの最初のノートの前の区切りは除く
+                if position == 0:
+                    spool.read(len(separator))
+                shutil.copyfileobj(spool, f)
+            f.write(closing)
+
+        _write_document(f, bmson, compact, write_channel)
+    finally:
+        for spool in spools:
+            spool.close()
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode='w'):
+    """同じディレクトリの一時ファイルを開き、正常に閉じたら path に置き換える
+
+    失敗した場合は一時ファイルを消し、path は元のまま残る
+    一時ファイル名はプロセス・スレッド毎に異なる（"<path>.<pid>.<thread>.tmp"）
+    """
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    encoding = None if 'b' in mode else 'utf-8'
+    try:
+        with open(temp_path, mode.replace('w', 'x'), encoding=encoding) as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+
+
+def save_bmson(path, bmson, compact=True):
+    """BMSONをファイルに保存（一時ファイル経由で置き換え）"""
+    with atomic_open(path) as f:
+        write_bmson(f, bmson, compact)
+
+
+def save_bmson_stream(path, bmson, layers, measures, compact=True):
+    """小節毎に生成されるノートをBMSONファイルに保存（一時ファイル経由で置き換え）"""
+    with atomic_open(path) as f:
+        write_bmson_stream(f, bmson, layers, measures, compact)
+
+
+def save_bytes(path, data):
+    """バイト列をファイルに保存（一時ファイル経由で置き換え）"""
+    with atomic_open(path, 'wb') as f:
+        f.write(data)
+
+
+def bmson_bytes(bmson, compact=True):
+    """BMSONをUTF-8のバイト列にする（アーカイブへの書き込み用）"""
+    buffer = io.StringIO()
+    write_bmson(buffer, bmson, compact)
+    return buffer.getvalue().encode('utf-8')
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+全練習譜面の一括ビルド
+トリル・階段・乱打の全譜面 (ジェネレータ × バリエーション × BPM) を
+プロセスプールに分散して生成する
+--ladder ではバリエーション毎に全BPMを1つにつないだテンポ階段譜面を生成する
+生成パラメータ・シード・ジェネレータのソースが変わっていない譜面はスキップする
+ビルド対象は build_matrix.json に定義し、--filter で一部の譜面だけをビルドできる
+"""
+import argparse
+import contextlib
+import functools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from bmson_writer import bmson_bytes, save_bmson
+from chart_archive import ARCHIVE_FORMATS, ChartArchive
+from build_matrix import family_group, parse_filter
+from build_cache import BuildManifest, chart_key, hash_sources
+from chart_seed import derive_seed
+from stage_profile import PROFILE_FORMATS, Profiler, chart, chart_note_count, profiling, stage
+from sound_assets import LINK_MODES, chart_sounds, find_sound, format_stats, package_sounds
+from generate_bmson import create_bmson, trill_base_key, trill_jobs
+from generate_stair_bmson import create_stair_bmson, stair_base_key, stair_jobs
+from generate_random_bmson import create_random_bmson, random_jobs
+from tempo_ladder import LADDER_KINDS, MEASURE_UNITS, create_ladder_bmson, ramp_sections, step_sections
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 出力先（リポジトリのpractice_songs）
+DEFAULT_OUTPUT_DIR = os.path.join(TOOLS_DIR, "..", "practice_songs")
+
+# ジェネレータ名 -> (出力サブディレクトリ, BMSON生成関数, ジョブ列挙関数)
+FAMILIES = {
+    "trill": (family_group("trill"), create_bmson, trill_jobs),
+    "stair": (family_group("stair"), create_stair_bmson, stair_jobs),
+    "random": (family_group("random"), create_random_bmson, random_jobs),
+}
+
+# ジェネレータ名 -> BPM毎の基本譜面の鍵（同じ鍵のバリエーションは基本譜面を共有する）
+BASE_KEYS = {
+    "trill": trill_base_key,
+    "stair": stair_base_key,
+}
+
+# 全ジェネレータ共通のソース
+SHARED_SOURCES = ["chart_data.py", "chart_seed.py", "bmson_writer.py", "trash_layer.py", "difficulty.py", "timing.py"]
+
+# ジェネレータ名 -> 譜面の内容に影響するソース（キャッシュの鍵に含める）
+FAMILY_SOURCES = {
+    "trill": ["trill_patterns.py", "shuffle_bag.py", "generate_bmson.py"],
+    "stair": ["stair_patterns.py", "shuffle_bag.py", "generate_stair_bmson.py"],
+    "random": ["random_patterns.py", "generate_random_bmson.py"],
+}
+
+# テンポ階段譜面のジョブだけが追加で依存するソース
+LADDER_SOURCES = ["tempo_ladder.py"]
+
+def list_jobs(families=None, where=None):
+    """ビルド対象の全ジョブを列挙
+
+    where: build_matrix.ChartFilter（合う譜面だけを列挙、合わないジェネレータ・バリエーションは展開しない）
+    """
+    jobs = []
+    for family, (group, _, enumerate_jobs) in FAMILIES.items():
+        if families and family not in families:
+            continue
+        if where is not None and not where.matches({"family": family}):
+            continue
+        for variant, bpm, filename, kwargs in enumerate_jobs(where):
+            jobs.append({
+                "family": family,
+                "group": group,
+                "variant": variant,
+                "bpm": bpm,
+                "filename": filename,
+                "relpath": os.path.join(group, filename),
+                "seed_key": BASE_KEYS[family](bpm) if family in BASE_KEYS else filename,
+                "kwargs": kwargs,
+            })
+    return jobs
+
+def list_ladder_jobs(families=None, kind="step", section_minutes=1, where=None):
+    """バリエーション毎のテンポ階段譜面のジョブを列挙
+
+    kind: step（BPM毎に section_minutes 分ずつ）または ramp（最低BPMから最高BPMまで連続的に変化、
+          長さは section_minutes × BPMの数）
+    マニフェスト上は "<ジェネレータ名>:<kind>" として通常の譜面と別に管理する
+    where: build_matrix.ChartFilter（bpmの条件はつなぐBPMを絞る）
+    """
+    jobs = []
+    for job in list_jobs(families, where):
+        if jobs and jobs[-1]["family"] == job["family"] and jobs[-1]["variant"] == job["variant"]:
+            jobs[-1]["bpms"].append(job["bpm"])
+            continue
+        family = job["family"]
+        jobs.append({
+            "family": family,
+            "scope": f"{family}:{kind}",
+            "group": job["group"],
+            "variant": job["variant"],
+            "bpms": [job["bpm"]],
+            "filename": f"{job['variant']}_{'ladder' if kind == 'step' else 'ramp'}.bmson",
+            "kwargs": {key: value for key, value in job["kwargs"].items() if key != "bpm"},
+        })
+
+    for job in jobs:
+        family = job["family"]
+        bpms = sorted(job.pop("bpms"))
+        unit = MEASURE_UNITS[family]
+        if kind == "step":
+            sections = step_sections(bpms, section_minutes, unit)
+        else:
+            sections = ramp_sections(bpms[0], bpms[-1], section_minutes * len(bpms), unit)
+        job["bpm"] = bpms[0]
+        job["relpath"] = os.path.join(job["group"], job["filename"])
+        # 基本譜面を共有するジェネレータは全バリエーションで同じシード
+        job["seed_key"] = f"{family}_{kind}" if family in BASE_KEYS else job["filename"]
+        job["kwargs"]["sections"] = sections
+        job["mode"] = "ladder"
+    return jobs
+
+def job_seed(job, seed):
+    """マスターシードから導出したジョブ毎の乱数シード
+
+    基本譜面を共有するジェネレータはBPM毎の鍵、それ以外はファイル名から導出する
+    """
+    return derive_seed(seed, job["seed_key"])
+
+def group_jobs(jobs):
+    """同じ基本譜面を共有するジョブをまとめる（まとめたジョブは同じワーカーで続けて実行）"""
+    groups = {}
+    for job in jobs:
+        groups.setdefault((job["family"], job["seed_key"]), []).append(job)
+    return list(groups.values())
+
+def run_jobs(jobs, output_dir, seed, compact=True, profile_memory=None):
+    """ジョブのまとまりを順に実行（基本譜面はまとまりの中で共有する）"""
+    bases = {}
+    return [run_job(job, output_dir, seed, compact, profile_memory, bases) for job in jobs]
+
+def job_key(job, seed, compact=True):
+    """キャッシュの鍵（生成パラメータ・シード・ソースのハッシュ）"""
+    names = SHARED_SOURCES + FAMILY_SOURCES[job["family"]]
+    if job.get("mode") == "ladder":
+        names = names + LADDER_SOURCES
+    sources = [os.path.join(TOOLS_DIR, name) for name in names]
+    params = dict(job["kwargs"], family=job["family"], filename=job["filename"], compact=compact)
+    return chart_key(params, job_seed(job, seed), hash_sources(sources))
+
+def create_chart(job, seed, bases=None):
+    """ジョブのBMSONを生成（テンポ階段譜面はジェネレータの生成関数を区間の合計小節数で呼ぶ）
+
+    bases: 基本譜面の共有用の辞書（基本譜面を持つジェネレータのみ使う）
+    """
+    _, create, _ = FAMILIES[job["family"]]
+    if bases is not None and job["family"] in BASE_KEYS:
+        create = functools.partial(create, bases=bases)
+    if job.get("mode") == "ladder":
+        return create_ladder_bmson(create, **job["kwargs"], seed=job_seed(job, seed))
+    return create(**job["kwargs"], seed=job_seed(job, seed))
+
+def run_job(job, output_dir, seed, compact=True, profile_memory=None, bases=None):
+    """1譜面を生成して書き出す（ワーカープロセスで実行）
+
+    譜面毎の乱数ストリームを (seed, ファイル名) から導出するため、
+    ワーカー数や実行順に関わらず同じ出力になる
+    profile_memory: Noneなら計測しない、True/Falseなら段階別に計測（Trueはピークメモリも）
+    bases: 基本譜面の共有用の辞書（run_jobsがまとまり毎に渡す）
+    戻り値: (パス, 時間, 参照する音声ファイル名, 段階別の計測記録)
+    """
+    start = time.perf_counter()
+    profiler = profiling(profile_memory) if profile_memory is not None else contextlib.nullcontext()
+
+    with profiler as recorder, chart(job["relpath"]):
+        bmson = create_chart(job, seed, bases)
+
+        path = os.path.join(output_dir, job["relpath"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with stage("write") as timer:
+            save_bmson(path, bmson, compact)
+            timer.count(chart_note_count(bmson))
+
+    records = recorder.records if recorder is not None else []
+    return path, time.perf_counter() - start, chart_sounds(bmson), records
+
+def run_archive_job(job, seed, compact=True, bases=None):
+    """1譜面を生成してバイト列で返す
+
+    bases: 基本譜面の共有用の辞書（run_archive_jobsがまとまり毎に渡す）
+    """
+    start = time.perf_counter()
+    bmson = create_chart(job, seed, bases)
+    return bmson_bytes(bmson, compact), time.perf_counter() - start, chart_sounds(bmson)
+
+def run_archive_jobs(jobs, seed, compact=True):
+    """ジョブのまとまりを順にバイト列にする（ワーカープロセスで実行、基本譜面はまとまりの中で共有する）"""
+    bases = {}
+    return [run_archive_job(job, seed, compact, bases) for job in jobs]
+
+def build(jobs, output_dir, workers=None, seed=0, compact=True, families=None, force=False,
+          sound_mode="hardlink", profiler=None, partial=False):
+    """ジョブをプロセスプールで実行し、ジョブ毎の時間と全体のスループットを表示
+
+    families: 古い譜面の削除対象とするジェネレータ（省略時は全て、テンポ階段譜面は "trill:step" などの区分）
+    force: Trueならキャッシュを無視して全譜面を生成
+    sound_mode: 曲フォルダへの音声ファイルの置き方（Noneなら配置しない）
+    profiler: stage_profile.Profiler（指定時は各ワーカーの段階別の計測記録を集める）
+    partial: Trueならジョブに無い譜面を削除しない（--filter で一部だけをビルドする場合）
+    """
+    start = time.perf_counter()
+    manifest = BuildManifest(output_dir)
+    profile_memory = profiler.memory if profiler is not None else None
+
+    pending = []
+    for job in jobs:
+        job["key"] = job_key(job, seed, compact)
+        if force or not manifest.is_fresh(job["relpath"], job["key"]):
+            pending.append(job)
+    skipped = len(jobs) - len(pending)
+
+    try:
+        if workers == 1 or len(pending) <= 1:
+            # 直列実行（比較・デバッグ用）
+            for group in group_jobs(pending):
+                bases = {}
+                for job in group:
+                    path, elapsed, sounds, records = run_job(job, output_dir, seed, compact, profile_memory, bases)
+                    manifest.record(job["relpath"], job["key"], job.get("scope", job["family"]), sounds)
+                    if profiler is not None:
+                        profiler.records.extend(records)
+                    print(f"Generated: {path} ({elapsed:.3f}s)")
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    executor.submit(run_jobs, group, output_dir, seed, compact, profile_memory): group
+                    for group in group_jobs(pending)
+                }
+                for future in as_completed(futures):
+                    for job, (path, elapsed, sounds, records) in zip(futures[future], future.result()):
+                        manifest.record(job["relpath"], job["key"], job.get("scope", job["family"]), sounds)
+                        if profiler is not None:
+                            profiler.records.extend(records)
+                        print(f"Generated: {path} ({elapsed:.3f}s)")
+
+        removed = [] if partial else manifest.remove_stale(families or set(FAMILIES),
+                                                           {job["relpath"] for job in jobs})
+        for relpath in removed:
+            print(f"Removed: {os.path.join(output_dir, relpath)}")
+
+        # 参照される音声ファイルを内容ハッシュで1つにまとめて曲フォルダにリンク
+        if sound_mode:
+            group_sounds = {}
+            for job in jobs:
+                group_sounds.setdefault(job["group"], set()).update(manifest.sounds(job["relpath"]))
+            stats, missing = package_sounds(output_dir, group_sounds, sound_mode)
+            print(f"Sounds: {format_stats(stats, missing)}")
+    finally:
+        manifest.save()
+
+    total = time.perf_counter() - start
+    rate = len(pending) / total if total > 0 else 0.0
+    print(f"\n{len(pending)} charts in {total:.2f}s ({rate:.1f} charts/sec), "
+          f"{skipped} up to date, {len(removed)} removed")
+
+def build_archives(jobs, output_dir, workers=None, seed=0, compact=True,
+                   archive_format="zip", compression_level=None):
+    """譜面をファイルに書き出さず、曲フォルダ毎のアーカイブへ直接書き込む
+
+    譜面は基本譜面毎にまとめたジョブ順に格納し（ワーカー数に関わらず同じ内容）、
+    最後に各曲フォルダが参照する音声ファイルを1つずつ追加する
+    """
+    start = time.perf_counter()
+    os.makedirs(output_dir, exist_ok=True)
+    groups = group_jobs(jobs)
+    jobs = [job for group in groups for job in group]
+
+    archives = {}
+    group_sounds = {}
+
+    def store(job, data, elapsed, sounds):
+        group = job["group"]
+        if group not in archives:
+            path = os.path.join(output_dir, group + ARCHIVE_FORMATS[archive_format])
+            archives[group] = ChartArchive(path, archive_format, compression_level)
+        archives[group].add_bytes(f"{group}/{job['filename']}", data)
+        group_sounds.setdefault(group, set()).update(sounds)
+        print(f"Archived: {group}/{job['filename']} ({elapsed:.3f}s)")
+
+    try:
+        if workers == 1 or len(jobs) <= 1:
+            for group in groups:
+                bases = {}
+                for job in group:
+                    store(job, *run_archive_job(job, seed, compact, bases))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = executor.map(run_archive_jobs, groups, [seed] * len(groups), [compact] * len(groups))
+                for group, group_results in zip(groups, results):
+                    for job, result in zip(group, group_results):
+                        store(job, *result)
+
+        missing = set()
+        for group, archive in archives.items():
+            for name in sorted(group_sounds[group]):
+                source = find_sound(name)
+                if source is None:
+                    missing.add(name)
+                else:
+                    archive.add_sound(f"{group}/{name}", source)
+    except BaseException:
+        for archive in archives.values():
+            archive.abort()
+        raise
+
+    input_bytes = sum(archive.input_bytes for archive in archives.values())
+    output_bytes = 0
+    for group, archive in sorted(archives.items()):
+        size = archive.close()
+        output_bytes += size
+        print(f"Wrote: {archive.path} ({archive.members} files, {archive.input_bytes} -> {size} bytes)")
+
+    total = time.perf_counter() - start
+    rate = input_bytes / total if total > 0 else 0.0
+    print(f"\n{len(jobs)} charts in {total:.2f}s, {input_bytes} -> {output_bytes} bytes "
+          f"({rate / 1e6:.1f} MB/sec)")
+    if missing:
+        print(f"Missing sounds: {', '.join(sorted(missing))}")
+
+def main():
+    parser = argparse.ArgumentParser(description="全練習譜面を並列ビルド")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="ワーカープロセス数（1で直列実行）")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR,
+                        help="出力先ディレクトリ")
+    parser.add_argument("--family", action="append", choices=sorted(FAMILIES),
+                        help="ビルドするジェネレータ（複数指定可、省略時は全て）")
+    parser.add_argument("--seed", default="0",
+                        help="マスターシード（譜面毎のシードはここから導出）")
+    parser.add_argument("--pretty", action="store_true",
+                        help="インデント付きの従来形式で書き出す")
+    parser.add_argument("--force", action="store_true",
+                        help="キャッシュを無視して全譜面を生成")
+    parser.add_argument("--sound-mode", choices=LINK_MODES, default="hardlink",
+                        help="音声ファイルの置き方（失敗時は後ろの方法にフォールバック）")
+    parser.add_argument("--no-sounds", action="store_true",
+                        help="音声ファイルを配置しない")
+    parser.add_argument("--profile", choices=PROFILE_FORMATS,
+                        help="段階別の時間・ノート数を計測して出力（summary: 集計表, jsonl: JSON Lines）")
+    parser.add_argument("--profile-output", help="計測結果の出力先（省略時は標準エラー出力）")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="tracemallocで段階別のピークメモリも計測（遅くなる）")
+    parser.add_argument("--archive", choices=sorted(ARCHIVE_FORMATS),
+                        help="曲フォルダ毎のアーカイブに直接書き出す（キャッシュは使わない）")
+    parser.add_argument("--compression-level", type=int, choices=range(0, 10), metavar="0-9",
+                        help="アーカイブの圧縮レベル（zip・tar.gzは0-9、tar.xzは0-9のプリセット）")
+    parser.add_argument("--ladder", choices=LADDER_KINDS,
+                        help="バリエーション毎に全BPMをつないだテンポ階段譜面を生成"
+                             "（step: BPM毎の区間, ramp: 連続的に変化）")
+    parser.add_argument("--section-minutes", type=float, default=1,
+                        help="テンポ階段譜面のBPM1つあたりの長さ（分）")
+    parser.add_argument("--filter", metavar="EXPR",
+                        help="絞り込み式に合う譜面だけをビルド（例: \"family=random chord=1_2 scratch=8 bpm>=200\"、"
+                             "他の譜面は削除しない）")
+    args = parser.parse_args()
+
+    try:
+        where = parse_filter(args.filter)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.ladder:
+        jobs = list_ladder_jobs(args.family, args.ladder, args.section_minutes, where)
+        families = [f"{family}:{args.ladder}" for family in (args.family or FAMILIES)]
+    else:
+        jobs = list_jobs(args.family, where)
+        families = args.family
+    if not jobs:
+        parser.error(f"no charts match {args.filter!r}")
+    if args.archive:
+        build_archives(jobs, args.output_dir, args.workers, args.seed, not args.pretty,
+                       args.archive, args.compression_level)
+        return
+    profiler = Profiler(args.profile_memory) if args.profile else None
+    build(jobs, args.output_dir, args.workers, args.seed, not args.pretty,
+          families=families, force=args.force,
+          sound_mode=None if args.no_sounds else args.sound_mode, profiler=profiler,
+          partial=where is not None)
+    if profiler is not None:
+        profiler.report(args.profile, args.profile_output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+譜面ビルドのインクリメンタルキャッシュ
+各譜面を (生成パラメータ, シード, ジェネレータのソースのハッシュ) で鍵付けし、
+鍵が変わっていない譜面は再生成しない
+"""
+import hashlib
+import json
+import os
+
+from sound_assets import read_chart_sounds
+
+MANIFEST_NAME = ".build_manifest.json"
+
+_source_hashes = {}
+
+
+def hash_sources(paths):
+    """ソースファイル群の内容ハッシュ（同一プロセス内ではキャッシュ）"""
+    key = tuple(paths)
+    if key not in _source_hashes:
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(os.path.basename(path).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        _source_hashes[key] = digest.hexdigest()
+    return _source_hashes[key]
+
+
+def chart_key(params, seed, source_hash):
+    """1譜面の鍵（パラメータ・シード・ソースハッシュのSHA-256）"""
+    payload = json.dumps(
+        {"params": params, "seed": seed, "source": source_hash},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class BuildManifest:
+    """出力ディレクトリ毎のビルドマニフェスト
+
+    読めない・壊れたマニフェストは空として扱う
+    entries: 出力ディレクトリからの相対パス -> {"key": 鍵, "family": ジェネレータ名, "sounds": 参照する音声ファイル名}
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                # 壊れたマニフェストは無いものとして扱う（全譜面を生成し直す）
+                entries = {}
+            if isinstance(entries, dict):
+                self.entries = entries
+
+    def is_fresh(self, relpath, key):
+        """鍵が一致し、ファイルも残っていればTrue"""
+        entry = self.entries.get(relpath)
+        return (
+            entry is not None
+            and entry["key"] == key
+            and os.path.exists(os.path.join(self.output_dir, relpath))
+        )
+
+    def record(self, relpath, key, family, sounds=()):
+        """生成済みの譜面を記録"""
+        self.entries[relpath] = {"key": key, "family": family, "sounds": list(sounds)}
+
+    def sounds(self, relpath):
+        """譜面が参照する音声ファイル名（記録が無ければ譜面ファイルから読む）"""
+        entry = self.entries.get(relpath, {})
+        if "sounds" not in entry:
+            entry["sounds"] = read_chart_sounds(os.path.join(self.output_dir, relpath))
+        return entry["sounds"]
+
+    def remove_stale(self, families, keep):
+        """指定ジェネレータの譜面のうち、現在のビルド対象に無いものを削除
+
+        戻り値: 削除した相対パスのリスト
+        """
+        removed = []
+        for relpath, entry in list(self.entries.items()):
+            if entry["family"] not in families or relpath in keep:
+                continue
+            path = os.path.join(self.output_dir, relpath)
+            if os.path.exists(path):
+                os.remove(path)
+            del self.entries[relpath]
+            removed.append(relpath)
+        return removed
+
+    def save(self):
+        """マニフェストを書き出す（一時ファイル経由で置き換え）"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False, sort_keys=True)
+        os.replace(temp_path, self.path)
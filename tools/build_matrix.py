@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+ビルド対象の譜面の一覧（build_matrix.json）
+ジェネレータ毎に出力サブディレクトリ・BPM・バリエーションを定義し、
+(ジェネレータ × バリエーション × BPM) の譜面を必要な分だけ順に列挙する
+
+  bpms: [100, 120, ...] または {"start": 100, "stop": 220, "step": 20}（stopを含む）
+  variants: {"name", "heading", "options"} のリスト（optionsは生成関数の引数）
+  patterns × scratch: 乱打のパターンと皿の組み合わせ（exclude の絞り込み式に合うものは除く）
+
+絞り込み式は空白区切りの条件の AND（例: "family=random chord=1_2 scratch=8 bpm>=200"）
+  = / != はカンマ区切りのいずれか（ワイルドカード可）、>= <= > < は数値で比較する
+  値の無い属性（皿なしの scratch など）は none と書く
+"""
+import fnmatch
+import json
+import operator
+import os
+import re
+from functools import lru_cache
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MATRIX_PATH = os.path.join(TOOLS_DIR, "build_matrix.json")
+
+# 絞り込み式で使える属性
+FILTER_KEYS = ["family", "variant", "bpm", "chord", "scratch", "probability", "trash", "filename"]
+
+_COMPARE = {">=": operator.ge, "<=": operator.le, ">": operator.gt, "<": operator.lt}
+
+_TERM = re.compile(r"([a-z]+)(>=|<=|!=|=|>|<)(\S+)$")
+
+
+class ChartFilter:
+    """絞り込み式（条件の AND）
+
+    matches は渡された属性に無いキーの条件を判定しないため、
+    ジェネレータ・バリエーションの段階で先に絞り込める
+    """
+
+    def __init__(self, expression):
+        self.expression = expression
+        self.terms = []
+        for text in expression.split():
+            match = _TERM.match(text)
+            if match is None:
+                raise ValueError(f"invalid filter term: {text!r}")
+            key, op, value = match.groups()
+            if key not in FILTER_KEYS:
+                raise ValueError(f"unknown filter key {key!r} (expected one of {', '.join(FILTER_KEYS)})")
+            if op in _COMPARE:
+                try:
+                    value = float(value)
+                except ValueError:
+                    raise ValueError(f"{text!r}: {op} needs a number") from None
+            else:
+                value = value.split(",")
+            self.terms.append((key, op, value))
+
+    def matches(self, attrs):
+        """属性が全ての条件を満たすか（attrsに無いキーの条件は満たすとみなす）"""
+        for key, op, value in self.terms:
+            if key not in attrs:
+                continue
+            actual = attrs[key]
+            if op in _COMPARE:
+                if actual is None or not _COMPARE[op](float(actual), value):
+                    return False
+            else:
+                text = "none" if actual is None else str(actual)
+                found = any(fnmatch.fnmatchcase(text, pattern) for pattern in value)
+                if found != (op == "="):
+                    return False
+        return True
+
+    def __repr__(self):
+        return f"ChartFilter({self.expression!r})"
+
+
+def parse_filter(expression):
+    """絞り込み式を解釈（空ならNone）"""
+    if not expression or not expression.strip():
+        return None
+    return ChartFilter(expression)
+
+
+@lru_cache(maxsize=None)
+def load_matrix(path=MATRIX_PATH):
+    """ジェネレータ名 -> 定義（変更しないこと）"""
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def family_group(family, matrix=None):
+    """出力サブディレクトリ"""
+    return (matrix or load_matrix())[family]["group"]
+
+
+def family_bpms(family, matrix=None):
+    """ビルド対象のBPM"""
+    bpms = (matrix or load_matrix())[family]["bpms"]
+    if isinstance(bpms, dict):
+        return range(bpms["start"], bpms["stop"] + 1, bpms["step"])
+    return list(bpms)
+
+
+def family_variants(family, matrix=None):
+    """バリエーションを順に列挙
+
+    戻り値: {"name", "heading", "options", "attrs"} の辞書
+    （options: BPM以外の生成関数の引数, attrs: 絞り込み用の属性）
+    """
+    config = (matrix or load_matrix())[family]
+    if "variants" in config:
+        for variant in config["variants"]:
+            options = variant["options"]
+            trash = options.get("trash_type", "4th") if options.get("include_trash") else None
+            yield {
+                "name": variant["name"],
+                "heading": variant.get("heading", variant["name"]),
+                "options": dict(options),
+                "attrs": {
+                    "variant": variant["name"],
+                    "chord": "1",
+                    "scratch": 4 if options.get("include_scratch") else None,
+                    "probability": 100 if options.get("include_scratch") else None,
+                    "trash": trash,
+                },
+            }
+        return
+
+    excludes = [ChartFilter(expression) for expression in config.get("exclude", [])]
+    for pattern in config["patterns"]:
+        for scratch in config["scratch"]:
+            interval, probability = scratch["interval"], scratch["probability"]
+            name = f"random_{pattern['chord']}_random{scratch['suffix']}_practice"
+            attrs = {
+                "family": family,
+                "variant": name,
+                "chord": pattern["chord"],
+                "scratch": interval,
+                "probability": int(probability * 100) if interval else None,
+                "trash": None,
+            }
+            if any(rule.matches(attrs) for rule in excludes):
+                continue
+            if interval:
+                prob_text = f"{int(probability*100)}%" if probability < 1.0 else ""
+                heading = f"{pattern['name']}＋{interval}分皿{prob_text}"
+            else:
+                heading = pattern["name"]
+            yield {
+                "name": name,
+                "heading": heading,
+                "options": {
+                    "chord_sizes": pattern["chord_sizes"],
+                    "pattern_name": pattern["name"],
+                    "scratch_interval": interval,
+                    "scratch_probability": probability,
+                },
+                "attrs": attrs,
+            }
+
+
+def iter_charts(families=None, where=None, matrix=None):
+    """絞り込み式に合う譜面を順に列挙
+
+    families: 対象のジェネレータ名（省略時は全て）
+    where: ChartFilter（ジェネレータ・バリエーション・BPMの順に判定し、合わない分は展開しない）
+    戻り値: {"family", "group", "variant", "bpm", "filename", "kwargs"} の辞書
+    """
+    matrix = matrix or load_matrix()
+    for family in matrix:
+        if families and family not in families:
+            continue
+        if where is not None and not where.matches({"family": family}):
+            continue
+        group = family_group(family, matrix)
+        bpms = family_bpms(family, matrix)
+        for variant in family_variants(family, matrix):
+            attrs = dict(variant["attrs"], family=family)
+            if where is not None and not where.matches(attrs):
+                continue
+            for bpm in bpms:
+                filename = f"{variant['name']}_bpm{bpm}.bmson"
+                if where is not None and not where.matches(dict(attrs, bpm=bpm, filename=filename)):
+                    continue
+                yield {
+                    "family": family,
+                    "group": group,
+                    "variant": variant["name"],
+                    "bpm": bpm,
+                    "filename": filename,
+                    "kwargs": dict(variant["options"], bpm=bpm),
+                }
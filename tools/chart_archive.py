@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+曲フォルダ単位のアーカイブ書き出し
+生成した譜面と参照する音声ファイルを、中間ファイルを作らずに
+曲フォルダ毎の zip / tar（gz・xz圧縮可）へ直接書き込む
+"""
+import contextlib
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+from sound_assets import file_digest
+
+# 形式 -> 拡張子
+ARCHIVE_FORMATS = {
+    "zip": ".zip",
+    "tar": ".tar",
+    "tar.gz": ".tar.gz",
+    "tar.xz": ".tar.xz",
+}
+
+
+class ChartArchive:
+    """1つの曲フォルダのアーカイブ
+
+    メンバー名は "<曲フォルダ>/<ファイル名>"（展開すると出力ディレクトリと同じ構成）
+    tarでは同じ内容の音声ファイルを2つ目以降ハードリンクとして格納する
+    """
+
+    def __init__(self, path, archive_format="zip", compression_level=None):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"unknown archive format: {archive_format}")
+        self.path = path
+        self.format = archive_format
+        self.input_bytes = 0
+        self.members = 0
+        self._sounds = {}
+        self._mtime = time.time()
+        self._compression_level = compression_level
+
+        temp_path = path + ".tmp"
+        if archive_format == "zip":
+            self._archive = zipfile.ZipFile(
+                temp_path, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=compression_level)
+        elif archive_format == "tar":
+            self._archive = tarfile.open(temp_path, 'w')
+        elif archive_format == "tar.gz":
+            options = {} if compression_level is None else {"compresslevel": compression_level}
+            self._archive = tarfile.open(temp_path, 'w:gz', **options)
+        else:
+            self._archive = tarfile.open(temp_path, 'w:xz', preset=compression_level)
+
+    def add_bytes(self, name, data):
+        """バイト列を1ファイルとして追加"""
+        if self.format == "zip":
+            info = zipfile.ZipInfo(name, time.localtime(self._mtime)[:6])
+            info.external_attr = 0o644 << 16
+            self._archive.writestr(info, data, zipfile.ZIP_DEFLATED, self._compression_level)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = self._mtime
+            info.mode = 0o644
+            self._archive.addfile(info, io.BytesIO(data))
+        self.input_bytes += len(data)
+        self.members += 1
+
+    def add_sound(self, name, source):
+        """音声ファイルを追加（同じ内容は1度だけ格納）"""
+        digest = file_digest(source)
+        if self.format != "zip" and digest in self._sounds:
+            info = tarfile.TarInfo(name)
+            info.type = tarfile.LNKTYPE
+            info.linkname = self._sounds[digest]
+            info.mtime = self._mtime
+            info.mode = 0o644
+            self._archive.addfile(info)
+            self.members += 1
+            return
+        with open(source, 'rb') as f:
+            self.add_bytes(name, f.read())
+        self._sounds.setdefault(digest, name)
+
+    def close(self):
+        """アーカイブを閉じて置き換え、書き出したサイズを返す"""
+        self._archive.close()
+        os.replace(self.path + ".tmp", self.path)
+        return os.path.getsize(self.path)
+
+    def abort(self):
+        """書きかけのアーカイブを破棄（閉じられなくても一時ファイルは削除する）"""
+        try:
+            with contextlib.suppress(Exception):
+                self._archive.close()
+        finally:
+            os.remove(self.path + ".tmp")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+列指向のノート格納
+1サウンドチャンネル分のノートをレーン・位置・長さ・継続フラグの
+型付き配列で保持し、BMSONのノート辞書には書き出し時にだけ変換する
+基本譜面にゴミなどの層を重ねるときはNoteLayersで配列をコピーせずに連結する
+"""
+from array import array
+from itertools import chain
+
+
+class NoteColumns:
+    """1サウンドチャンネル分のノート列
+
+    x: レーン（0=BGM, 1-7=鍵盤, 8=スクラッチ）
+    y: パルス位置
+    l: ロングノートの長さ
+    c: 継続フラグ（0/1）
+    """
+    __slots__ = ("x", "y", "l", "c")
+
+    def __init__(self, x=(), y=(), l=None, c=None):
+        self.x = array('b', x)
+        self.y = array('i', y)
+        self.l = array('i', l) if l is not None else array('i', [0]) * len(self.x)
+        self.c = array('b', map(bool, c)) if c is not None else array('b', [0]) * len(self.x)
+        if not (len(self.x) == len(self.y) == len(self.l) == len(self.c)):
+            raise ValueError("列の長さが一致しません")
+
+    def __len__(self):
+        return len(self.x)
+
+    def append(self, x, y, l=0, c=False):
+        """ノートを1つ追加"""
+        self.x.append(x)
+        self.y.append(y)
+        self.l.append(l)
+        self.c.append(bool(c))
+
+    def extend(self, x, y, l=None, c=None):
+        """ノートをまとめて追加（l, c省略時は0）"""
+        count = len(self.x)
+        self.x.extend(x)
+        self.y.extend(y)
+        added = len(self.x) - count
+        if len(self.y) != len(self.x):
+            raise ValueError("列の長さが一致しません")
+        if l is None:
+            self.l.extend(array('i', [0]) * added)
+        else:
+            self.l.extend(l)
+        if c is None:
+            self.c.extend(array('b', [0]) * added)
+        else:
+            self.c.extend(map(bool, c))
+
+    def extend_columns(self, other):
+        """別のNoteColumnsのノートを末尾に追加"""
+        self.x.extend(other.x)
+        self.y.extend(other.y)
+        self.l.extend(other.l)
+        self.c.extend(other.c)
+
+    def sort(self):
+        """位置→レーンの順に並べ替え（同位置・同レーンは元の順序を保持）"""
+        order = sorted(range(len(self.x)), key=lambda i: (self.y[i], self.x[i]))
+        self.x = array('b', [self.x[i] for i in order])
+        self.y = array('i', [self.y[i] for i in order])
+        self.l = array('i', [self.l[i] for i in order])
+        self.c = array('b', [self.c[i] for i in order])
+
+    def rows(self):
+        """(x, y, l, c) のタプルを順に返す"""
+        return zip(self.x, self.y, self.l, map(bool, self.c))
+
+    def to_notes(self):
+        """BMSON形式のノート辞書のリストに変換"""
+        return [{"x": x, "y": y, "l": l, "c": c} for x, y, l, c in self.rows()]
+
+    @classmethod
+    def from_numpy(cls, x, y):
+        """NumPyの整数配列 (レーン, パルス位置) から作成（l, cは0）"""
+        columns = cls()
+        columns.x.frombytes(x.astype('b').tobytes())
+        columns.y.frombytes(y.astype('i').tobytes())
+        if len(columns.x) != len(columns.y):
+            raise ValueError("列の長さが一致しません")
+        columns.l = array('i', [0]) * len(columns.x)
+        columns.c = array('b', [0]) * len(columns.x)
+        return columns
+
+    @classmethod
+    def from_notes(cls, notes):
+        """BMSON形式のノート辞書のリストから作成"""
+        columns = cls()
+        for note in notes:
+            columns.append(note["x"], note["y"], note.get("l", 0), note.get("c", False))
+        return columns
+
+
+class NoteLayers:
+    """複数のNoteColumnsを順に連結した1サウンドチャンネル分のノート列
+
+    各層の配列はコピーせずに参照するため、同じ基本譜面を複数の譜面で共有できる
+    """
+    __slots__ = ("layers",)
+
+    def __init__(self, *layers):
+        self.layers = layers
+
+    def __len__(self):
+        return sum(len(layer) for layer in self.layers)
+
+    def rows(self):
+        """(x, y, l, c) のタプルを層の順に返す"""
+        return chain.from_iterable(layer.rows() for layer in self.layers)
+
+    def to_notes(self):
+        """BMSON形式のノート辞書のリストに変換"""
+        return [{"x": x, "y": y, "l": l, "c": c} for x, y, l, c in self.rows()]
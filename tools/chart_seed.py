@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+譜面毎の乱数ストリーム
+1つのマスターシードから譜面毎に独立したシードを導出し、
+グローバルなrandomモジュールの状態や呼び出し順に依存せず同じ譜面を再現する
+"""
+import hashlib
+import random
+
+# シードのビット数（JSONの数値として精度を落とさない範囲）
+SEED_BITS = 48
+
+
+def derive_seed(master_seed, *key):
+    """マスターシードとキー（ファイル名など）から譜面毎のシードを導出"""
+    text = ":".join(str(part) for part in (master_seed,) + key)
+    digest = hashlib.sha256(text.encode('utf-8')).digest()
+    return int.from_bytes(digest[:SEED_BITS // 8], 'big')
+
+
+def new_seed():
+    """マスターシード未指定時の新しいシード"""
+    return random.SystemRandom().getrandbits(SEED_BITS)
+
+
+def chart_rng(seed=None):
+    """譜面用の (シード, random.Random) を返す（seed省略時は新しいシード）"""
+    if seed is None:
+        seed = new_seed()
+    return seed, random.Random(seed)
+
+
+def sub_rng(seed, name):
+    """譜面のシードから用途別（ゴミノートなど）の独立した乱数生成器を作る
+
+    基本譜面の乱数の消費量に依存しないため、小節毎の逐次生成でも同じ結果になる
+    """
+    return random.Random(derive_seed(seed, name))
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+練習譜面をその場で生成するローカルHTTPサーバ
+ビルド対象に無いBPM（例: 175）や新しいシードの譜面も返す
+JSON化したバイト列を (ジェネレータ, バリエーション, BPM, シード) 毎にLRUで保持し、
+同じ譜面の2回目以降はキャッシュから返す
+
+  GET /chart?variant=trill_practice&bpm=175&seed=3   譜面（familyは省略可、seed省略時は新しいシード）
+  GET /variants                                      ジェネレータ毎のバリエーション名
+  GET /stats                                         リクエスト数・キャッシュヒット率・p50/p99レイテンシ
+
+レスポンスヘッダ X-Chart-Seed に譜面のシード、X-Cache に hit/miss を返す
+"""
+import argparse
+import collections
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from bmson_writer import bmson_bytes
+from build_all import FAMILIES
+from build_matrix import family_variants
+from chart_seed import new_seed
+
+# 受け付けるBPMの範囲
+MIN_BPM = 60
+MAX_BPM = 400
+
+# レイテンシの分位点の計算に使う直近のリクエスト数
+LATENCY_WINDOW = 1000
+
+
+class ChartCache:
+    """JSON化した譜面のLRUキャッシュ（max_entries件・max_bytesバイトまで）"""
+
+    def __init__(self, max_entries=128, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        """追加して、上限を超えた分を古い順に捨てる"""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous)
+            self._entries[key] = data
+            self.bytes += len(data)
+            while len(self._entries) > self.max_entries or (self.bytes > self.max_bytes and len(self._entries) > 1):
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class LatencyStats:
+    """リクエスト数・キャッシュヒット数と直近のレイテンシ"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.requests = 0
+        self.hits = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, hit):
+        with self._lock:
+            self.requests += 1
+            self.hits += hit
+            self._latencies.append(seconds)
+
+    def percentile(self, fraction):
+        """直近のレイテンシの分位点（ミリ秒、記録が無ければNone）"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "hits": self.hits,
+            "hit_rate": self.hits / self.requests if self.requests else 0.0,
+            "p50_ms": self.percentile(0.50),
+            "p99_ms": self.percentile(0.99),
+        }
+
+
+class ChartService:
+    """クエリから譜面を生成し、JSON化したバイト列をキャッシュする
+
+    生成は1つずつ行う（同じ譜面の同時リクエストは1回だけ生成する）
+    """
+
+    def __init__(self, cache=None, compact=True):
+        self.cache = cache if cache is not None else ChartCache()
+        self.compact = compact
+        self.stats = LatencyStats()
+        self.variants = {}
+        for family in FAMILIES:
+            for variant in family_variants(family):
+                self.variants[variant["name"]] = (family, variant["options"])
+        self._generate_lock = threading.Lock()
+
+    def resolve(self, query):
+        """クエリ（値は文字列）を (ジェネレータ, バリエーション, BPM, シード) に変換
+
+        不正な値は ValueError（seed省略時は新しいシード）
+        """
+        variant = query.get("variant")
+        if variant not in self.variants:
+            raise ValueError(f"unknown variant: {variant}")
+        family, _ = self.variants[variant]
+        if query.get("family", family) != family:
+            raise ValueError(f"variant {variant} is not in family {query['family']}")
+        try:
+            bpm = int(query.get("bpm", ""))
+        except ValueError:
+            raise ValueError(f"bpm must be an integer: {query.get('bpm')!r}") from None
+        if not MIN_BPM <= bpm <= MAX_BPM:
+            raise ValueError(f"bpm must be between {MIN_BPM} and {MAX_BPM}: {bpm}")
+        if query.get("seed") is None:
+            seed = new_seed()
+        else:
+            try:
+                seed = int(query["seed"])
+            except ValueError:
+                raise ValueError(f"seed must be an integer: {query['seed']!r}") from None
+        return family, variant, bpm, seed
+
+    def chart(self, family, variant, bpm, seed):
+        """(バイト列, キャッシュから返したか)"""
+        start = time.perf_counter()
+        key = (family, variant, bpm, seed)
+        data = self.cache.get(key)
+        hit = data is not None
+        if not hit:
+            with self._generate_lock:
+                data = self.cache.get(key)
+                if data is None:
+                    _, create, _ = FAMILIES[family]
+                    _, options = self.variants[variant]
+                    data = bmson_bytes(create(bpm, **options, seed=seed), self.compact)
+                    self.cache.put(key, data)
+        self.stats.record(time.perf_counter() - start, hit)
+        return data, hit
+
+    def summary(self):
+        return dict(self.stats.summary(), cached=len(self.cache), cached_bytes=self.cache.bytes)
+
+
+class ChartRequestHandler(BaseHTTPRequestHandler):
+    """GET /chart, /variants, /stats（サーバの service 属性の ChartService を使う）"""
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        service = self.server.service
+        if url.path == "/chart":
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            try:
+                family, variant, bpm, seed = service.resolve(query)
+            except ValueError as error:
+                self._send_json(400, {"error": str(error)})
+                return
+            data, hit = service.chart(family, variant, bpm, seed)
+            self._send(200, data, "application/json", {
+                "Content-Disposition": f'inline; filename="{variant}_bpm{bpm}_seed{seed}.bmson"',
+                "X-Chart-Seed": str(seed),
+                "X-Cache": "hit" if hit else "miss",
+            })
+        elif url.path == "/variants":
+            variants = {}
+            for name, (family, _) in service.variants.items():
+                variants.setdefault(family, []).append(name)
+            self._send_json(200, variants)
+        elif url.path == "/stats":
+            self._send_json(200, service.summary())
+        else:
+            self._send_json(404, {"error": f"not found: {url.path}"})
+
+    def _send_json(self, status, value):
+        self._send(status, json.dumps(value, ensure_ascii=False).encode('utf-8'), "application/json")
+
+    def _send(self, status, data, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+def make_server(host="127.0.0.1", port=8765, service=None, quiet=False):
+    """ChartServiceを持つThreadingHTTPServer（port=0で空いているポート）"""
+    server = ThreadingHTTPServer((host, port), ChartRequestHandler)
+    server.daemon_threads = True
+    server.service = service if service is not None else ChartService()
+    server.quiet = quiet
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="練習譜面をその場で生成するローカルHTTPサーバ")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache-entries", type=int, default=128, help="キャッシュする譜面数の上限")
+    parser.add_argument("--cache-mb", type=float, default=256, help="キャッシュするバイト数の上限（MB）")
+    parser.add_argument("--pretty", action="store_true", help="インデント付きの従来形式で返す")
+    parser.add_argument("--quiet", action="store_true", help="リクエスト毎のログを出さない")
+    args = parser.parse_args()
+
+    cache = ChartCache(args.cache_entries, int(args.cache_mb * 1024 * 1024))
+    server = make_server(args.host, args.port, ChartService(cache, not args.pretty), args.quiet)
+    host, port = server.server_address[:2]
+    print(f"Serving charts on http://{host}:{port}/chart?variant=trill_practice&bpm=175")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.service.summary()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+譜面の難易度推定
+ノート列から秒あたりノート数のピーク（スライディングウィンドウ）・同時押しの平均数・
+縦連の密度・皿の密度を求め、info.level（1-12）と info.total（ノート数から）を決める
+NumPyがあれば配列演算でまとめて計算し、無ければ同じ結果をループで計算する
+
+  metrics = rate_chart(bmson)   # info.level / info.total を書き換え、指標を返す
+
+小節毎に書き出す耐久譜面では DifficultyStream に小節毎のノートを渡し、
+書き出し前（全小節の生成後）に同じ指標で info を書き換える
+"""
+import math
+from bisect import bisect_left
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # NumPyが無い環境ではループ版のみ
+    np = None
+
+from chart_data import NoteColumns, NoteLayers
+from timing import BEATS_PER_MEASURE, TimingIndex
+
+# ピーク密度を数える区間（ミリ秒）
+WINDOW_MS = 2000
+# この間隔以内に同じレーンが続くものを縦連として数える（ミリ秒）
+JACK_MS = 250
+
+# 難易度の重み（ピーク密度を基準にした相当ノート数/秒）
+CHORD_WEIGHT = 0.25   # 同時押しの平均数が1増える毎の倍率
+JACK_WEIGHT = 1.5     # 縦連1つ/秒あたり
+SCRATCH_WEIGHT = 1.0  # 皿1つ/秒あたり（ピーク密度に含まれる分への上乗せ）
+
+# 負荷（相当ノート数/秒） -> レベル: LEVEL_SCALE * log2(負荷) + LEVEL_OFFSET を1-12に丸める
+# 全練習譜面で 7ノート/秒の単音が2、最も密な乱打が12になるように合わせた値
+LEVEL_SCALE = 3.2
+LEVEL_OFFSET = -7.0
+MAX_LEVEL = 12
+
+
+def _channel_columns(bmson):
+    """全チャンネルのノートを (レーンの列, 位置の列) で順に返す（NoteLayersは層毎）"""
+    for channel in bmson.get("sound_channels", []):
+        notes = channel["notes"]
+        if isinstance(notes, NoteColumns):
+            yield notes.x, notes.y
+        elif isinstance(notes, NoteLayers):
+            for layer in notes.layers:
+                yield layer.x, layer.y
+        else:
+            yield [note["x"] for note in notes], [note["y"] for note in notes]
+
+
+def playable_notes(bmson):
+    """鍵盤・皿（レーン1-8）のノートを位置順に並べた (レーンのリスト, 位置のリスト)"""
+    pairs = []
+    for x, y in _channel_columns(bmson):
+        pairs.extend((position, lane) for lane, position in zip(x, y) if 1 <= lane <= 8)
+    pairs.sort()
+    return [lane for _, lane in pairs], [position for position, _ in pairs]
+
+
+def _playable_numpy(bmson):
+    """playable_notesの配列演算版（NumPy配列を返す）"""
+    columns = list(_channel_columns(bmson))
+    x = np.concatenate([np.asarray(x, dtype=np.int64) for x, _ in columns] or [np.zeros(0, np.int64)])
+    y = np.concatenate([np.asarray(y, dtype=np.int64) for _, y in columns] or [np.zeros(0, np.int64)])
+    keep = (x >= 1) & (x <= 8)
+    x, y = x[keep], y[keep]
+    order = np.lexsort((x, y))
+    return x[order], y[order]
+
+
+def _metrics_loop(lanes, times):
+    """chart_metricsのループ版（times は昇順の時刻）"""
+    count = len(times)
+    peak = max(bisect_left(times, start + WINDOW_MS, i) - i for i, start in enumerate(times))
+
+    rows = []  # [(時刻, 鍵盤レーンのマスク)]
+    scratch = 0
+    for lane, ms in zip(lanes, times):
+        if lane == 8:
+            scratch += 1
+        elif rows and rows[-1][0] == ms:
+            rows[-1][1] |= 1 << lane
+        else:
+            rows.append([ms, 1 << lane])
+    jacks = 0
+    for (previous_ms, previous_mask), (ms, mask) in zip(rows, rows[1:]):
+        if ms - previous_ms <= JACK_MS:
+            jacks += bin(previous_mask & mask).count("1")
+    return peak, count - scratch, len(rows), jacks, scratch
+
+
+def _metrics_numpy(lanes, times):
+    """chart_metricsの配列演算版"""
+    peak = int((np.searchsorted(times, times + WINDOW_MS, side="left") - np.arange(len(times))).max())
+
+    keys = lanes != 8
+    key_times = times[keys]
+    row_times, starts = np.unique(key_times, return_index=True)
+    jacks = 0
+    if len(row_times) > 1:
+        masks = np.bitwise_or.reduceat(np.left_shift(1, lanes[keys]), starts).astype(np.uint8)
+        close = np.diff(row_times) <= JACK_MS
+        shared = masks[1:] & masks[:-1]
+        jacks = int(np.unpackbits(shared[close][:, None], axis=1).sum())
+    scratch = int(len(lanes) - keys.sum())
+    return peak, len(key_times), len(row_times), jacks, scratch
+
+
+def chart_metrics(bmson, vectorized=None):
+    """難易度の指標
+
+    戻り値: {"notes", "seconds", "mean_nps", "peak_nps", "chord", "jack_nps", "scratch_nps"}
+    vectorized: Trueならnumpy、Falseならループ、Noneならnumpyがあれば使う
+    """
+    if vectorized is None:
+        vectorized = np is not None
+    lanes, ys = _playable_numpy(bmson) if vectorized else playable_notes(bmson)
+    if len(ys) == 0:
+        return _metrics(0, 0.0, 0, 0, 0, 0, 0)
+
+    times = TimingIndex.from_bmson(bmson).to_ms(ys, vectorized=vectorized)
+    measure = _metrics_numpy if vectorized else _metrics_loop
+    peak, key_notes, rows, jacks, scratch = measure(lanes, times)
+    return _metrics(len(ys), float(times[-1] - times[0]), peak, key_notes, rows, jacks, scratch)
+
+
+def _metrics(notes, span_ms, peak, key_notes, rows, jacks, scratch):
+    """数えた値から指標の辞書を作る"""
+    if not notes:
+        return {"notes": 0, "seconds": 0.0, "mean_nps": 0.0, "peak_nps": 0.0,
+                "chord": 0.0, "jack_nps": 0.0, "scratch_nps": 0.0}
+    # 最初から最後のノートまでの長さ（1つの窓より短い譜面は窓の長さとみなす）
+    seconds = max(span_ms, WINDOW_MS) / 1000
+    return {
+        "notes": notes,
+        "seconds": seconds,
+        "mean_nps": notes / seconds,
+        "peak_nps": peak * 1000 / WINDOW_MS,
+        "chord": key_notes / rows if rows else 0.0,
+        "jack_nps": jacks / seconds,
+        "scratch_nps": scratch / seconds,
+    }
+
+
+def chart_load(metrics):
+    """指標から負荷（相当ノート数/秒）"""
+    chord_factor = 1 + CHORD_WEIGHT * max(0.0, metrics["chord"] - 1)
+    return (metrics["peak_nps"] * chord_factor + JACK_WEIGHT * metrics["jack_nps"]
+            + SCRATCH_WEIGHT * metrics["scratch_nps"])
+
+
+def estimate_level(metrics):
+    """指標からレベル（1-12）"""
+    load = chart_load(metrics)
+    if load <= 0:
+        return 1
+    return min(MAX_LEVEL, max(1, round(LEVEL_SCALE * math.log2(load) + LEVEL_OFFSET)))
+
+
+def gauge_total(notes):
+    """ノート数からゲージの総回復量（beatoraja の #TOTAL 未指定時と同じ式）"""
+    return round(max(260.0, 7.605 * notes / (0.01 * notes + 6.5)), 1)
+
+
+def _apply(bmson, metrics):
+    info = bmson["info"]
+    info["level"] = estimate_level(metrics)
+    info["total"] = gauge_total(metrics["notes"])
+    return metrics
+
+
+def rate_chart(bmson, vectorized=None):
+    """info.level と info.total を推定値に書き換え、指標を返す"""
+    return _apply(bmson, chart_metrics(bmson, vectorized))
+
+
+class DifficultyStream:
+    """小節毎に生成されるノートから chart_metrics と同じ指標を一定のメモリで求める
+
+    ゴミの層は未来の行を待ってから出るため、ノートは渡された小節の終わりから
+    1小節分遅れた位置までを確定として数える
+    """
+
+    def __init__(self, bmson):
+        self.bmson = bmson
+        info = bmson["info"]
+        self._index = TimingIndex.from_bmson(bmson)
+        self._lag = BEATS_PER_MEASURE * info.get("resolution", 240)
+        self._pending = []  # 未確定の (位置, レーン)
+        self._window = deque()  # 直近 WINDOW_MS 以内の時刻
+        self._row = None  # 数え途中の鍵盤の行 [時刻, マスク]
+        self._previous_row = None
+        self._first_ms = None
+        self._last_ms = 0.0
+        self._notes = self._peak = self._key_notes = self._rows = self._jacks = self._scratch = 0
+
+    def feed(self, layer_notes, end_y):
+        """1小節分の層毎のNoteColumnsを渡す（end_y: その小節の終わりの位置）"""
+        for notes in layer_notes:
+            self._pending.extend((y, x) for x, y in zip(notes.x, notes.y) if 1 <= x <= 8)
+        self._settle(end_y - self._lag)
+
+    def finish(self):
+        """残りのノートを数えて info.level / info.total を書き換え、指標を返す"""
+        self._settle(None)
+        self._peak = max(self._peak, len(self._window))
+        self._close_row()
+        span = self._last_ms - self._first_ms if self._first_ms is not None else 0.0
+        return _apply(self.bmson, _metrics(self._notes, span, self._peak, self._key_notes,
+                                           self._rows, self._jacks, self._scratch))
+
+    def _settle(self, limit_y):
+        """limit_y より前（Noneなら全て）のノートを位置順に数える"""
+        self._pending.sort()
+        if limit_y is None:
+            ready, self._pending = self._pending, []
+        else:
+            split = bisect_left(self._pending, (limit_y,))
+            ready, self._pending = self._pending[:split], self._pending[split:]
+        for y, lane in ready:
+            ms = self._index.ms_at(y)
+            if self._first_ms is None:
+                self._first_ms = ms
+            self._last_ms = ms
+            self._notes += 1
+            # 窓の先頭から WINDOW_MS 以上離れたら、その先頭から数えた数が確定する
+            while self._window and self._window[0] + WINDOW_MS <= ms:
+                self._peak = max(self._peak, len(self._window))
+                self._window.popleft()
+            self._window.append(ms)
+            if lane == 8:
+                self._scratch += 1
+                continue
+            self._key_notes += 1
+            if self._row is not None and self._row[0] == ms:
+                self._row[1] |= 1 << lane
+            else:
+                self._close_row()
+                self._row = [ms, 1 << lane]
+
+    def _close_row(self):
+        if self._row is None:
+            return
+        self._rows += 1
+        previous = self._previous_row
+        if previous is not None and self._row[0] - previous[0] <= JACK_MS:
+            self._jacks += bin(previous[1] & self._row[1]).count("1")
+        self._previous_row, self._row = self._row, None
@@ -2,14 +2,112 @@
 """
 BMSON生成スクリプト
 """
-import json
-import random
-from trill_patterns import generate_bmson_notes
+from build_matrix import family_bpms, family_variants, iter_charts
+from chart_data import NoteColumns, NoteLayers
+from chart_seed import chart_rng, derive_seed, sub_rng
+from difficulty import DifficultyStream, rate_chart
+from stage_profile import chart, chart_note_count, profile_session, stage
+from trash_layer import TrashStream, place_trash
+from trill_patterns import generate_bmson_notes, iter_trill_measures
+from write_pipeline import ChartWriter
 
-def create_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4th"):
-    """BMSON形式のデータを生成"""
-    notes, scratch_notes, metronome_notes = generate_bmson_notes(bpm, 2)
+def create_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4th", seed=None,
+                 duration_minutes=2, total_measures=None, bases=None):
+    """BMSON形式のデータを生成
+    seed: 乱数シード（省略時は新しいシード、info.seedに記録）
+    total_measures: 総小節数（指定時はduration_minutesより優先、テンポ階段用）
+    bases: 基本譜面の共有用の辞書（trill_base）
+    """
+    base = trill_base(bpm, seed, duration_minutes, total_measures, bases)
+    return compose_bmson(base, include_scratch, include_trash, trash_type)
+
+def trill_base(bpm, seed=None, duration_minutes=2, total_measures=None, bases=None):
+    """基本譜面（トリル・スクラッチ・メトロノーム）を生成
+    バリエーションはこれを共有し、スクラッチ・ゴミを重ねるだけにする
+    bases: 指定時は同じ (BPM, シード, 長さ) の基本譜面をこの辞書から再利用し、無ければ追加する
+           （呼び出し側が共有する範囲を決める、省略時は毎回生成）
+    戻り値: {"bpm", "seed", "notes", "scratch_notes", "metronome_notes"} の辞書（変更しないこと）
+    """
+    seed, rng = chart_rng(seed)
+    key = ("trill", bpm, seed, duration_minutes, total_measures)
+    if bases is not None and key in bases:
+        return bases[key]
+    with stage("pattern") as timer:
+        notes, scratch_notes, metronome_notes = generate_bmson_notes(
+            bpm, duration_minutes, rng=rng, total_measures=total_measures)
+        timer.count(len(notes))
+    base = {
+        "bpm": bpm,
+        "seed": seed,
+        "notes": notes,
+        "scratch_notes": scratch_notes,
+        "metronome_notes": metronome_notes,
+    }
+    if bases is not None:
+        bases[key] = base
+    return base
+
+def compose_bmson(base, include_scratch=False, include_trash=False, trash_type="4th"):
+    """基本譜面にスクラッチ・ゴミの層を重ねたBMSON（基本譜面の配列はコピーしない）"""
+    bpm, seed, notes = base["bpm"], base["seed"], base["notes"]
+    
+    with stage("assemble"):
+        bmson = _trill_template(bpm, include_scratch, include_trash, trash_type, seed)
+        bmson["sound_channels"][0]["notes"] = base["metronome_notes"]
+        
+        # ノートを配置
+        bmson["sound_channels"][1]["notes"] = notes
+        
+        # スクラッチを追加（4分音符）
+        if include_scratch:
+            bmson["sound_channels"][2]["notes"] = base["scratch_notes"]
+    
+    # ゴミノートを追加（基本譜面の後ろに連結）
+    if include_trash:
+        with stage("trash") as timer:
+            trash_notes = place_trash(notes, trash_type, sub_rng(seed, "trash"))
+            bmson["sound_channels"][1]["notes"] = NoteLayers(notes, trash_notes)
+            timer.count(len(trash_notes))
     
+    # 難易度（info.level・info.total をノート列から推定）
+    with stage("difficulty") as timer:
+        timer.count(rate_chart(bmson)["notes"])
+    
+    return bmson
+
+def stream_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4th", seed=None,
+                 duration_minutes=2):
+    """1小節ずつ生成する版（耐久譜面用、create_bmsonと同じ内容）
+    戻り値: (ノートが空のBMSON, 層毎のチャンネル番号, 小節毎の層毎のNoteColumns)
+    """
+    seed, rng = chart_rng(seed)
+    bmson = _trill_template(bpm, include_scratch, include_trash, trash_type, seed)
+    
+    # メトロノーム, トリル, スクラッチ, (トリルのチャンネルに続けるゴミ)
+    layers = [0, 1, 2] + ([1] if include_trash else [])
+    
+    def measures():
+        trash = TrashStream(trash_type, sub_rng(seed, "trash")) if include_trash else None
+        difficulty = DifficultyStream(bmson)
+        end_y = 0
+        for notes, scratch_notes, metronome_notes in iter_trill_measures(bpm, duration_minutes, rng=rng):
+            end_y += 4 * 240
+            layer_notes = [metronome_notes, notes, scratch_notes if include_scratch else NoteColumns()]
+            if trash:
+                layer_notes.append(trash.feed(notes, end_y))
+            difficulty.feed(layer_notes, end_y)
+            yield layer_notes
+        if trash:
+            last = [NoteColumns(), NoteColumns(), NoteColumns(), trash.finish()]
+            difficulty.feed(last, end_y)
+            yield last
+        # 全小節の生成後（ヘッダの書き出し前）に難易度を決める
+        difficulty.finish()
+    
+    return bmson, layers, measures()
+
+def _trill_template(bpm, include_scratch, include_trash, trash_type, seed):
+    """ノートが空のBMSON"""
     # タイトル設定
     if include_trash and trash_type == "8th":
         title = f"16分トリル＋8分ゴミ練習 BPM{bpm}"
@@ -38,7 +136,8 @@ def create_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4t
             "eyecatch_image": "",
             "banner_image": "",
             "preview_music": "",
-            "resolution": 240
+            "resolution": 240,
+            "seed": seed
         },
         "lines": [
             {"name": "", "kx": 1, "ky": 0},  # 1key
@@ -57,132 +156,68 @@ def create_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4t
         "sound_channels": [
             {
                 "name": "metronome.wav",
-                "notes": metronome_notes
+                "notes": NoteColumns()
             },
             {
                 "name": "handclap.wav", 
-                "notes": []  # 後で追加
+                "notes": NoteColumns()  # 後で追加
             },
             {
                 "name": "scratch.wav",
-                "notes": []  # 後で追加
+                "notes": NoteColumns()  # 後で追加
             }
         ]
     }
     
-    # ノートを配置
-    bmson["sound_channels"][1]["notes"] = notes
-    
-    # スクラッチを追加（4分音符）
-    if include_scratch:
-        bmson["sound_channels"][2]["notes"] = scratch_notes
-    
-    # ゴミノートを追加
-    if include_trash:
-        trash_notes = []
-        trill_notes_dict = {}  # y座標でトリルノートを管理
-        
-        # トリルノートをy座標でインデックス化
-        for note in notes:
-            trill_notes_dict[note["y"]] = note["x"]
-        
-        # ゴミノートのタイミングを決定
-        resolution = 240
-        for note in notes:
-            y = note["y"]
-            place_trash = False
-            
-            if trash_type == "4th":
-                # 4分音符の位置（2拍目と4拍目）
-                if (y % resolution) == (resolution // 2):
-                    place_trash = True
-            elif trash_type == "8th":
-                # 8分音符の位置（裏拍）
-                if (y % (resolution // 2)) == (resolution // 4):
-                    place_trash = True
-            
-            if place_trash:
-                # 過去3つと未来2つのトリルレーンを確認
-                excluded_lanes = set()
-                
-                # 現在のレーン
-                excluded_lanes.add(note["x"])
-                
-                # 過去3つのレーンを確認
-                for i in range(1, 4):
-                    check_y = y - (i * resolution // 4)
-                    if check_y in trill_notes_dict:
-                        excluded_lanes.add(trill_notes_dict[check_y])
-                
-                # 未来2つのレーンを確認
-                for i in range(1, 3):
-                    check_y = y + (i * resolution // 4)
-                    if check_y in trill_notes_dict:
-                        excluded_lanes.add(trill_notes_dict[check_y])
-                
-                # 利用可能なレーンから選択
-                available_lanes = [x for x in range(1, 8) if x not in excluded_lanes]
-                if available_lanes:
-                    trash_lane = random.choice(available_lanes)
-                    trash_notes.append({
-                        "x": trash_lane,
-                        "y": y,
-                        "l": 0,
-                        "c": False
-                    })
-        
-        # ゴミノートを追加
-        bmson["sound_channels"][1]["notes"].extend(trash_notes)
-    
     return bmson
 
-def generate_all_difficulties():
-    """全BPMのBMSONファイルを生成"""
-    bpms = range(100, 240, 20)  # 100-220を20刻み
-    
-    # トリルのみ
-    print("=== トリルのみバージョン ===")
-    for bpm in bpms:
-        bmson = create_bmson(bpm, include_scratch=False, include_trash=False)
-        filename = f"trill_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
-        
-        print(f"Generated: {filename}")
-    
-    # トリル＋4分皿
-    print("\n=== トリル＋4分皿バージョン ===")
-    for bpm in bpms:
-        bmson = create_bmson(bpm, include_scratch=True, include_trash=False)
-        filename = f"trill_scratch_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
-        
-        print(f"Generated: {filename}")
-    
-    # トリル＋4分ゴミ
-    print("\n=== トリル＋4分ゴミバージョン ===")
-    for bpm in bpms:
-        bmson = create_bmson(bpm, include_scratch=False, include_trash=True, trash_type="4th")
-        filename = f"trill_trash_4th_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
-        
-        print(f"Generated: {filename}")
-    
-    # トリル＋8分ゴミ
-    print("\n=== トリル＋8分ゴミバージョン ===")
-    for bpm in bpms:
-        bmson = create_bmson(bpm, include_scratch=False, include_trash=True, trash_type="8th")
-        filename = f"trill_trash_8th_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
+# ビルド対象の全BPM（build_matrix.json）
+BPMS = family_bpms("trill")
+
+# (ファイル名プレフィックス, create_bmsonの引数, 見出し)
+TRILL_VARIANTS = [(variant["name"], variant["options"], variant["heading"]) for variant in family_variants("trill")]
+
+def trill_base_key(bpm):
+    """BPM毎の基本譜面のシードを導出する鍵（全バリエーションで共通）"""
+    return f"trill_bpm{bpm}"
+
+def trill_jobs(where=None):
+    """全譜面の (バリエーション, BPM, ファイル名, create_bmsonの引数) を列挙
+    where: build_matrix.ChartFilter（合う譜面だけを列挙）
+    """
+    for job in iter_charts(["trill"], where):
+        yield job["variant"], job["bpm"], job["filename"], job["kwargs"]
+
+def generate_all_difficulties(compact=True, seed=None):
+    """全BPMのBMSONファイルを生成
+    compact: Falseでインデント付きの従来形式で書き出す
+    seed: マスターシード（指定時はBPM毎の基本譜面のシードを導出）
+    環境変数 BMSON_PROFILE で段階別の計測を有効にできる（stage_profile参照）
+    書き込みは ChartWriter のスレッドで生成と並行して行う
+    """
+    with profile_session(), ChartWriter() as writer:
+        # BPM毎の基本譜面を1回だけ生成し、全バリエーションで共有
+        bases = {}
+        for bpm in BPMS:
+            with chart(trill_base_key(bpm)), writer.generating():
+                base_seed = derive_seed(seed, trill_base_key(bpm)) if seed is not None else None
+                bases[bpm] = trill_base(bpm, base_seed)
         
-        print(f"Generated: {filename}")
+        for index, (prefix, options, heading) in enumerate(TRILL_VARIANTS):
+            if index:
+                print()
+            print(f"=== {heading} ===")
+            for bpm in BPMS:
+                filename = f"{prefix}_bpm{bpm}.bmson"
+                with chart(filename):
+                    with writer.generating():
+                        bmson = compose_bmson(bases[bpm], **options)
+                    
+                    with stage("write") as timer:
+                        writer.save(filename, bmson, compact)
+                        timer.count(chart_note_count(bmson))
+                print(f"Generated: {filename}")
+    print(f"\n{writer.summary()}")
 
 if __name__ == "__main__":
-    generate_all_difficulties()
\ No newline at end of file
+    generate_all_difficulties()
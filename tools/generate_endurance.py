@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+耐久譜面の生成
+長時間の譜面を1小節ずつ生成して書き出し、譜面の長さに関わらずメモリ使用量を一定に保つ
+バリエーション名はビルド対象の譜面と同じ（例: trill_trash_4th_practice, random_1_2_random_practice）
+"""
+import argparse
+import os
+import time
+
+try:
+    import resource
+except ImportError:  # Windowsではピークメモリを表示しない
+    resource = None
+
+from bmson_writer import save_bmson_stream
+from build_all import list_jobs
+from chart_seed import derive_seed
+from generate_bmson import stream_bmson
+from generate_stair_bmson import stream_stair_bmson
+from generate_random_bmson import stream_random_bmson
+
+# ジェネレータ名 -> 1小節ずつ生成する版のBMSON生成関数
+STREAM_FUNCTIONS = {
+    "trill": stream_bmson,
+    "stair": stream_stair_bmson,
+    "random": stream_random_bmson,
+}
+
+
+def find_variant(variant):
+    """バリエーション名のジョブ（BPMは最初のもの）"""
+    for job in list_jobs():
+        if job["variant"] == variant:
+            return job
+    raise ValueError(f"unknown variant: {variant}")
+
+
+def peak_rss_mb():
+    """このプロセスのピークメモリ（MB、取得できなければNone）"""
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def generate_endurance(variant, bpm, duration_minutes, path, seed=0, compact=True):
+    """耐久譜面を1つ生成して書き出す"""
+    job = find_variant(variant)
+    kwargs = dict(job["kwargs"], bpm=bpm, duration_minutes=duration_minutes)
+    chart_seed = derive_seed(seed, os.path.basename(path))
+    bmson, layers, measures = STREAM_FUNCTIONS[job["family"]](**kwargs, seed=chart_seed)
+    save_bmson_stream(path, bmson, layers, measures, compact)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="耐久譜面を一定のメモリで生成")
+    parser.add_argument("variant", help="バリエーション名（例: trill_trash_4th_practice）")
+    parser.add_argument("--bpm", type=int, default=240)
+    parser.add_argument("--minutes", type=float, default=60, help="譜面の長さ（分）")
+    parser.add_argument("--seed", default="0", help="マスターシード")
+    parser.add_argument("--output", help="出力ファイル（省略時は <バリエーション>_bpm<BPM>_<分>min.bmson）")
+    parser.add_argument("--pretty", action="store_true", help="インデント付きの従来形式で書き出す")
+    args = parser.parse_args()
+
+    path = args.output or f"{args.variant}_bpm{args.bpm}_{args.minutes:g}min.bmson"
+    start = time.perf_counter()
+    try:
+        generate_endurance(args.variant, args.bpm, args.minutes, path, args.seed, not args.pretty)
+    except ValueError as error:
+        parser.error(str(error))
+    elapsed = time.perf_counter() - start
+
+    peak = peak_rss_mb()
+    peak_text = f", peak RSS {peak:.1f} MB" if peak is not None else ""
+    print(f"Generated: {path} ({os.path.getsize(path)} bytes in {elapsed:.2f}s{peak_text})")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,25 +2,103 @@
 """
 乱打練習用BMSON生成
 """
-import json
+from build_matrix import family_bpms, family_variants, iter_charts, load_matrix
+from chart_data import NoteColumns
+from chart_seed import chart_rng, derive_seed, sub_rng
+from difficulty import DifficultyStream, rate_chart
+from stage_profile import chart, chart_note_count, profile_session, stage
+from trash_layer import TrashStream, place_trash
 from random_patterns import RandomPatternGenerator
+from write_pipeline import ChartWriter
 
-def create_random_bmson(bpm, chord_sizes, pattern_name, scratch_interval=None, scratch_probability=1.0):
-    """乱打練習用BMSONを生成"""
+def create_random_bmson(bpm, chord_sizes, pattern_name, scratch_interval=None, scratch_probability=1.0, seed=None,
+                        include_trash=False, trash_type="4th", duration_minutes=2, total_measures=None,
+                        constraints=None):
+    """乱打練習用BMSONを生成
+    seed: 乱数シード（省略時は新しいシード、info.seedに記録）
+    include_trash: 4分/8分ゴミ（trash_type）を追加
+    total_measures: 総小節数（指定時はduration_minutesより優先、テンポ階段用）
+    constraints: 和音の制約（random_patterns.make_constraintsの辞書、省略時は縦連の規則のみ）
+    """
+    seed, rng = chart_rng(seed)
     
     # パターンジェネレータを作成
-    generator = RandomPatternGenerator(chord_sizes)
-    notes, scratch_notes, metronome_notes = generator.generate_notes(bpm, 2, scratch_interval, scratch_probability)
+    with stage("pattern") as timer:
+        generator = RandomPatternGenerator(chord_sizes, rng, constraints)
+        notes, scratch_notes, metronome_notes = generator.generate_notes(
+            bpm, duration_minutes, scratch_interval, scratch_probability, total_measures)
+        timer.count(len(notes) + len(scratch_notes))
     
+    # ゴミノートを追加
+    if include_trash:
+        with stage("trash") as timer:
+            trash_notes = place_trash(notes, trash_type, sub_rng(seed, "trash"))
+            notes.extend_columns(trash_notes)
+            timer.count(len(trash_notes))
+    
+    with stage("assemble"):
+        bmson = _random_template(bpm, pattern_name, scratch_interval, scratch_probability, include_trash, trash_type, seed)
+        bmson["sound_channels"][0]["notes"] = notes
+        bmson["sound_channels"][1]["notes"] = scratch_notes
+        bmson["sound_channels"][2]["notes"] = metronome_notes
+    
+    # 難易度（info.level・info.total をノート列から推定）
+    with stage("difficulty") as timer:
+        timer.count(rate_chart(bmson)["notes"])
+    
+    return bmson
+
+def stream_random_bmson(bpm, chord_sizes, pattern_name, scratch_interval=None, scratch_probability=1.0, seed=None,
+                        include_trash=False, trash_type="4th", duration_minutes=2, constraints=None):
+    """1小節ずつ生成する版（耐久譜面用、create_random_bmsonと同じ内容）
+    戻り値: (ノートが空のBMSON, 層毎のチャンネル番号, 小節毎の層毎のNoteColumns)
+    """
+    seed, rng = chart_rng(seed)
+    bmson = _random_template(bpm, pattern_name, scratch_interval, scratch_probability, include_trash, trash_type, seed)
+    
+    # 乱打, スクラッチ, メトロノーム, (乱打のチャンネルに続けるゴミ)
+    layers = [0, 1, 2] + ([0] if include_trash else [])
+    
+    def measures():
+        trash = TrashStream(trash_type, sub_rng(seed, "trash")) if include_trash else None
+        difficulty = DifficultyStream(bmson)
+        generator = RandomPatternGenerator(chord_sizes, rng, constraints)
+        end_y = 0
+        for layer_notes in generator.iter_measures(bpm, duration_minutes, scratch_interval, scratch_probability):
+            end_y += 4 * 240
+            if trash:
+                layer_notes += (trash.feed(layer_notes[0], end_y),)
+            difficulty.feed(layer_notes, end_y)
+            yield layer_notes
+        if trash:
+            last = [NoteColumns(), NoteColumns(), NoteColumns(), trash.finish()]
+            difficulty.feed(last, end_y)
+            yield last
+        # 全小節の生成後（ヘッダの書き出し前）に難易度を決める
+        difficulty.finish()
+    
+    return bmson, layers, measures()
+
+def _random_template(bpm, pattern_name, scratch_interval, scratch_probability, include_trash, trash_type, seed):
+    """ノートが空のBMSON"""
     # タイトル設定
     if scratch_interval == 4:
-        title = f"{pattern_name}＋4分皿 BPM{bpm}"
+        scratch_text = "＋4分皿"
     elif scratch_interval == 8:
-        title = f"{pattern_name}＋8分皿{int(scratch_probability*100)}% BPM{bpm}"
+        scratch_text = f"＋8分皿{int(scratch_probability*100)}%"
     elif scratch_interval == 16:
-        title = f"{pattern_name}＋16分皿{int(scratch_probability*100)}% BPM{bpm}"
+        scratch_text = f"＋16分皿{int(scratch_probability*100)}%"
+    else:
+        scratch_text = ""
+    
+    if include_trash and trash_type == "8th":
+        trash_text = "＋8分ゴミ"
+    elif include_trash and trash_type == "4th":
+        trash_text = "＋4分ゴミ"
     else:
-        title = f"{pattern_name} BPM{bpm}"
+        trash_text = ""
+    
+    title = f"{pattern_name}{scratch_text}{trash_text} BPM{bpm}"
     
     bmson = {
         "version": "1.0.0",
@@ -35,7 +113,8 @@ def create_random_bmson(bpm, chord_sizes, pattern_name, scratch_interval=None, s
             "judge_rank": 100,
             "total": 100.0,
             "init_bpm": float(bpm),
-            "base_bpm": float(bpm)
+            "base_bpm": float(bpm),
+            "seed": seed
         },
         "lines": [
             {"name": "", "kx": 1, "ky": 0},
@@ -52,66 +131,67 @@ def create_random_bmson(bpm, chord_sizes, pattern_name, scratch_interval=None, s
         "sound_channels": [
             {
                 "name": "handclap.wav",
-                "notes": notes
+                "notes": NoteColumns()
             },
             {
                 "name": "scratch.wav",
-                "notes": scratch_notes
+                "notes": NoteColumns()
             },
             {
                 "name": "metronome.wav",
-                "notes": metronome_notes
+                "notes": NoteColumns()
             }
         ]
     }
     
     return bmson
 
-def generate_all_patterns():
-    """全パターンのBMSONファイルを生成"""
-    bpms = range(100, 260, 20)  # 100-240を20刻み
-    
-    pattern_configs = [
-        ([1], "01_[1]乱打", "1_random"),
-        ([1, 2], "02_[1, 2]乱打", "1_2_random"),
-        ([1, 2, 2], "03_[1, 2, 2]乱打", "1_2_2_random"),
-        ([1, 1, 2, 2, 3], "04_[1, 1, 2, 2, 3]乱打", "1_1_2_2_3_random"),
-        ([1, 2, 3], "05_[1, 2, 3]乱打", "1_2_3_random"),
-        ([1, 1, 1, 2, 2, 2, 3, 4], "06_[1, 1, 1, 2, 2, 2, 3, 4]乱打", "1_1_1_2_2_2_3_4_random"),
-        ([1, 1, 1, 1, 2, 2, 2, 3, 3, 4], "07_[1, 1, 1, 2, 2, 2, 3, 3, 4]乱打", "1_1_1_2_2_2_3_3_4_random"),
-        ([1, 2, 3, 4], "08_[1, 2, 3, 4]乱打", "1_2_3_4_random")
-    ]
-    
-    scratch_configs = [
-        (None, 1.0, ""),
-        (4, 1.0, "_4th_scratch"),
-        (8, 0.25, "_8th_scratch_25"),
-        (8, 0.5, "_8th_scratch_50"),
-        (16, 0.25, "_16th_scratch_25")
-    ]
-    
-    for chord_sizes, pattern_name, filename_suffix in pattern_configs:
-        for scratch_interval, scratch_probability, scratch_suffix in scratch_configs:
-            # 8分皿と16分皿は[1]と[1,2]のみ
-            if scratch_interval in [8, 16] and chord_sizes not in [[1], [1, 2], [1, 2, 2], [1, 1, 2, 2, 3]]:
-                continue
-                
-            if scratch_interval:
-                interval_name = f"{scratch_interval}分" if scratch_interval == 4 else f"{scratch_interval}分"
-                prob_text = f"{int(scratch_probability*100)}%" if scratch_probability < 1.0 else ""
-                print(f"=== {pattern_name}＋{interval_name}皿{prob_text} ===")
-            else:
-                print(f"=== {pattern_name} ===")
-                
-            for bpm in bpms:
-                bmson = create_random_bmson(bpm, chord_sizes, pattern_name, scratch_interval, scratch_probability)
-                filename = f"random_{filename_suffix}{scratch_suffix}_practice_bpm{bpm}.bmson"
-                
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(bmson, f, indent=2, ensure_ascii=False)
+# ビルド対象の全BPM（build_matrix.json）
+BPMS = family_bpms("random")
+
+# (同時押し数の配列, パターン名, ファイル名サフィックス)
+PATTERN_CONFIGS = [(pattern["chord_sizes"], pattern["name"], f"{pattern['chord']}_random")
+                   for pattern in load_matrix()["random"]["patterns"]]
+
+def random_variants():
+    """生成対象の (バリエーション名, create_random_bmsonの引数（BPM以外）, 見出し) を列挙
+    パターンと皿の組み合わせのうち build_matrix.json の exclude に合うものは除く
+    （8分皿と16分皿は同時押しの少ないパターンのみ）
+    """
+    for variant in family_variants("random"):
+        yield variant["name"], variant["options"], variant["heading"]
+
+def random_jobs(where=None):
+    """全譜面の (バリエーション, BPM, ファイル名, create_random_bmsonの引数) を列挙
+    where: build_matrix.ChartFilter（合う譜面だけを列挙）
+    """
+    for job in iter_charts(["random"], where):
+        yield job["variant"], job["bpm"], job["filename"], job["kwargs"]
+
+def generate_all_patterns(compact=True, seed=None):
+    """全パターンのBMSONファイルを生成
+    compact: Falseでインデント付きの従来形式で書き出す
+    seed: マスターシード（指定時は譜面毎のシードをファイル名から導出）
+    環境変数 BMSON_PROFILE で段階別の計測を有効にできる（stage_profile参照）
+    書き込みは ChartWriter のスレッドで生成と並行して行う
+    """
+    with profile_session(), ChartWriter() as writer:
+        for variant, options, heading in random_variants():
+            print(f"=== {heading} ===")
                 
+            for bpm in BPMS:
+                filename = f"{variant}_bpm{bpm}.bmson"
+                chart_seed = derive_seed(seed, filename) if seed is not None else None
+                with chart(filename):
+                    with writer.generating():
+                        bmson = create_random_bmson(bpm, **options, seed=chart_seed)
+                    
+                    with stage("write") as timer:
+                        writer.save(filename, bmson, compact)
+                        timer.count(chart_note_count(bmson))
                 print(f"Generated: {filename}")
             print()
+    print(writer.summary())
 
 if __name__ == "__main__":
-    generate_all_patterns()
\ No newline at end of file
+    generate_all_patterns()
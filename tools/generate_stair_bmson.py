@@ -5,13 +5,142 @@
 - 階段＋4分皿バージョン
 - 階段＋4分ゴミバージョン（過去3世代除外）
 """
-import json
-import random
+from build_matrix import family_bpms, family_variants, iter_charts
+from chart_data import NoteColumns, NoteLayers
+from chart_seed import chart_rng, derive_seed, sub_rng
+from difficulty import DifficultyStream, rate_chart
+from stage_profile import chart, chart_note_count, profile_session, stage
+from trash_layer import TrashStream, place_trash
 from stair_patterns import StairPatternGenerator
+from write_pipeline import ChartWriter
 
-def create_stair_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4th"):
-    """階段練習用BMSONを生成"""
+def create_stair_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4th", seed=None,
+                       duration_minutes=2, total_measures=None, bases=None):
+    """階段練習用BMSONを生成
+    seed: 乱数シード（省略時は新しいシード、info.seedに記録）
+    total_measures: 総小節数（指定時はduration_minutesより優先、テンポ階段用）
+    bases: 基本譜面の共有用の辞書（stair_base）
+    """
+    base = stair_base(bpm, seed, duration_minutes, total_measures, bases)
+    return compose_stair_bmson(base, include_scratch, include_trash, trash_type)
+
+def stair_base(bpm, seed=None, duration_minutes=2, total_measures=None, bases=None):
+    """基本譜面（階段・スクラッチ・メトロノーム）を生成
+    バリエーションはこれを共有し、スクラッチ・ゴミを重ねるだけにする
+    bases: 指定時は同じ (BPM, シード, 長さ) の基本譜面をこの辞書から再利用し、無ければ追加する
+           （呼び出し側が共有する範囲を決める、省略時は毎回生成）
+    戻り値: {"bpm", "seed", "notes", "scratch_notes", "metronome_notes"} の辞書（変更しないこと）
+    """
+    seed, rng = chart_rng(seed)
+    key = ("stair", bpm, seed, duration_minutes, total_measures)
+    if bases is not None and key in bases:
+        return bases[key]
+    resolution = 240
+    beats_per_measure = 4
+    if total_measures is None:
+        total_measures = stair_measure_count(bpm, duration_minutes)
+    
+    # パス1: 階段ノートを生成（事前計算済みのパターンをまとめて配置）
+    with stage("pattern") as timer:
+        generator = StairPatternGenerator(rng=rng)
+        lanes, slots = generator.generate_measures(total_measures)
+        stair_notes = NoteColumns(lanes, [slot * resolution // 4 for slot in slots])
+        timer.count(len(stair_notes))
+    
+    # メトロノーム・スクラッチ（4分音符）
+    with stage("beats") as timer:
+        beat_pulses = [beat * resolution for beat in range(total_measures * beats_per_measure)]
+        metronome_notes = NoteColumns([0] * len(beat_pulses), beat_pulses)
+        scratch_notes = NoteColumns([8] * len(beat_pulses), beat_pulses)
+        timer.count(len(beat_pulses) * 2)
+    
+    base = {
+        "bpm": bpm,
+        "seed": seed,
+        "notes": stair_notes,
+        "scratch_notes": scratch_notes,
+        "metronome_notes": metronome_notes,
+    }
+    if bases is not None:
+        bases[key] = base
+    return base
+
+def compose_stair_bmson(base, include_scratch=False, include_trash=False, trash_type="4th"):
+    """基本譜面にスクラッチ・ゴミの層を重ねたBMSON（基本譜面の配列はコピーしない）"""
+    bpm, seed, stair_notes = base["bpm"], base["seed"], base["notes"]
+    
+    with stage("assemble"):
+        bmson = _stair_template(bpm, include_scratch, include_trash, trash_type, seed)
+        bmson["sound_channels"][0]["notes"] = stair_notes
+        bmson["sound_channels"][2]["notes"] = base["metronome_notes"]
+        if include_scratch:
+            bmson["sound_channels"][1]["notes"] = base["scratch_notes"]
+    
+    # パス2: ゴミノートを追加（基本譜面の後ろに連結）
+    if include_trash:
+        with stage("trash") as timer:
+            trash_notes = place_trash(stair_notes, trash_type, sub_rng(seed, "trash"))
+            bmson["sound_channels"][0]["notes"] = NoteLayers(stair_notes, trash_notes)
+            timer.count(len(trash_notes))
+    
+    # 難易度（info.level・info.total をノート列から推定）
+    with stage("difficulty") as timer:
+        timer.count(rate_chart(bmson)["notes"])
+    
+    return bmson
+
+def stream_stair_bmson(bpm, include_scratch=False, include_trash=False, trash_type="4th", seed=None,
+                       duration_minutes=2):
+    """1小節ずつ生成する版（耐久譜面用、create_stair_bmsonと同じ内容）
+    戻り値: (ノートが空のBMSON, 層毎のチャンネル番号, 小節毎の層毎のNoteColumns)
+    """
+    seed, rng = chart_rng(seed)
+    bmson = _stair_template(bpm, include_scratch, include_trash, trash_type, seed)
     
+    resolution = 240
+    beats_per_measure = 4
+    total_measures = stair_measure_count(bpm, duration_minutes)
+    
+    # 階段, スクラッチ, メトロノーム, (階段のチャンネルに続けるゴミ)
+    layers = [0, 1, 2] + ([0] if include_trash else [])
+    
+    def measures():
+        trash = TrashStream(trash_type, sub_rng(seed, "trash")) if include_trash else None
+        difficulty = DifficultyStream(bmson)
+        generator = StairPatternGenerator(rng=rng)
+        end_y = 0
+        for lanes, slots in generator.iter_measures(total_measures):
+            measure = slots.start // 16
+            end_y = (measure + 1) * beats_per_measure * resolution
+            stair_notes = NoteColumns(lanes, [slot * resolution // 4 for slot in slots])
+            beat_pulses = [(measure * beats_per_measure + beat) * resolution for beat in range(beats_per_measure)]
+            metronome_notes = NoteColumns([0] * beats_per_measure, beat_pulses)
+            scratch_notes = NoteColumns([8] * beats_per_measure, beat_pulses) if include_scratch else NoteColumns()
+            layer_notes = [stair_notes, scratch_notes, metronome_notes]
+            if trash:
+                layer_notes.append(trash.feed(stair_notes, end_y))
+            difficulty.feed(layer_notes, end_y)
+            yield layer_notes
+        if trash:
+            last = [NoteColumns(), NoteColumns(), NoteColumns(), trash.finish()]
+            difficulty.feed(last, end_y)
+            yield last
+        # 全小節の生成後（ヘッダの書き出し前）に難易度を決める
+        difficulty.finish()
+    
+    return bmson, layers, measures()
+
+def stair_measure_count(bpm, duration_minutes=2):
+    """総小節数（duration_minutesを超えるまで2小節単位）"""
+    beats_per_measure = 4
+    total_beats = int(bpm * duration_minutes)
+    total_measures = total_beats // beats_per_measure
+    if total_measures % 2 != 0:
+        total_measures += 1
+    return total_measures
+
+def _stair_template(bpm, include_scratch, include_trash, trash_type, seed):
+    """ノートが空のBMSON"""
     # 基本情報
     if include_trash and trash_type == "8th":
         title_base = f"階段＋8分ゴミ練習 BPM{bpm}"
@@ -35,7 +164,8 @@ def create_stair_bmson(bpm, include_scratch=False, include_trash=False, trash_ty
             "judge_rank": 100,
             "total": 100.0,
             "init_bpm": float(bpm),
-            "base_bpm": float(bpm)
+            "base_bpm": float(bpm),
+            "seed": seed
         },
         "lines": [],
         "bpm_events": [],
@@ -43,170 +173,68 @@ def create_stair_bmson(bpm, include_scratch=False, include_trash=False, trash_ty
         "sound_channels": [
             {
                 "name": "handclap.wav",
-                "notes": []
+                "notes": NoteColumns()
             },
             {
                 "name": "scratch.wav", 
-                "notes": []
+                "notes": NoteColumns()
             },
             {
                 "name": "metronome.wav",
-                "notes": []
+                "notes": NoteColumns()
             }
         ]
     }
     
-    # 階段パターン生成
-    generator = StairPatternGenerator()
-    pattern_gen = generator.pattern_generator()
-    
-    resolution = 240
-    beats_per_measure = 4
-    duration_minutes = 2
-    
-    # 総小節数（2分を超えるまで2小節単位）
-    total_beats = int(bpm * duration_minutes)
-    total_measures = total_beats // beats_per_measure
-    if total_measures % 2 != 0:
-        total_measures += 1
-    
-    # パス1: 階段ノートを生成
-    current_y = 0
-    current_pattern = None
-    pattern_position = 0
-    stair_notes = []  # 階段ノートの位置を記録
-    
-    for measure in range(total_measures):
-        # パターンが終了したら次のパターンを取得
-        if current_pattern is None or pattern_position >= len(current_pattern['notes']):
-            current_pattern = next(pattern_gen)
-            pattern_position = 0
-        
-        # 1小節分のノートを配置
-        for i in range(16):  # 16分音符16個
-            note_y = current_y + (i * resolution // 4)
-            
-            # 階段ノート
-            if pattern_position < len(current_pattern['notes']):
-                lane = current_pattern['notes'][pattern_position]
-                bmson["sound_channels"][0]["notes"].append({
-                    "x": lane,
-                    "y": note_y,
-                    "l": 0,
-                    "c": False
-                })
-                stair_notes.append((note_y, lane))
-                pattern_position += 1
-            
-            # メトロノーム（4分音符）
-            if i % 4 == 0:
-                bmson["sound_channels"][2]["notes"].append({
-                    "x": 0,
-                    "y": note_y,
-                    "l": 0,
-                    "c": False
-                })
-                
-                # スクラッチ（4分音符）
-                if include_scratch:
-                    bmson["sound_channels"][1]["notes"].append({
-                        "x": 8,
-                        "y": note_y,
-                        "l": 0,
-                        "c": False
-                    })
-        
-        current_y += beats_per_measure * resolution
-    
-    # パス2: ゴミノートを追加
-    if include_trash:
-        for i, (y, lane) in enumerate(stair_notes):
-            # ゴミ配置タイミングの判定
-            place_trash = False
-            if trash_type == "4th":
-                # 4分音符の位置（2拍目と4拍目）
-                if (y % resolution) == (resolution // 2):
-                    place_trash = True
-            elif trash_type == "8th":
-                # 8分音符の位置（裏拍）
-                if (y % (resolution // 2)) == (resolution // 4):
-                    place_trash = True
-            
-            if place_trash:
-                # 過去3つと未来2つのノートを確認
-                excluded_lanes = set()
-                
-                # 過去3つ
-                for j in range(max(0, i-3), i):
-                    excluded_lanes.add(stair_notes[j][1])
-                
-                # 現在
-                excluded_lanes.add(lane)
-                
-                # 未来2つ
-                for j in range(i+1, min(i+3, len(stair_notes))):
-                    excluded_lanes.add(stair_notes[j][1])
-                
-                # 利用可能なレーンから選択
-                available_lanes = [x for x in range(1, 8) if x not in excluded_lanes]
-                if available_lanes:
-                    trash_lane = random.choice(available_lanes)
-                    bmson["sound_channels"][0]["notes"].append({
-                        "x": trash_lane,
-                        "y": y,
-                        "l": 0,
-                        "c": False
-                    })
-    
     return bmson
 
-def generate_stair_difficulties():
-    """全BPMの階段譜面を生成"""
-    bpms = range(100, 240, 20)  # 100-220を20刻み
-    
-    # 階段のみ
-    print("=== 階段のみバージョン ===")
-    for bpm in bpms:
-        bmson = create_stair_bmson(bpm, include_scratch=False, include_trash=False)
-        filename = f"stair_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
-        
-        print(f"Generated: {filename}")
-    
-    # 階段＋4分皿
-    print("\n=== 階段＋4分皿バージョン ===")
-    for bpm in bpms:
-        bmson = create_stair_bmson(bpm, include_scratch=True, include_trash=False)
-        filename = f"stair_scratch_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
-        
-        print(f"Generated: {filename}")
-    
-    # 階段＋4分ゴミ
-    print("\n=== 階段＋4分ゴミバージョン ===")
-    for bpm in bpms:
-        bmson = create_stair_bmson(bpm, include_scratch=False, include_trash=True, trash_type="4th")
-        filename = f"stair_trash_4th_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
-        
-        print(f"Generated: {filename}")
-    
-    # 階段＋8分ゴミ
-    print("\n=== 階段＋8分ゴミバージョン ===")
-    for bpm in bpms:
-        bmson = create_stair_bmson(bpm, include_scratch=False, include_trash=True, trash_type="8th")
-        filename = f"stair_trash_8th_practice_bpm{bpm}.bmson"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(bmson, f, indent=2, ensure_ascii=False)
+# ビルド対象の全BPM（build_matrix.json）
+BPMS = family_bpms("stair")
+
+# (ファイル名プレフィックス, create_stair_bmsonの引数, 見出し)
+STAIR_VARIANTS = [(variant["name"], variant["options"], variant["heading"]) for variant in family_variants("stair")]
+
+def stair_base_key(bpm):
+    """BPM毎の基本譜面のシードを導出する鍵（全バリエーションで共通）"""
+    return f"stair_bpm{bpm}"
+
+def stair_jobs(where=None):
+    """全譜面の (バリエーション, BPM, ファイル名, create_stair_bmsonの引数) を列挙
+    where: build_matrix.ChartFilter（合う譜面だけを列挙）
+    """
+    for job in iter_charts(["stair"], where):
+        yield job["variant"], job["bpm"], job["filename"], job["kwargs"]
+
+def generate_stair_difficulties(compact=True, seed=None):
+    """全BPMの階段譜面を生成
+    compact: Falseでインデント付きの従来形式で書き出す
+    seed: マスターシード（指定時はBPM毎の基本譜面のシードを導出）
+    環境変数 BMSON_PROFILE で段階別の計測を有効にできる（stage_profile参照）
+    書き込みは ChartWriter のスレッドで生成と並行して行う
+    """
+    with profile_session(), ChartWriter() as writer:
+        # BPM毎の基本譜面を1回だけ生成し、全バリエーションで共有
+        bases = {}
+        for bpm in BPMS:
+            with chart(stair_base_key(bpm)), writer.generating():
+                base_seed = derive_seed(seed, stair_base_key(bpm)) if seed is not None else None
+                bases[bpm] = stair_base(bpm, base_seed)
         
-        print(f"Generated: {filename}")
+        for index, (prefix, options, heading) in enumerate(STAIR_VARIANTS):
+            if index:
+                print()
+            print(f"=== {heading} ===")
+            for bpm in BPMS:
+                filename = f"{prefix}_bpm{bpm}.bmson"
+                with chart(filename):
+                    with writer.generating():
+                        bmson = compose_stair_bmson(bases[bpm], **options)
+                    
+                    with stage("write") as timer:
+                        writer.save(filename, bmson, compact)
+                        timer.count(chart_note_count(bmson))
+                print(f"Generated: {filename}")
+    print(f"\n{writer.summary()}")
 
 if __name__ == "__main__":
-    generate_stair_difficulties()
\ No newline at end of file
+    generate_stair_difficulties()
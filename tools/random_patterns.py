@@ -4,48 +4,328 @@
 16分音符で様々な同時押しパターンを生成
 """
 import random
+from fractions import Fraction
+from itertools import combinations
+from math import lcm
+
+from chart_data import NoteColumns
+
+# 鍵盤レーン（1-7）
+LANES = range(1, 8)
+
+# 和音はレーンのビットマスク（bit n = レーンn）で表す
+# マスク -> 和音のレーン（昇順）
+CHORD_LANES = [tuple(lane for lane in LANES if mask >> lane & 1) for mask in range(256)]
+
+# 左手・右手のレーン（片手の連続の制約用）
+HANDS = ((1, 2, 3, 4), (5, 6, 7))
+
+# (前の和音, 同時押し数, 縦連の閾値) -> 次の和音の候補表
+_transition_tables = {}
+
+# (前の和音, 同時押し数, 縦連の閾値, 禁止レーン, 必須レーン) -> 窓の制約で絞った候補表
+_filtered_tables = {}
+
+
+def chord_mask(lanes):
+    """レーンの列を和音のビットマスクに変換"""
+    mask = 0
+    for lane in lanes:
+        mask |= 1 << lane
+    return mask
+
+
+def allowed_repeat(prev_chord_size, chord_size, threshold=6):
+    """縦連を許可する数
+    前の同時押し数 + 今回の同時押し数が7以上で縦連を許可
+    7以上: 1つ許可、8以上: 2つ許可、9以上: 3つ許可...
+    threshold: 許可し始める合計 - 1（VerticalRule）
+    """
+    return max(0, prev_chord_size + chord_size - threshold)
+
+
+def _transition_weights(prev_mask, chord_size, threshold=6):
+    """前の和音から次の和音への確率（マスク -> Fraction）
+
+    縦連を許可するレーンを前の和音からランダムに選び、
+    残りを禁止したうえで利用可能なレーンから和音を選ぶ手順の確率を厳密に数え上げる
+    """
+    prev_lanes = CHORD_LANES[prev_mask]
+    repeat = allowed_repeat(len(prev_lanes), chord_size, threshold) if prev_lanes else 0
+
+    # 縦連を許可するレーンの選び方（等確率）
+    if repeat == 0:
+        # 完全に縦連禁止（N=1,2の場合）
+        kept_choices = [()]
+    elif len(prev_lanes) > repeat:
+        # 一部縦連OK（N=3,4の場合）
+        kept_choices = list(combinations(prev_lanes, repeat))
+    else:
+        kept_choices = [prev_lanes]
+
+    weights = {}
+    for kept in kept_choices:
+        forbidden = prev_mask & ~chord_mask(kept)
+        available = [lane for lane in LANES if not forbidden >> lane & 1]
+        # 利用可能なレーンが足りない場合は全レーンから選択
+        pool = available if len(available) >= chord_size else list(LANES)
+        chords = list(combinations(pool, chord_size))
+        for chord in chords:
+            mask = chord_mask(chord)
+            weights[mask] = weights.get(mask, 0) + Fraction(1, len(kept_choices) * len(chords))
+    return weights
+
+
+def transition_table(prev_mask, chord_size, threshold=6):
+    """次の和音の候補表（確率に比例した回数だけ各和音を並べたタプル）
+
+    表から一様に1つ選ぶと、レーンのリストを毎回組み立てる方式と同じ分布になる
+    threshold: 縦連の閾値（allowed_repeat）
+    """
+    key = (prev_mask, chord_size, threshold)
+    table = _transition_tables.get(key)
+    if table is None:
+        weights = _transition_weights(prev_mask, chord_size, threshold)
+        scale = lcm(*(weight.denominator for weight in weights.values()))
+        table = tuple(
+            mask
+            for mask, weight in sorted(weights.items())
+            for _ in range(int(weight * scale))
+        )
+        _transition_tables[key] = table
+    return table
+
+
+def filtered_table(prev_mask, chord_size, threshold, forbidden, required=()):
+    """候補表から禁止レーンを含む和音・必須レーン（各マスクのどれか）を含まない和音を除いた表
+
+    全て除かれる場合は元の候補表（縦連の規則だけ）を返す
+    """
+    key = (prev_mask, chord_size, threshold, forbidden, required)
+    table = _filtered_tables.get(key)
+    if table is None:
+        base = transition_table(prev_mask, chord_size, threshold)
+        table = tuple(chord for chord in base
+                      if not chord & forbidden and all(chord & mask for mask in required)) or base
+        _filtered_tables[key] = table
+    return table
+
+
+class VerticalRule:
+    """直前の行との縦連の規則（候補表そのものの規則、窓は使わない）
+
+    threshold: 前の同時押し数 + 今回の同時押し数 - threshold 個まで縦連を許可（allowed_repeat）
+    6が従来の規則、大きくするほど縦連を許可しない
+    """
+    rows = 0
+
+    def __init__(self, threshold=6):
+        self.threshold = threshold
+
+
+class LaneDensity:
+    """連続する rows 行のうち1レーンを max_uses 回まで（LaneDensity(2, 4): 4行中3回を禁止）"""
+
+    def __init__(self, max_uses, rows):
+        if not 0 < max_uses < rows:
+            raise ValueError(f"LaneDensity needs 0 < max_uses < rows: {max_uses}, {rows}")
+        self.max_uses = max_uses
+        self.rows = rows - 1  # 今回の行の前に見る行数
+        self._mask = (1 << self.rows) - 1
+
+    def restrict(self, lane_bits, filled):
+        forbidden = 0
+        for lane in LANES:
+            if (lane_bits[lane] & self._mask).bit_count() >= self.max_uses:
+                forbidden |= 1 << lane
+        return forbidden, 0
+
+
+class RepeatGap:
+    """同じレーンを min_gap 行以上あけて使う（2: 縦連禁止, 3: 間に1行以上）"""
+
+    def __init__(self, min_gap):
+        if min_gap < 1:
+            raise ValueError(f"RepeatGap needs min_gap >= 1: {min_gap}")
+        self.rows = min_gap - 1
+        self._mask = (1 << self.rows) - 1
+
+    def restrict(self, lane_bits, filled):
+        forbidden = 0
+        for lane in LANES:
+            if lane_bits[lane] & self._mask:
+                forbidden |= 1 << lane
+        return forbidden, 0
+
+
+class HandRun:
+    """片手のレーンだけの行を max_run 行まで（続いた後の行は他方の手のレーンを含む）
+
+    hands: 手毎のレーン（省略時はHANDS）
+    """
+
+    def __init__(self, max_run, hands=HANDS):
+        if max_run < 1:
+            raise ValueError(f"HandRun needs max_run >= 1: {max_run}")
+        self.rows = max_run
+        self._mask = (1 << max_run) - 1
+        all_lanes = chord_mask(LANES)
+        self._others = [all_lanes & ~chord_mask(hand) for hand in hands]
+
+    def restrict(self, lane_bits, filled):
+        if filled & self._mask != self._mask:
+            return 0, 0
+        for other in self._others:
+            # 他方の手のレーンが直近 max_run 行で1度も使われていない
+            used = 0
+            for lane in CHORD_LANES[other]:
+                used |= lane_bits[lane]
+            if not used & self._mask:
+                return 0, other
+        return 0, 0
+
+
+# 制約の指定（JSONで書ける辞書）のキー -> 制約
+CONSTRAINT_TYPES = {
+    "vertical": VerticalRule,
+    "lane_density": LaneDensity,
+    "repeat_gap": RepeatGap,
+    "hand_run": HandRun,
+}
+
+
+def make_constraints(spec):
+    """制約の指定から制約のリストを作る
+
+    spec: {"vertical": 6, "lane_density": [2, 4], "repeat_gap": 2, "hand_run": 4} のような辞書
+          （値は引数、リストなら位置引数）、または制約のリスト
+    """
+    if spec is None:
+        return []
+    if not isinstance(spec, dict):
+        return list(spec)
+    rules = []
+    for name, args in spec.items():
+        if name not in CONSTRAINT_TYPES:
+            raise ValueError(f"unknown constraint {name!r} (expected one of {', '.join(CONSTRAINT_TYPES)})")
+        rules.append(CONSTRAINT_TYPES[name](*args) if isinstance(args, list) else CONSTRAINT_TYPES[name](args))
+    return rules
+
+
+class ChordConstraints:
+    """直近の行の窓による和音の制約
+
+    窓はレーン毎のビット列（bit i = i+1 行前にそのレーンを使ったか）で、1行毎に全レーンを
+    1ビットずらして更新する。各制約は窓から禁止レーン・必須レーンのマスクを求め、
+    候補表をビット演算で絞る（絞った表はキャッシュ）。1行あたりの処理は窓の行数に依らない
+    rules: VerticalRule（省略時は従来の規則）と LaneDensity・RepeatGap・HandRun など
+    """
+
+    def __init__(self, rules=()):
+        self.vertical = VerticalRule()
+        self.rules = []
+        for rule in rules:
+            if isinstance(rule, VerticalRule):
+                self.vertical = rule
+            else:
+                self.rules.append(rule)
+        self.window = max((rule.rows for rule in self.rules), default=0)
+        self._window_mask = (1 << self.window) - 1
+        self.lane_bits = [0] * 8
+        self.filled = 0  # 窓の中で埋まっている行（譜面の最初の数行は窓が埋まっていない）
+
+    def table(self, prev_mask, chord_size):
+        """制約を満たす次の和音の候補表"""
+        threshold = self.vertical.threshold
+        if not self.rules:
+            return transition_table(prev_mask, chord_size, threshold)
+        forbidden = 0
+        required = ()
+        for rule in self.rules:
+            rule_forbidden, rule_required = rule.restrict(self.lane_bits, self.filled)
+            forbidden |= rule_forbidden
+            if rule_required:
+                required += (rule_required,)
+        return filtered_table(prev_mask, chord_size, threshold, forbidden, required)
+
+    def push(self, chord):
+        """選んだ和音で窓を1行進める"""
+        if not self.window:
+            return
+        mask = self._window_mask
+        lane_bits = self.lane_bits
+        for lane in LANES:
+            lane_bits[lane] = (lane_bits[lane] << 1 | chord >> lane & 1) & mask
+        self.filled = (self.filled << 1 | 1) & mask
+
 
 class RandomPatternGenerator:
-    def __init__(self, chord_sizes):
+    def __init__(self, chord_sizes, rng=None, constraints=None):
         """
         chord_sizes: 同時押し数の配列
         - [1]: 単一鍵盤乱打
         - [1, 2]: 単一〜2鍵同時押し乱打
         - [1, 2, 3]: 単一〜3鍵同時押し乱打
         - [1, 2, 3, 4]: 単一〜4鍵同時押し乱打
+        rng: 乱数生成器（random.Random、省略時はrandomモジュール）
+        constraints: 和音の制約（make_constraintsの指定、省略時は従来の縦連の規則のみ）
         """
         self.chord_sizes = chord_sizes
-        self.recent_notes = []  # 最近のノート履歴
+        self.rng = rng or random
+        self.constraints = ChordConstraints(make_constraints(constraints))
+        self.prev_chord = 0  # 直前の和音のマスク（0は履歴なし）
+        
+    def next_chord(self):
+        """次の和音のマスクを選ぶ（候補表の参照と乱数1回）"""
+        chord_size = self.rng.choice(self.chord_sizes)
+        table = self.constraints.table(self.prev_chord, chord_size)
+        chord = table[self.rng.randrange(len(table))]
+        self.constraints.push(chord)
+        self.prev_chord = chord
+        return chord
         
-    def generate_notes(self, bpm, duration_minutes=2, scratch_interval=None, scratch_probability=1.0):
+    def generate_notes(self, bpm, duration_minutes=2, scratch_interval=None, scratch_probability=1.0,
+                       total_measures=None):
         """16分乱打ノートを生成
         scratch_interval: None, 4(4分), 8(8分), 16(16分)
         scratch_probability: スクラッチを配置する確率 (0.0-1.0)
+        total_measures: 総小節数（指定時はbpm・duration_minutesより優先）
         """
+        notes = NoteColumns()
+        scratch_notes = NoteColumns()
+        metronome_notes = NoteColumns()
+        
+        for measure_notes, measure_scratch, measure_metronome in self.iter_measures(
+                bpm, duration_minutes, scratch_interval, scratch_probability, total_measures):
+            notes.extend_columns(measure_notes)
+            scratch_notes.extend_columns(measure_scratch)
+            metronome_notes.extend_columns(measure_metronome)
+        
+        return notes, scratch_notes, metronome_notes
+    
+    def iter_measures(self, bpm, duration_minutes=2, scratch_interval=None, scratch_probability=1.0,
+                      total_measures=None):
+        """1小節ずつ (乱打, スクラッチ, メトロノーム) のNoteColumnsを返すジェネレータ"""
         resolution = 240
         beats_per_measure = 4
         
         # 総小節数
-        total_beats = int(bpm * duration_minutes)
-        total_measures = total_beats // beats_per_measure
-        
-        notes = []
-        scratch_notes = []
-        metronome_notes = []
+        if total_measures is None:
+            total_beats = int(bpm * duration_minutes)
+            total_measures = total_beats // beats_per_measure
         
         current_y = 0
         
         for measure in range(total_measures):
+            notes = NoteColumns()
+            scratch_notes = NoteColumns()
+            metronome_notes = NoteColumns()
+            
             for beat in range(beats_per_measure):
                 beat_y = current_y + (beat * resolution)
                 
                 # メトロノーム（4分音符）
-                metronome_notes.append({
-                    "x": 0,
-                    "y": beat_y,
-                    "l": 0,
-                    "c": False
-                })
+                metronome_notes.append(0, beat_y)
                 
                 # 16分音符の乱打配置
                 for sixteenth in range(4):
@@ -63,76 +343,15 @@ class RandomPatternGenerator:
                             timing_match = True
                         
                         # 確率チェック
-                        if timing_match and random.random() < scratch_probability:
-                            scratch_notes.append({
-                                "x": 8,
-                                "y": note_y,
-                                "l": 0,
-                                "c": False
-                            })
-                    
-                    # 同時押し数を決定
-                    chord_size = random.choice(self.chord_sizes)
-                    
-                    # 縦連禁止の制約を適用
-                    # 前の同時押し数 + 今回の同時押し数が7以上で縦連を許可
-                    # 7以上: 1つ許可、8以上: 2つ許可、9以上: 3つ許可...
-                    if self.recent_notes:
-                        prev_chord_size = len(self.recent_notes[-1])
-                        total_size = prev_chord_size + chord_size
-                        allowed_repeat = max(0, total_size - 6)
-                    else:
-                        allowed_repeat = 0
-                    
-                    # 利用可能なレーンを決定
-                    available_lanes = list(range(1, 8))
+                        if timing_match and self.rng.random() < scratch_probability:
+                            scratch_notes.append(8, note_y)
                     
-                    # 最近のノートから縦連を避ける
-                    if self.recent_notes:
-                        last_chord = self.recent_notes[-1]
-                        
-                        # 縦連を避けるべきレーンを特定
-                        if allowed_repeat == 0:
-                            # 完全に縦連禁止（N=1,2の場合）
-                            forbidden_lanes = last_chord
-                        else:
-                            # 一部縦連OK（N=3,4の場合）
-                            # ランダムに縦連を許可するレーンを選択
-                            if len(last_chord) > allowed_repeat:
-                                allowed_lanes = random.sample(last_chord, allowed_repeat)
-                                forbidden_lanes = [lane for lane in last_chord if lane not in allowed_lanes]
-                            else:
-                                forbidden_lanes = []
-                        
-                        # 禁止レーンを除外
-                        available_lanes = [lane for lane in available_lanes if lane not in forbidden_lanes]
-                    
-                    # 同時押しのレーンを選択
-                    if len(available_lanes) >= chord_size:
-                        selected_lanes = random.sample(available_lanes, chord_size)
-                    else:
-                        # 利用可能なレーンが足りない場合は全レーンから選択
-                        selected_lanes = random.sample(range(1, 8), chord_size)
-                    
-                    # ノートを配置
-                    for lane in selected_lanes:
-                        notes.append({
-                            "x": lane,
-                            "y": note_y,
-                            "l": 0,
-                            "c": False
-                        })
-                    
-                    # 履歴を更新
-                    self.recent_notes.append(selected_lanes)
-                    if len(self.recent_notes) > 1:
-                        self.recent_notes.pop(0)
-            
-            # scratch_typeがNoneの場合は何もしない（既に処理済み）
+                    # 縦連禁止などの制約を満たす和音を選んで配置
+                    lanes = CHORD_LANES[self.next_chord()]
+                    notes.extend(lanes, [note_y] * len(lanes))
             
             current_y += beats_per_measure * resolution
-        
-        return notes, scratch_notes, metronome_notes
+            yield notes, scratch_notes, metronome_notes
 
 
 def test_patterns():
@@ -154,12 +373,12 @@ def test_patterns():
         # 16分音符ごとに表示
         current_y = -1
         beat_count = 0
-        for note in notes[:64]:  # 最初の1小節分
-            if note["y"] != current_y:
-                current_y = note["y"]
+        for y in notes.y[:64]:  # 最初の1小節分
+            if y != current_y:
+                current_y = y
                 beat_count += 1
                 # 同じy座標のノートをグループ化
-                chord = sorted([n["x"] for n in notes if n["y"] == current_y])
+                chord = sorted([x for x, note_y in zip(notes.x, notes.y) if note_y == current_y])
                 print(f"  16分{(beat_count-1)//4+1}-{(beat_count-1)%4+1}: レーン{chord} ({len(chord)}鍵)")
                 if beat_count >= 16:
                     break
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+シャッフルバッグ（全要素を1回ずつ使い切るまで重複なしで選ぶ）
+トリルのレーンの組・階段のパターンの種類の選択で共有する
+
+1回の選択はO(1)（残りの要素から1つ選んで末尾と入れ替える、Fisher-Yatesを1段ずつ進める）
+使い切ったら同じ配列を再び全要素として使う（並べ直しは不要）
+"""
+import random
+
+
+class ShuffleBag:
+    """要素を重複なしで無限に選ぶ（イテレータとしても使える）
+
+    items: 要素（avoid_seamを使う場合はハッシュ可能なこと）
+    rng: 乱数生成器（random.Random、省略時はrandomモジュール）
+    weights: 要素毎の整数の重み（1巡でその回数ずつ選ばれる、省略時は全て1）
+    avoid_seam: Trueなら使い切って戻った直後に前の巡の最後と同じ要素を選ばない
+    """
+
+    def __init__(self, items, rng=None, weights=None, avoid_seam=False):
+        items = list(items)
+        if weights is None:
+            pool = items
+        else:
+            if len(weights) != len(items):
+                raise ValueError("weights must have the same length as items")
+            if any(weight < 0 or weight != int(weight) for weight in weights):
+                raise ValueError("weights must be non-negative integers")
+            pool = [item for item, weight in zip(items, weights) for _ in range(int(weight))]
+        if not pool:
+            raise ValueError("ShuffleBag needs at least one item")
+        self.rng = rng or random
+        self.avoid_seam = avoid_seam and len(set(pool)) > 1
+        self._pool = pool
+        self._remaining = len(pool)
+        self._last = None
+
+    def __len__(self):
+        """1巡の要素数（重み込み）"""
+        return len(self._pool)
+
+    @property
+    def remaining(self):
+        """今の巡で残っている要素数"""
+        return self._remaining
+
+    def draw(self):
+        """次の要素を選ぶ"""
+        pool = self._pool
+        if self._remaining == 0:
+            self._remaining = len(pool)
+        remaining = self._remaining
+        index = self.rng.randrange(remaining)
+        if self.avoid_seam and remaining == len(pool) and self._last is not None:
+            # 巡の最初だけ前の要素と同じものを引き直す（前の要素の比率が小さいほど少ない回数で済む）
+            while pool[index] == self._last:
+                index = self.rng.randrange(remaining)
+        remaining -= 1
+        pool[index], pool[remaining] = pool[remaining], pool[index]
+        self._remaining = remaining
+        self._last = pool[remaining]
+        return self._last
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.draw()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+譜面が参照する音声ファイルの重複排除
+sound_channels[].name で参照されるWAVを内容ハッシュで1つにまとめて
+出力先の .assets/<SHA-256>.wav に保存し、曲フォルダにはハードリンク
+（不可ならシンボリックリンク、それも不可ならコピー）を置く
+"""
+import argparse
+import hashlib
+import os
+import shutil
+
+from bmson_reader import BmsonReader
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 参照名で音声ファイルを探すディレクトリ（先に見つかったものを使う）
+SOUND_DIRS = [
+    os.path.join(TOOLS_DIR, "..", "shared_sounds"),
+    os.path.join(TOOLS_DIR, "..", "soundset"),
+]
+
+# 出力先ディレクトリ内の実体の保存先
+STORE_NAME = ".assets"
+
+# リンク方法（この順にフォールバック）
+LINK_MODES = ["hardlink", "symlink", "copy"]
+
+CHUNK_SIZE = 1 << 16
+
+_digests = {}
+
+
+def file_digest(path):
+    """ファイル内容のSHA-256（同一プロセス内ではパス・サイズ・更新時刻でキャッシュ）"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+
+def find_sound(name, sound_dirs=None):
+    """参照名の音声ファイルを探す（見つからなければNone）"""
+    for directory in sound_dirs or SOUND_DIRS:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def chart_sounds(bmson):
+    """譜面が参照する音声ファイル名"""
+    return [channel["name"] for channel in bmson.get("sound_channels", [])]
+
+
+def read_chart_sounds(path):
+    """BMSONファイルが参照する音声ファイル名（ノート配列は読まない）"""
+    with BmsonReader(path) as reader:
+        return reader.channel_names()
+
+
+def _link_or_copy(source, target, modes):
+    """source を target にリンクする（失敗したら次の方法）。戻り値: 使った方法"""
+    for mode in modes:
+        try:
+            if mode == "hardlink":
+                os.link(source, target)
+            elif mode == "symlink":
+                os.symlink(os.path.relpath(source, os.path.dirname(target)), target)
+            else:
+                shutil.copyfile(source, target)
+            return mode
+        except OSError:
+            if os.path.lexists(target):
+                os.remove(target)
+    raise OSError(f"cannot place {source} at {target}")
+
+
+class AssetStore:
+    """出力ディレクトリ内の内容アドレス方式の音声ファイル置き場"""
+
+    def __init__(self, output_dir, mode="hardlink"):
+        if mode not in LINK_MODES:
+            raise ValueError(f"unknown link mode: {mode}")
+        self.root = os.path.join(output_dir, STORE_NAME)
+        self.modes = LINK_MODES[LINK_MODES.index(mode):]
+        self.stats = {"assets": 0, "stored_bytes": 0, "linked": 0, "unchanged": 0, "saved_bytes": 0}
+
+    def add(self, source):
+        """音声ファイルを保存し、保存先のパスを返す（同じ内容は1度だけ保存）"""
+        digest = file_digest(source)
+        stored = os.path.join(self.root, digest + os.path.splitext(source)[1])
+        if not os.path.exists(stored):
+            os.makedirs(self.root, exist_ok=True)
+            temp_path = stored + ".tmp"
+            shutil.copyfile(source, temp_path)
+            os.replace(temp_path, stored)
+            self.stats["assets"] += 1
+            self.stats["stored_bytes"] += os.path.getsize(stored)
+        return stored
+
+    def place(self, source, target):
+        """target に source と同じ内容のファイルを置く（実体は保存先に1つ）"""
+        stored = self.add(source)
+        if os.path.lexists(target) and self._is_current(stored, target):
+            self.stats["unchanged"] += 1
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = target + ".tmp"
+        if os.path.lexists(temp_path):
+            os.remove(temp_path)
+        mode = _link_or_copy(stored, temp_path, self.modes)
+        os.replace(temp_path, target)
+        self.stats["linked"] += 1
+        if mode != "copy":
+            self.stats["saved_bytes"] += os.path.getsize(stored)
+
+    def _is_current(self, stored, target):
+        """target が既に保存先の実体を指しているか（コピーなら内容が同じか）"""
+        if not os.path.exists(target):
+            return False
+        if os.path.samefile(stored, target):
+            return True
+        if self.modes[0] == "copy" and not os.path.islink(target):
+            return file_digest(target) == file_digest(stored)
+        return False
+
+
+def package_sounds(output_dir, group_sounds, mode="hardlink", sound_dirs=None):
+    """曲フォルダ毎に参照される音声ファイルを重複排除して配置
+
+    group_sounds: 出力サブディレクトリ -> 参照される音声ファイル名の集合
+    戻り値: (AssetStoreの統計, 見つからなかった音声ファイル名のリスト)
+    """
+    store = AssetStore(output_dir, mode)
+    missing = []
+    for group, names in sorted(group_sounds.items()):
+        for name in sorted(names):
+            source = find_sound(name, sound_dirs)
+            if source is None:
+                missing.append(name)
+                continue
+            store.place(source, os.path.join(output_dir, group, name))
+    return store.stats, sorted(set(missing))
+
+
+def scan_output(output_dir):
+    """出力ディレクトリ内の全BMSONから曲フォルダ毎の参照音声ファイルを集める"""
+    group_sounds = {}
+    for root, _, files in os.walk(output_dir):
+        if os.path.basename(root) == STORE_NAME:
+            continue
+        for name in files:
+            if name.endswith(".bmson"):
+                group = os.path.relpath(root, output_dir)
+                group_sounds.setdefault(group, set()).update(read_chart_sounds(os.path.join(root, name)))
+    return group_sounds
+
+
+def format_stats(stats, missing):
+    """package_soundsの結果の要約"""
+    text = (f"{stats['assets']} new assets ({stats['stored_bytes']} bytes stored), "
+            f"{stats['linked']} placed, {stats['unchanged']} unchanged, "
+            f"{stats['saved_bytes']} bytes deduplicated")
+    if missing:
+        text += f", missing: {', '.join(missing)}"
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="出力済み譜面の音声ファイルを重複排除して配置")
+    parser.add_argument("output_dir", help="譜面の出力先ディレクトリ")
+    parser.add_argument("--mode", choices=LINK_MODES, default="hardlink",
+                        help="曲フォルダへの置き方（失敗時は後ろの方法にフォールバック）")
+    args = parser.parse_args()
+
+    stats, missing = package_sounds(args.output_dir, scan_output(args.output_dir), args.mode)
+    print(format_stats(stats, missing))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+譜面生成の段階別計測（任意）
+パターン生成・ゴミノート・BMSON組み立て・書き出しなどの段階毎に
+実時間・ノート数・tracemallocのピークを譜面単位で記録し、
+JSON Lines または集計表で出力する
+無効時の stage() / chart() は共有の何もしないオブジェクトを返すだけ
+
+  with stage("pattern") as s:
+      notes = ...
+      s.count(len(notes))
+
+ドライバ（generate_*.py）は環境変数で有効にする
+  BMSON_PROFILE=summary|jsonl     出力形式
+  BMSON_PROFILE_OUTPUT=path       出力先（省略時は標準エラー出力）
+  BMSON_PROFILE_MEMORY=1          tracemallocでピークメモリも記録
+"""
+import contextlib
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+PROFILE_FORMATS = ["summary", "jsonl"]
+
+# 有効なProfiler（無効時はNone）
+_active = None
+
+
+class _NullStage:
+    """無効時の段階（何もしない）"""
+    __slots__ = ()
+
+    def count(self, notes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    """1段階の計測"""
+    __slots__ = ("profiler", "kind", "name", "notes", "start", "peaks")
+
+    def __init__(self, profiler, kind, name):
+        self.profiler = profiler
+        self.kind = kind
+        self.name = name
+        self.notes = 0
+        self.peaks = []
+
+    def count(self, notes):
+        """この段階で扱ったノート数を加算"""
+        self.notes += notes
+
+    def __enter__(self):
+        if self.kind == "chart":
+            self.profiler.chart_stack.append(self)
+        if self.profiler.memory:
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.start
+        profiler = self.profiler
+        peak = None
+        if profiler.memory:
+            peak = max([tracemalloc.get_traced_memory()[1]] + self.peaks)
+        if self.kind == "chart":
+            profiler.chart_stack.pop()
+            chart_name = self.name
+        else:
+            chart_name = profiler.chart_stack[-1].name if profiler.chart_stack else None
+            if profiler.chart_stack:
+                parent = profiler.chart_stack[-1]
+                if peak is not None:
+                    parent.peaks.append(peak)
+        profiler.records.append({
+            "type": self.kind,
+            "chart": chart_name,
+            "stage": self.name if self.kind == "stage" else None,
+            "seconds": seconds,
+            "notes": self.notes,
+            "peak_bytes": peak,
+        })
+        return False
+
+
+class Profiler:
+    """計測結果の記録"""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.records = []
+        self.chart_stack = []
+
+    def stage_totals(self):
+        """段階名 -> {"calls", "seconds", "notes", "peak_bytes"}（記録順）"""
+        totals = {}
+        for record in self.records:
+            if record["type"] != "stage":
+                continue
+            total = totals.setdefault(record["stage"], {"calls": 0, "seconds": 0.0, "notes": 0, "peak_bytes": None})
+            total["calls"] += 1
+            total["seconds"] += record["seconds"]
+            total["notes"] += record["notes"]
+            if record["peak_bytes"] is not None:
+                total["peak_bytes"] = max(total["peak_bytes"] or 0, record["peak_bytes"])
+        return totals
+
+    def write_jsonl(self, f):
+        """1記録1行のJSONで書き出す"""
+        for record in self.records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+
+    def write_summary(self, f, slowest=5):
+        """段階毎の集計表と時間のかかった譜面を書き出す"""
+        totals = self.stage_totals()
+        stage_seconds = sum(total["seconds"] for total in totals.values())
+        f.write(f"{'stage':<12}{'calls':>7}{'total s':>10}{'share':>8}{'mean ms':>10}"
+                f"{'notes':>12}{'notes/s':>14}{'peak KB':>10}\n")
+        for name, total in totals.items():
+            share = total["seconds"] / stage_seconds if stage_seconds else 0.0
+            rate = total["notes"] / total["seconds"] if total["seconds"] else 0.0
+            peak = f"{total['peak_bytes'] / 1024:,.0f}" if total["peak_bytes"] is not None else "-"
+            f.write(f"{name:<12}{total['calls']:>7}{total['seconds']:>10.3f}{share:>8.1%}"
+                    f"{total['seconds'] / total['calls'] * 1000:>10.2f}{total['notes']:>12,}{rate:>14,.0f}{peak:>10}\n")
+
+        charts = sorted((record for record in self.records if record["type"] == "chart"),
+                        key=lambda record: record["seconds"], reverse=True)
+        if charts:
+            f.write(f"\nslowest charts ({len(charts)} total):\n")
+            for record in charts[:slowest]:
+                f.write(f"  {record['seconds'] * 1000:8.2f} ms  {record['chart']}\n")
+
+    def report(self, profile_format, path=None):
+        """profile_format（summary / jsonl）で path（省略時は標準エラー出力）に書き出す"""
+        write = self.write_jsonl if profile_format == "jsonl" else self.write_summary
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                write(f)
+        else:
+            write(sys.stderr)
+
+
+def stage(name):
+    """段階の計測（無効時は何もしない）"""
+    if _active is None:
+        return _NULL_STAGE
+    return _Stage(_active, "stage", name)
+
+
+def chart(name):
+    """譜面1つ分の計測（中の段階はこの譜面の記録になる）"""
+    if _active is None:
+        return _NULL_STAGE
+    return _Stage(_active, "chart", name)
+
+
+def chart_note_count(bmson):
+    """BMSONの全チャンネルのノート数"""
+    return sum(len(channel["notes"]) for channel in bmson.get("sound_channels", []))
+
+
+@contextlib.contextmanager
+def profiling(memory=False):
+    """ブロック内の計測を有効にし、Profilerを返す"""
+    global _active
+    previous = _active
+    profiler = Profiler(memory)
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    _active = profiler
+    try:
+        yield profiler
+    finally:
+        _active = previous
+        if started:
+            tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def profile_session():
+    """環境変数 BMSON_PROFILE で有効な場合だけ計測し、終了時に出力する"""
+    profile_format = os.environ.get("BMSON_PROFILE")
+    if not profile_format:
+        yield None
+        return
+    if profile_format not in PROFILE_FORMATS:
+        raise ValueError(f"BMSON_PROFILE must be one of {PROFILE_FORMATS}: {profile_format}")
+    with profiling(os.environ.get("BMSON_PROFILE_MEMORY") == "1") as profiler:
+        yield profiler
+    profiler.report(profile_format, os.environ.get("BMSON_PROFILE_OUTPUT"))
@@ -4,209 +4,214 @@
 最低2小節単位で様々な階段パターンを生成
 """
 import random
+from array import array
+
+from shuffle_bag import ShuffleBag
+
+DIRECTIONS = ['up', 'down']
+
+# パターンの種類（この中から使用済みでないものを選ぶ）
+PATTERN_TYPES = [
+    "4_stairs_repeat",
+    "5_stairs_repeat", 
+    "6_stairs_repeat",
+    "large_stair",
+    "spiral_4",
+    "spiral_5",
+    "spiral_6",
+    "spiral_large",
+    "slide_4_stairs",
+    "slide_5_stairs",
+]
+
+
+def _fill(sequence, length):
+    """sequenceを繰り返してlength音を埋める"""
+    pattern = []
+    for _ in range(length // len(sequence)):
+        pattern.extend(sequence)
+    # 余りを埋める
+    remaining = length - len(pattern)
+    if remaining > 0:
+        pattern.extend(sequence[:remaining])
+    return pattern
+
+
+def _repeat_stairs(width, start, direction):
+    """同じ位置で繰り返す階段（2小節）"""
+    if direction == 'up':
+        sequence = list(range(start, start + width))
+    else:
+        sequence = list(range(start + width - 1, start - 1, -1))
+    return f"{width}_stairs_repeat_{direction}", _fill(sequence, 32), 2
+
+
+def _large_stair(direction):
+    """大階段（7鍵、2小節）"""
+    if direction == 'up':
+        sequence = list(range(1, 8))  # 1-7
+    else:
+        sequence = list(range(7, 0, -1))  # 7-1
+    return f"large_stair_{direction}", _fill(sequence, 32), 2
+
+
+def _spiral_stairs(width, start, direction):
+    """螺旋階段（往復、4小節）"""
+    # 繰り返し用：折り返し地点の音を1つだけにする
+    if direction == 'up':
+        first = list(range(start, start + width))
+        second = list(range(start + width - 2, start, -1))  # 最初の音まで戻らない
+    else:
+        first = list(range(start + width - 1, start - 1, -1))
+        second = list(range(start + 1, start + width - 1))  # 最後の音まで行かない
+    
+    sequence = first + second  # 例：[4,3,2,1,2,3] = 6音（width=4の場合）
+    return f"spiral_{width}_{direction}", _fill(sequence, 64), 4
+
+
+def _spiral_large(direction):
+    """螺旋大階段（7鍵往復、4小節）"""
+    # 繰り返し用：12音サイクル
+    if direction == 'up':
+        sequence = [1, 2, 3, 4, 5, 6, 7, 6, 5, 4, 3, 2]
+    else:
+        sequence = [7, 6, 5, 4, 3, 2, 1, 2, 3, 4, 5, 6]
+    return f"spiral_large_{direction}", _fill(sequence, 64), 4
+
+
+def _slide_stairs(width, stair_direction):
+    """スライド階段（移動階段、2小節）"""
+    pattern = []
+    
+    # 2小節分（32音）を埋める
+    position = 1
+    slide_direction = 1  # 1:右移動, -1:左移動
+    
+    while len(pattern) < 32:
+        # 現在位置から階段
+        if stair_direction == 'up':
+            stairs = list(range(position, position + width))
+        else:
+            stairs = list(range(position + width - 1, position - 1, -1))
+        pattern.extend(stairs)
+        
+        # 次の位置を決定
+        position += slide_direction
+        # 境界チェック
+        if position + width > 8:
+            position = 8 - width
+            slide_direction = -1
+        elif position < 1:
+            position = 1
+            slide_direction = 1
+    
+    # 32音に調整
+    return f"slide_{width}_stairs_{stair_direction}", pattern[:32], 2
+
+
+def _pattern_variants(pattern_type):
+    """パターンの種類ごとの全バリエーション（幅 × 開始位置 × 方向）"""
+    if pattern_type.endswith("_stairs_repeat"):
+        width = int(pattern_type[0])
+        return [_repeat_stairs(width, start, d) for start in range(1, 9 - width) for d in DIRECTIONS]
+    if pattern_type == "large_stair":
+        return [_large_stair(d) for d in DIRECTIONS]
+    if pattern_type == "spiral_large":
+        return [_spiral_large(d) for d in DIRECTIONS]
+    if pattern_type.startswith("spiral_"):
+        width = int(pattern_type[-1])
+        return [_spiral_stairs(width, start, d) for start in range(1, 9 - width) for d in DIRECTIONS]
+    if pattern_type.startswith("slide_"):
+        width = int(pattern_type.split("_")[1])
+        return [_slide_stairs(width, d) for d in DIRECTIONS]
+    raise ValueError(f"未知のパターン: {pattern_type}")
+
+
+# 全パターンの事前計算テーブル
+# PATTERN_NAMES[i], PATTERN_MEASURES[i]: パターンiの名前と小節数
+# PATTERN_NOTES[i]: パターンiのレーン列（32音または64音のbytes）
+# TYPE_PATTERNS[種類]: その種類のパターン番号のタプル
+PATTERN_NAMES = []
+PATTERN_MEASURES = []
+PATTERN_NOTES = []
+TYPE_PATTERNS = {}
+for _pattern_type in PATTERN_TYPES:
+    _indices = []
+    for _name, _notes, _measures in _pattern_variants(_pattern_type):
+        _indices.append(len(PATTERN_NAMES))
+        PATTERN_NAMES.append(_name)
+        PATTERN_MEASURES.append(_measures)
+        PATTERN_NOTES.append(bytes(_notes))
+    TYPE_PATTERNS[_pattern_type] = tuple(_indices)
+
 
 class StairPatternGenerator:
-    def __init__(self, use_rest=False):
+    def __init__(self, use_rest=False, rng=None, avoid_seam=False):
+        """rng: 乱数生成器（random.Random、省略時はrandomモジュール）
+        avoid_seam: Trueなら種類を使い切った直後も直前の種類を続けない
+        """
         self.use_rest = use_rest
-        self.used_patterns = []
+        self.rng = rng or random
+        # 種類は全種類を使い切るまで重複なし
+        self.pattern_types = ShuffleBag(PATTERN_TYPES, self.rng, avoid_seam=avoid_seam)
         self.last_note = None  # 最後のノートを記録
-        
-    def pattern_generator(self):
-        """階段パターンを無限に生成するジェネレータ"""
-        pattern_types = [
-            "4_stairs_repeat",
-            "5_stairs_repeat", 
-            "6_stairs_repeat",
-            "large_stair",
-            "spiral_4",
-            "spiral_5",
-            "spiral_6",
-            "spiral_large",
-            "slide_4_stairs",
-            "slide_5_stairs",
-        ]
-        
-        while True:
-            # 使用済みでないパターンから選択
-            available = [p for p in pattern_types if p not in self.used_patterns]
-            if not available:
-                self.used_patterns = []
-                available = pattern_types.copy()
-            
-            pattern_type = random.choice(available)
-            self.used_patterns.append(pattern_type)
-            
-            # パターンを生成
-            pattern = None
-            if pattern_type == "4_stairs_repeat":
-                pattern = self._generate_repeat_stairs(4)
-            elif pattern_type == "5_stairs_repeat":
-                pattern = self._generate_repeat_stairs(5)
-            elif pattern_type == "6_stairs_repeat":
-                pattern = self._generate_repeat_stairs(6)
-            elif pattern_type == "large_stair":
-                pattern = self._generate_large_stair()
-            elif pattern_type == "spiral_4":
-                pattern = self._generate_spiral_stairs(4)
-            elif pattern_type == "spiral_5":
-                pattern = self._generate_spiral_stairs(5)
-            elif pattern_type == "spiral_6":
-                pattern = self._generate_spiral_stairs(6)
-            elif pattern_type == "spiral_large":
-                pattern = self._generate_spiral_large()
-            elif pattern_type == "slide_4_stairs":
-                pattern = self._generate_slide_stairs(4)
-            elif pattern_type == "slide_5_stairs":
-                pattern = self._generate_slide_stairs(5)
-            
-            # 縦連チェック：最初の音が前のパターンの最後の音と同じ場合は調整
-            if pattern and self.last_note is not None:
-                if pattern['notes'][0] == self.last_note:
-                    # 最初の音を削除
-                    pattern['notes'].pop(0)
-            
-            # 最後の音を記録
-            if pattern and pattern['notes']:
-                self.last_note = pattern['notes'][-1]
-            
-            yield pattern
     
-    def _generate_repeat_stairs(self, width):
-        """同じ位置で繰り返す階段"""
-        start = random.randint(1, 8 - width)
-        direction = random.choice(['up', 'down'])
-        
-        if direction == 'up':
-            sequence = list(range(start, start + width))
-        else:
-            sequence = list(range(start + width - 1, start - 1, -1))
-        
-        # 2小節分（32音）を埋める
-        pattern = []
-        for _ in range(32 // width):
-            pattern.extend(sequence)
-        # 余りを埋める
-        remaining = 32 - len(pattern)
-        if remaining > 0:
-            pattern.extend(sequence[:remaining])
-        
-        return {
-            "type": f"{width}_stairs_repeat_{direction}",
-            "notes": pattern,
-            "measures": 2
-        }
+    def next_pattern_index(self):
+        """次のパターン番号を選ぶ
+        種類は全種類を使い切るまで重複なし、バリエーションは種類内で一様
+        """
+        pattern_type = self.pattern_types.draw()
+        
+        variants = TYPE_PATTERNS[pattern_type]
+        return variants[self.rng.randrange(len(variants))]
     
-    def _generate_large_stair(self):
-        """大階段（7鍵）"""
-        direction = random.choice(['up', 'down'])
-        
-        if direction == 'up':
-            sequence = list(range(1, 8))  # 1-7
-        else:
-            sequence = list(range(7, 0, -1))  # 7-1
-        
-        # 2小節分（32音）を埋める
-        pattern = []
-        for _ in range(32 // 7):
-            pattern.extend(sequence)
-        # 余り（4音）
-        pattern.extend(sequence[:4])
-        
-        return {
-            "type": f"large_stair_{direction}",
-            "notes": pattern,
-            "measures": 2
-        }
+    def _take_notes(self, index):
+        """パターンのレーン列を取り出し、つなぎ目の縦連を調整"""
+        notes = PATTERN_NOTES[index]
+        # 縦連チェック：最初の音が前のパターンの最後の音と同じ場合は最初の音を削除
+        if self.last_note is not None and notes[0] == self.last_note:
+            notes = notes[1:]
+        # 最後の音を記録
+        if notes:
+            self.last_note = notes[-1]
+        return notes
     
-    def _generate_spiral_stairs(self, width):
-        """螺旋階段（往復）"""
-        start = random.randint(1, 8 - width)
-        direction = random.choice(['up', 'down'])
-        
-        # 繰り返し用：折り返し地点の音を1つだけにする
-        if direction == 'up':
-            first = list(range(start, start + width))
-            second = list(range(start + width - 2, start, -1))  # 最初の音まで戻らない
-        else:
-            first = list(range(start + width - 1, start - 1, -1))
-            second = list(range(start + 1, start + width - 1))  # 最後の音まで行かない
-        
-        sequence = first + second  # 例：[4,3,2,1,2,3] = 6音（width=4の場合）
-        
-        # 4小節分（64音）を埋める
-        pattern = []
-        cycle_length = len(sequence)
-        for _ in range(64 // cycle_length):
-            pattern.extend(sequence)
-        # 余りを埋める
-        remaining = 64 - len(pattern)
-        if remaining > 0:
-            pattern.extend(sequence[:remaining])
-        
-        return {
-            "type": f"spiral_{width}_{direction}",
-            "notes": pattern,
-            "measures": 4
-        }
+    def pattern_generator(self):
+        """階段パターンを無限に生成するジェネレータ"""
+        while True:
+            index = self.next_pattern_index()
+            yield {
+                "type": PATTERN_NAMES[index],
+                "notes": list(self._take_notes(index)),
+                "measures": PATTERN_MEASURES[index]
+            }
     
-    def _generate_spiral_large(self):
-        """螺旋大階段（7鍵往復）"""
-        direction = random.choice(['up', 'down'])
-        
-        # 繰り返し用：12音サイクル
-        if direction == 'up':
-            sequence = [1, 2, 3, 4, 5, 6, 7, 6, 5, 4, 3, 2]
-        else:
-            sequence = [7, 6, 5, 4, 3, 2, 1, 2, 3, 4, 5, 6]
-        
-        # 4小節分（64音）を埋める
-        pattern = []
-        for _ in range(64 // 12):
-            pattern.extend(sequence)
-        # 余り（4音）
-        pattern.extend(sequence[:4])
-        
-        return {
-            "type": f"spiral_large_{direction}",
-            "notes": pattern,
-            "measures": 4
-        }
+    def generate_measures(self, total_measures):
+        """total_measures小節分の階段をまとめて生成
+        各パターンは小節の頭から始まり、つなぎ目で削った分は小節末が空く
+        戻り値: (レーン, 16分グリッドの行番号) のarray
+        """
+        lanes = array('b')
+        slots = array('i')
+        for measure_lanes, measure_slots in self.iter_measures(total_measures):
+            lanes.frombytes(measure_lanes)
+            slots.extend(measure_slots)
+        return lanes, slots
     
-    def _generate_slide_stairs(self, width):
-        """スライド階段（移動階段）"""
-        pattern = []
-        stair_direction = random.choice(['up', 'down'])
-        
-        # 2小節分（32音）を埋める
-        position = 1
-        slide_direction = 1  # 1:右移動, -1:左移動
-        
-        while len(pattern) < 32:
-            # 現在位置から階段
-            if stair_direction == 'up':
-                stairs = list(range(position, position + width))
-            else:
-                stairs = list(range(position + width - 1, position - 1, -1))
-            pattern.extend(stairs)
-            
-            # 次の位置を決定
-            position += slide_direction
-            # 境界チェック
-            if position + width > 8:
-                position = 8 - width
-                slide_direction = -1
-            elif position < 1:
-                position = 1
-                slide_direction = 1
-        
-        # 32音に調整
-        pattern = pattern[:32]
-        
-        return {
-            "type": f"slide_{width}_stairs_{stair_direction}",
-            "notes": pattern,
-            "measures": 2
-        }
+    def iter_measures(self, total_measures):
+        """1小節ずつ (レーンのbytes, 16分グリッドの行番号のrange) を返すジェネレータ
+        パターンは必要になった時点で選ぶ（generate_measuresと同じ結果）
+        """
+        measure = 0
+        while measure < total_measures:
+            notes = self._take_notes(self.next_pattern_index())
+            # 最後のパターンは譜面の終わりで切る
+            notes = notes[:(total_measures - measure) * 16]
+            for start in range(0, len(notes), 16):
+                slot = (measure + start // 16) * 16
+                chunk = notes[start:start + 16]
+                yield chunk, range(slot, slot + len(chunk))
+            measure += -(-len(notes) // 16)
 
 
 def test_patterns():
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+テンポ階段譜面
+1つの譜面の中でBPMを段階的に上げる（step）または連続的に変える（ramp）
+bpm_eventsで区間毎にテンポを切り替え、各区間はそのBPMでの長さ分の小節数で埋める
+譜面の内容はパルス位置だけで決まるため、全区間の小節数を合計して1回で生成する
+"""
+from math import ceil
+
+from difficulty import rate_chart
+from timing import BEATS_PER_MEASURE, pulse_ms
+
+# ジェネレータ名 -> 区間の小節数の単位（トリル・階段は2小節毎にパターンが変わる）
+MEASURE_UNITS = {
+    "trill": 2,
+    "stair": 2,
+    "random": 1,
+}
+
+LADDER_KINDS = ["step", "ramp"]
+
+
+def _measure_ms(bpm, resolution=240):
+    """BPMでの1小節の長さ（ミリ秒）"""
+    return BEATS_PER_MEASURE * resolution * pulse_ms(bpm, resolution)
+
+
+def _section_measures(bpm, minutes, measure_unit):
+    """BPMでminutes分を超えるまでの小節数（measure_unit単位に切り上げ）"""
+    units = minutes * 60000 / (_measure_ms(bpm) * measure_unit)
+    return max(1, ceil(round(units, 9))) * measure_unit
+
+
+def step_sections(bpms, section_minutes=1, measure_unit=2):
+    """BPM毎に section_minutes 分ずつの区間 [(BPM, 小節数), ...]"""
+    return [(bpm, _section_measures(bpm, section_minutes, measure_unit)) for bpm in bpms]
+
+
+def ramp_sections(start_bpm, end_bpm, duration_minutes, measure_unit=2):
+    """start_bpm から end_bpm まで時間に比例してBPMを変える区間（measure_unit小節毎）
+
+    各区間のBPMは区間の開始時刻での値（小数第2位まで）
+    """
+    duration_ms = duration_minutes * 60000
+    sections = []
+    elapsed = 0.0
+    while elapsed < duration_ms:
+        bpm = round(start_bpm + (end_bpm - start_bpm) * elapsed / duration_ms, 2)
+        sections.append((bpm, measure_unit))
+        elapsed += measure_unit * _measure_ms(bpm)
+    return sections
+
+
+def section_starts(sections, resolution=240):
+    """各区間の開始パルス位置"""
+    starts = []
+    y = 0
+    for _, measures in sections:
+        starts.append(y)
+        y += measures * BEATS_PER_MEASURE * resolution
+    return starts
+
+
+def section_events(sections, resolution=240):
+    """区間の先頭毎のbpm_events（同じBPMが続く区間はまとめる）"""
+    events = []
+    for (bpm, _), y in zip(sections, section_starts(sections, resolution)):
+        if not events or events[-1]["bpm"] != float(bpm):
+            events.append({"y": y, "bpm": float(bpm)})
+    return events
+
+
+def create_ladder_bmson(create, sections, seed=None, **options):
+    """テンポ階段譜面を生成
+
+    create: ジェネレータのBMSON生成関数（create_bmsonなど、total_measuresを受け付けるもの）
+    sections: [(BPM, 小節数), ...]
+    options: create に渡すBPM以外の引数
+    """
+    first_bpm = sections[0][0]
+    bmson = create(first_bpm, **options, seed=seed, total_measures=sum(measures for _, measures in sections))
+
+    info = bmson["info"]
+    bpms = [bpm for bpm, _ in sections]
+    info["title"] = f"{info['title'].rsplit(' BPM', 1)[0]} BPM{first_bpm:.0f}-{bpms[-1]:.0f}"
+    info["init_bpm"] = float(first_bpm)
+    if "base_bpm" in info:
+        info["base_bpm"] = float(min(bpms))
+    bmson["bpm_events"] = section_events(sections, info.get("resolution", 240))
+    # テンポ変化を含めて難易度を推定し直す
+    rate_chart(bmson)
+    return bmson
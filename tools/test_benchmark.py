@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+"""ベンチマーク結果の比較の確認"""
+from benchmark import compare, run
+
+
+def _report(notes_per_sec, peak_bytes):
+    return {"results": [{
+        "stage": "trill",
+        "params": {"bpm": 240, "minutes": 2},
+        "notes": 1000,
+        "seconds": 1000 / notes_per_sec,
+        "notes_per_sec": notes_per_sec,
+        "peak_bytes": peak_bytes,
+    }]}
+
+
+def test_compare_flags_regressions():
+    baseline = _report(100000, 1000)
+    assert compare(baseline, _report(90000, 1100)) == []
+    slower = compare(baseline, _report(70000, 1000))
+    assert [(key, metric) for key, metric, *_ in slower] == [("trill[bpm=240,minutes=2]", "notes_per_sec")]
+    larger = compare(baseline, _report(100000, 1500))
+    assert [metric for _, metric, *_ in larger] == ["peak_bytes"]
+
+
+def test_quick_run_covers_every_stage():
+    report = run([(120, 0.1)], repeat=1, include_build=False)
+    stages = {result["stage"] for result in report["results"]}
+    assert {"trill", "stair", "random", "trash", "write"} <= stages
+    assert all(result["notes"] > 0 for result in report["results"])
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""BMSONの遅延読み込みの確認"""
+import json
+import os
+import tempfile
+
+from bmson_reader import BmsonReader
+from bmson_writer import save_bmson
+from generate_bmson import create_bmson
+
+
+def _read_back(bmson, compact):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chart.bmson")
+        save_bmson(path, bmson, compact)
+        with open(path, encoding='utf-8') as f:
+            expected = json.load(f)
+        with BmsonReader(path) as reader:
+            return expected, reader.info, reader["bpm_events"], list(reader.channels())
+
+
+def test_matches_json_load():
+    """compact・pretty どちらの形式も json.load と同じ内容に読める"""
+    bmson = create_bmson(180, include_scratch=True, include_trash=True, seed=2)
+    for compact in (True, False):
+        expected, info, bpm_events, channels = _read_back(bmson, compact)
+        assert info == expected["info"] and bpm_events == expected["bpm_events"]
+        assert [(name, notes.to_notes()) for name, notes in channels] == [
+            (channel["name"], channel["notes"]) for channel in expected["sound_channels"]]
+
+
+def test_selected_channels_and_other_layouts():
+    """指定したチャンネルだけを変換し、キーの順序が違うノートや空のノート配列も読める"""
+    document = {
+        "info": {"title": "t", "init_bpm": 120.0},
+        "sound_channels": [
+            {"notes": [{"y": 240, "x": 3, "c": True}], "name": "a.wav"},
+            {"name": "b.wav", "notes": []},
+            {"name": "c.wav", "notes": [{"x": 1, "y": 0, "l": 0, "c": False}]},
+        ],
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chart.bmson")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=1)
+        with BmsonReader(path) as reader:
+            assert reader.channel_names() == ["a.wav", "b.wav", "c.wav"]
+            assert [(name, len(notes)) for name, notes in reader.channels({"b.wav", "c.wav"})] == [
+                ("b.wav", 0), ("c.wav", 1)]
+            notes = reader.sound_channels[0].notes()
+            assert notes.to_notes() == [{"x": 3, "y": 240, "l": 0, "c": True}]
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""ストリーミング書き出しと json.dump の一致の確認"""
+import io
+import json
+
+import pytest
+
+from bmson_writer import bmson_bytes, write_bmson
+from generate_bmson import create_bmson
+from generate_random_bmson import create_random_bmson
+from generate_stair_bmson import create_stair_bmson
+
+
+def _plain(bmson):
+    """ノート配列をノート辞書のリストにした同じBMSON（json.dumpで書ける形）"""
+    plain = dict(bmson)
+    plain["sound_channels"] = [
+        dict(channel, notes=channel["notes"] if isinstance(channel["notes"], list) else channel["notes"].to_notes())
+        for channel in bmson["sound_channels"]
+    ]
+    return plain
+
+
+CHARTS = [
+    lambda: create_bmson(150, include_trash=True, trash_type="8th", seed=1, duration_minutes=0.25),
+    lambda: create_bmson(150, seed=1, duration_minutes=0.25),  # 空のスクラッチチャンネル
+    lambda: create_stair_bmson(180, include_scratch=True, seed=2, duration_minutes=0.25),
+    lambda: create_random_bmson(200, [1, 2, 3], "05_[1, 2, 3]乱打", 16, 0.25, seed=3, duration_minutes=0.25),
+]
+
+
+@pytest.mark.parametrize("make", CHARTS)
+def test_pretty_is_json_dump(make):
+    """pretty は json.dump(indent=2, ensure_ascii=False) と同一のバイト列"""
+    bmson = make()
+    expected = io.StringIO()
+    json.dump(_plain(bmson), expected, indent=2, ensure_ascii=False)
+    assert bmson_bytes(bmson, compact=False) == expected.getvalue().encode('utf-8')
+
+    # ノート辞書のリストのままでも同じ
+    written = io.StringIO()
+    write_bmson(written, _plain(bmson), compact=False)
+    assert written.getvalue() == expected.getvalue()
+
+
+@pytest.mark.parametrize("make", CHARTS)
+def test_compact_parses_to_same_object(make):
+    bmson = make()
+    data = bmson_bytes(bmson)
+    assert json.loads(data) == json.loads(json.dumps(_plain(bmson)))
+    assert b"\n" not in data and b": " not in data
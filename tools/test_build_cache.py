@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""インクリメンタルビルドのキャッシュの確認"""
+import os
+
+import build_cache
+from build_all import build, job_key, list_jobs
+from build_cache import MANIFEST_NAME, BuildManifest, chart_key, hash_sources
+from build_matrix import parse_filter
+
+
+def _jobs(expression="family=stair variant=stair_practice,stair_scratch_practice bpm<=120"):
+    return list_jobs(where=parse_filter(expression))
+
+
+def _mtimes(output_dir, jobs):
+    return {job["relpath"]: os.stat(os.path.join(output_dir, job["relpath"])).st_mtime_ns for job in jobs}
+
+
+def test_skips_up_to_date_charts(tmp_path, capsys):
+    jobs = _jobs()
+    build(jobs, str(tmp_path), workers=1, sound_mode=None)
+    before = _mtimes(tmp_path, jobs)
+    capsys.readouterr()
+
+    build(_jobs(), str(tmp_path), workers=1, sound_mode=None)
+    output = capsys.readouterr().out
+    assert "0 charts" in output and "4 up to date" in output
+    assert _mtimes(tmp_path, jobs) == before
+
+    # ファイルが消えていれば鍵が同じでも生成し直す
+    os.remove(os.path.join(tmp_path, jobs[0]["relpath"]))
+    build(_jobs(), str(tmp_path), workers=1, sound_mode=None)
+    output = capsys.readouterr().out
+    assert "1 charts" in output and "3 up to date" in output
+
+
+def test_removes_stale_charts(tmp_path):
+    jobs = _jobs()
+    build(jobs, str(tmp_path), workers=1, sound_mode=None)
+    kept = _jobs("family=stair variant=stair_practice bpm<=120")
+    build(kept, str(tmp_path), workers=1, sound_mode=None, families=["stair"])
+    assert sorted(os.listdir(tmp_path / "02_stair_practice")) == sorted(job["filename"] for job in kept)
+    assert set(BuildManifest(str(tmp_path)).entries) == {job["relpath"] for job in kept}
+
+
+def test_key_changes_with_parameters_and_seed():
+    job = _jobs()[0]
+    key = job_key(job, 0)
+    assert job_key(dict(job), 0) == key
+    assert job_key(job, 1) != key
+    assert job_key(job, 0, compact=False) != key
+    assert job_key(dict(job, kwargs=dict(job["kwargs"], include_trash=True)), 0) != key
+
+
+def test_key_changes_with_sources(tmp_path):
+    source = tmp_path / "generator.py"
+    source.write_text("A = 1\n")
+    first = hash_sources([str(source)])
+    assert hash_sources([str(source)]) == first
+    source.write_text("A = 2\n")
+    build_cache._source_hashes.clear()
+    second = hash_sources([str(source)])
+    assert second != first
+    assert chart_key({"bpm": 120}, 0, first) != chart_key({"bpm": 120}, 0, second)
+    # 引数の順序は鍵に影響しない
+    assert chart_key({"a": 1, "b": 2}, 0, first) == chart_key({"b": 2, "a": 1}, 0, first)
+
+
+def test_corrupt_manifest_rebuilds(tmp_path, capsys):
+    jobs = _jobs()
+    build(jobs, str(tmp_path), workers=1, sound_mode=None)
+    for content in ("{not json", "[]"):
+        (tmp_path / MANIFEST_NAME).write_text(content)
+        assert BuildManifest(str(tmp_path)).entries == {}
+        capsys.readouterr()
+        build(_jobs(), str(tmp_path), workers=1, sound_mode=None)
+        assert "4 charts" in capsys.readouterr().out
+        assert set(BuildManifest(str(tmp_path)).entries) == {job["relpath"] for job in jobs}
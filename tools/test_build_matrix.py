@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""ビルド対象の一覧（build_matrix.json）と絞り込み式の確認"""
+import os
+import tempfile
+
+import pytest
+
+from build_all import build, list_jobs
+from build_matrix import ChartFilter, iter_charts, parse_filter
+
+
+def test_matrix_covers_every_family():
+    """トリル・階段は4バリエーション×7BPM、乱打は28組み合わせ×8BPM"""
+    jobs = list_jobs()
+    counts = {}
+    for job in jobs:
+        counts[job["family"]] = counts.get(job["family"], 0) + 1
+    assert counts == {"trill": 28, "stair": 28, "random": 224}
+    assert len({job["relpath"] for job in jobs}) == len(jobs)
+    # 8分皿・16分皿は同時押しの少ないパターンのみ
+    assert not [job for job in jobs if job["family"] == "random"
+                and job["kwargs"]["scratch_interval"] in (8, 16) and 4 in job["kwargs"]["chord_sizes"]]
+
+
+def test_filter_selects_matching_charts():
+    where = parse_filter("family=random chord=1_2 scratch=8 bpm>=200")
+    assert [job["filename"] for job in list_jobs(where=where)] == [
+        f"random_1_2_random_8th_scratch_{probability}_practice_bpm{bpm}.bmson"
+        for probability in (25, 50) for bpm in (200, 220, 240)
+    ]
+    assert len(list_jobs(where=parse_filter("scratch=none trash=8th"))) == 14
+    assert len(list_jobs(where=parse_filter("variant=stair_* bpm!=100,120"))) == 20
+    assert [job["bpm"] for job in list_jobs(["trill"], parse_filter("variant=trill_practice bpm<140"))] == [100, 120]
+
+
+def test_filter_prunes_before_expanding():
+    """ジェネレータ・バリエーションの条件に合わないものはBPMまで展開しない"""
+    where = ChartFilter("family=stair variant=stair_practice bpm=160")
+    calls = []
+    matches = where.matches
+    where.matches = lambda attrs: calls.append(attrs) or matches(attrs)
+    assert [job["filename"] for job in iter_charts(where=where)] == ["stair_practice_bpm160.bmson"]
+    assert len(calls) == 3 + 4 + 7
+
+
+def test_invalid_filter():
+    assert parse_filter("  ") is None
+    for expression in ("bogus=1", "bpm>=fast", "family"):
+        with pytest.raises(ValueError):
+            parse_filter(expression)
+
+
+def test_partial_build_keeps_other_charts():
+    """絞り込んだビルドは他の譜面を削除しない"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        full = list_jobs(["stair"], parse_filter("variant=stair_practice bpm<=120"))
+        build(full, output_dir, workers=1, sound_mode=None)
+        one = list_jobs(where=parse_filter("family=stair variant=stair_practice bpm=100"))
+        build(one, output_dir, workers=1, sound_mode=None, force=True, partial=True)
+        assert sorted(os.listdir(os.path.join(output_dir, "02_stair_practice"))) == [
+            "stair_practice_bpm100.bmson", "stair_practice_bpm120.bmson"]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""アーカイブ書き出しとファイル書き出しの一致確認"""
+import os
+import tarfile
+import tempfile
+import zipfile
+
+import pytest
+
+import build_all
+from build_all import build, build_archives, list_jobs
+
+
+def test_archive_matches_files():
+    """アーカイブ内の譜面と音声ファイルが通常のビルド結果と同じバイト列"""
+    jobs = [job for job in list_jobs(["stair"]) if job["bpm"] == 100]
+    with tempfile.TemporaryDirectory() as files_dir, tempfile.TemporaryDirectory() as archive_dir:
+        build(jobs, files_dir, workers=1, seed=3)
+        build_archives(jobs, archive_dir, workers=1, seed=3, archive_format="zip", compression_level=1)
+        build_archives(jobs, archive_dir, workers=1, seed=3, archive_format="tar.gz")
+
+        with zipfile.ZipFile(os.path.join(archive_dir, "02_stair_practice.zip")) as archive:
+            names = sorted(archive.namelist())
+            assert len(names) == len(jobs) + 3
+            for name in names:
+                with open(os.path.join(files_dir, name), 'rb') as f:
+                    assert archive.read(name) == f.read()
+
+        with tarfile.open(os.path.join(archive_dir, "02_stair_practice.tar.gz")) as archive:
+            assert sorted(archive.getnames()) == names
+
+
+def test_failed_build_removes_temporary_archives(monkeypatch):
+    """途中で失敗したら書きかけのアーカイブ（.tmp）を残さず、元の例外を送出する"""
+    jobs = [job for job in list_jobs(["stair"]) if job["bpm"] == 100]
+    create_chart = build_all.create_chart
+    calls = []
+
+    def failing_create_chart(job, seed, bases=None):
+        calls.append(job["filename"])
+        if len(calls) == 2:
+            raise RuntimeError("generation failed")
+        return create_chart(job, seed, bases)
+
+    monkeypatch.setattr(build_all, "create_chart", failing_create_chart)
+    with tempfile.TemporaryDirectory() as archive_dir:
+        with pytest.raises(RuntimeError, match="generation failed"):
+            build_archives(jobs, archive_dir, workers=1, archive_format="zip")
+        assert os.listdir(archive_dir) == []
+
+
+def test_abort_with_open_zip_entry_removes_temporary_archive():
+    """圧縮レベルが不正で書き込み中のzipを閉じられなくても.tmpを削除する"""
+    jobs = [job for job in list_jobs(["stair"]) if job["bpm"] == 100]
+    with tempfile.TemporaryDirectory() as archive_dir:
+        with pytest.raises(ValueError, match="Invalid initialization option"):
+            build_archives(jobs, archive_dir, workers=1, archive_format="zip", compression_level=12)
+        assert os.listdir(archive_dir) == []
+
+
+def _tar_members(path):
+    with tarfile.open(path) as archive:
+        return [(member.name, archive.extractfile(member).read()) for member in archive]
+
+
+def test_archive_shares_base_per_bpm(monkeypatch):
+    """アーカイブ書き出しでも同じBPMのバリエーションは基本譜面を1つ共有し、並列実行でも同じ内容"""
+    jobs = [job for job in list_jobs(["trill"]) if job["bpm"] in (100, 120)]
+    create_chart = build_all.create_chart
+    built = []
+
+    def recording_create_chart(job, seed, bases=None):
+        built.append(len(bases))
+        return create_chart(job, seed, bases)
+
+    with tempfile.TemporaryDirectory() as serial_dir, tempfile.TemporaryDirectory() as parallel_dir:
+        with monkeypatch.context() as patch:
+            patch.setattr(build_all, "create_chart", recording_create_chart)
+            build_archives(jobs, serial_dir, workers=1, seed=3, archive_format="tar")
+        # 基本譜面を生成するのはBPM毎の最初のバリエーションだけ
+        assert len(built) == len(jobs) and built.count(0) == 2
+
+        build_archives(jobs, parallel_dir, workers=2, seed=3, archive_format="tar")
+        assert (_tar_members(os.path.join(parallel_dir, "01_trill_practice.tar"))
+                == _tar_members(os.path.join(serial_dir, "01_trill_practice.tar")))
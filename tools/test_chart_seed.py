@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""シードによる譜面の再現性の確認"""
+import random
+
+import pytest
+
+from bmson_writer import bmson_bytes
+from chart_seed import SEED_BITS, chart_rng, derive_seed, sub_rng
+from generate_bmson import create_bmson
+from generate_random_bmson import create_random_bmson
+from generate_stair_bmson import create_stair_bmson
+
+CREATE = [
+    lambda seed: create_bmson(160, include_trash=True, seed=seed, duration_minutes=0.5),
+    lambda seed: create_stair_bmson(160, include_trash=True, trash_type="8th", seed=seed, duration_minutes=0.5),
+    lambda seed: create_random_bmson(160, [1, 2, 3], "05_[1, 2, 3]乱打", 8, 0.5, seed=seed, duration_minutes=0.5),
+]
+
+
+def test_derive_seed_is_stable():
+    """導出したシードはプロセスや実行順に依らず固定（値が変わると全譜面が変わる）"""
+    assert derive_seed(0, "trill_bpm120") == derive_seed(0, "trill_bpm120")
+    assert derive_seed("0", "trill_bpm120") == derive_seed(0, "trill_bpm120")
+    assert derive_seed(0, "a", "b") == derive_seed(0, "a:b")
+    assert derive_seed(0, "trill_bpm120") != derive_seed(1, "trill_bpm120")
+    assert derive_seed(0, "trill_bpm120") != derive_seed(0, "trill_bpm140")
+    assert derive_seed(0, "trill_bpm120") == 53409709527586
+
+
+@pytest.mark.parametrize("create", CREATE)
+def test_same_seed_same_chart(create):
+    """同じシードなら同じバイト列、違うシードなら違う譜面"""
+    random.seed(1)
+    first = bmson_bytes(create(42))
+    random.seed(2)  # グローバルなrandomの状態に依存しない
+    assert bmson_bytes(create(42)) == first
+    assert bmson_bytes(create(43)) != first
+
+
+@pytest.mark.parametrize("create", CREATE)
+def test_seed_recorded_in_info(create):
+    """info.seed に記録したシードで同じ譜面を再現できる（省略時は新しいシード）"""
+    assert create(7)["info"]["seed"] == 7
+    fresh = create(None)
+    seed = fresh["info"]["seed"]
+    assert 0 <= seed < 1 << SEED_BITS
+    assert bmson_bytes(create(seed)) == bmson_bytes(fresh)
+
+
+def test_rng_streams():
+    seed, rng = chart_rng(5)
+    assert seed == 5 and rng.random() == random.Random(5).random()
+    assert sub_rng(5, "trash").random() == random.Random(derive_seed(5, "trash")).random()
+    assert sub_rng(5, "trash").random() != sub_rng(5, "scratch").random()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""その場で生成するHTTPサーバとLRUキャッシュの確認"""
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from bmson_writer import bmson_bytes
+from chart_server import ChartCache, make_server
+from generate_bmson import create_bmson
+from generate_random_bmson import create_random_bmson
+
+
+@pytest.fixture
+def server():
+    server = make_server(port=0, quiet=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _get(server, path):
+    host, port = server.server_address[:2]
+    with urllib.request.urlopen(f"http://{host}:{port}{path}") as response:
+        return response.read(), response.headers
+
+
+def test_serves_any_bpm_and_caches(server):
+    """ビルド対象に無いBPMも生成し、2回目はキャッシュから同じバイト列を返す"""
+    data, headers = _get(server, "/chart?family=trill&variant=trill_trash_4th_practice&bpm=175&seed=3")
+    assert data == bmson_bytes(create_bmson(175, include_trash=True, trash_type="4th", seed=3))
+    assert headers["X-Cache"] == "miss" and headers["X-Chart-Seed"] == "3"
+
+    again, headers = _get(server, "/chart?variant=trill_trash_4th_practice&bpm=175&seed=3")
+    assert again == data and headers["X-Cache"] == "hit"
+
+    data, _ = _get(server, "/chart?variant=random_1_2_random_8th_scratch_25_practice&bpm=190&seed=4")
+    assert data == bmson_bytes(create_random_bmson(190, [1, 2], "02_[1, 2]乱打", 8, 0.25, seed=4))
+
+    stats = json.loads(_get(server, "/stats")[0])
+    assert stats["requests"] == 3 and stats["hits"] == 1 and stats["cached"] == 2
+    assert stats["p50_ms"] <= stats["p99_ms"]
+
+
+def test_new_seed_when_omitted(server):
+    _, first = _get(server, "/chart?variant=stair_practice&bpm=150")
+    _, second = _get(server, "/chart?variant=stair_practice&bpm=150")
+    assert first["X-Chart-Seed"] != second["X-Chart-Seed"]
+
+
+@pytest.mark.parametrize("query", [
+    "variant=unknown&bpm=150",
+    "family=stair&variant=trill_practice&bpm=150",
+    "variant=trill_practice&bpm=fast",
+    "variant=trill_practice&bpm=1000",
+    "variant=trill_practice&bpm=150&seed=x",
+])
+def test_bad_query(server, query):
+    with pytest.raises(urllib.error.HTTPError) as error:
+        _get(server, f"/chart?{query}")
+    assert error.value.code == 400
+
+
+def test_cache_evicts_least_recently_used():
+    cache = ChartCache(max_entries=2)
+    cache.put("a", b"1")
+    cache.put("b", b"22")
+    cache.get("a")
+    cache.put("c", b"333")
+    assert cache.get("b") is None and cache.get("a") == b"1" and cache.bytes == 4
+
+    cache = ChartCache(max_entries=10, max_bytes=5)
+    for key in "abc":
+        cache.put(key, b"xx")
+    assert len(cache) == 2 and cache.get("a") is None
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""基本譜面を共有するバリエーションの確認"""
+import io
+
+from bmson_writer import write_bmson
+from chart_data import NoteLayers
+from generate_bmson import TRILL_VARIANTS, compose_bmson, create_bmson, trill_base
+from generate_stair_bmson import STAIR_VARIANTS, compose_stair_bmson, create_stair_bmson, stair_base
+
+FAMILIES = [
+    (trill_base, compose_bmson, create_bmson, TRILL_VARIANTS, 1),
+    (stair_base, compose_stair_bmson, create_stair_bmson, STAIR_VARIANTS, 0),
+]
+
+
+def _dump(bmson):
+    buffer = io.StringIO()
+    write_bmson(buffer, bmson)
+    return buffer.getvalue()
+
+
+def test_variants_share_base_arrays():
+    """全バリエーションが同じ基本譜面の配列を参照し、個別生成と同じ内容になる"""
+    for make_base, compose, create, variants, channel in FAMILIES:
+        base = make_base(160, seed=5)
+        for _, options, _ in variants:
+            bmson = compose(base, **options)
+            notes = bmson["sound_channels"][channel]["notes"]
+            if options.get("include_trash"):
+                assert isinstance(notes, NoteLayers) and notes.layers[0] is base["notes"]
+            else:
+                assert notes is base["notes"]
+            assert _dump(bmson) == _dump(create(160, **options, seed=5))
+
+
+def test_bases_shared_only_when_requested():
+    """基本譜面は呼び出し側が渡した辞書の中でだけ共有する"""
+    for make_base, _, create, variants, channel in FAMILIES:
+        assert make_base(160, seed=5)["notes"] is not make_base(160, seed=5)["notes"]
+        bases = {}
+        first = create(160, seed=5, bases=bases)
+        second = create(160, **variants[1][1], seed=5, bases=bases)
+        assert len(bases) == 1
+        assert second["sound_channels"][channel]["notes"] is first["sound_channels"][channel]["notes"]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""乱打の和音の窓による制約の確認"""
+import io
+import random
+
+import pytest
+
+from bmson_writer import write_bmson, write_bmson_stream
+from generate_random_bmson import create_random_bmson, stream_random_bmson
+from random_patterns import (CHORD_LANES, HANDS, ChordConstraints, HandRun, LaneDensity, RandomPatternGenerator,
+                             RepeatGap, VerticalRule, chord_mask, make_constraints, transition_table)
+
+
+def _rows(chord_sizes, constraints, seed=0, count=4000):
+    generator = RandomPatternGenerator(chord_sizes, random.Random(seed), constraints)
+    return [generator.next_chord() for _ in range(count)]
+
+
+def test_default_is_vertical_rule():
+    """制約の指定なしは従来の候補表そのもの"""
+    constraints = ChordConstraints()
+    assert constraints.window == 0
+    assert constraints.table(chord_mask([1, 2]), 2) is transition_table(chord_mask([1, 2]), 2)
+    assert _rows([1, 2, 3], None, count=500) == _rows([1, 2, 3], [VerticalRule(6)], count=500)
+
+
+def test_vertical_threshold():
+    """閾値を下げると従来は縦連しない組み合わせでも縦連を許可する"""
+    rows = _rows([2, 3], None)
+    assert all(not prev & chord for prev, chord in zip(rows, rows[1:]))
+    rows = _rows([2, 3], {"vertical": 3})
+    assert any(prev & chord for prev, chord in zip(rows, rows[1:]))
+
+
+def test_lane_density():
+    """4行中に同じレーンを3回使わない"""
+    rows = _rows([1, 2], {"lane_density": [2, 4]})
+    for start in range(len(rows) - 3):
+        window = rows[start:start + 4]
+        for lane in range(1, 8):
+            assert sum(chord >> lane & 1 for chord in window) <= 2
+
+
+def test_repeat_gap():
+    """直前 min_gap-1 行に使ったレーンを禁止し、それより前の行は見ない"""
+    rule = RepeatGap(3)
+    assert rule.rows == 2
+    lane_bits = [0] * 8
+    lane_bits[1] = 0b001  # 1行前
+    lane_bits[4] = 0b010  # 2行前
+    lane_bits[6] = 0b100  # 3行前（窓の外）
+    assert rule.restrict(lane_bits, 0b11) == (chord_mask([1, 4]), 0)
+    assert RepeatGap(1).restrict(lane_bits, 0b11) == (0, 0)
+
+    rows = _rows([1], {"repeat_gap": 4})
+    for start in range(len(rows) - 3):
+        lanes = [CHORD_LANES[chord][0] for chord in rows[start:start + 4]]
+        assert len(set(lanes)) == 4
+
+
+def test_hand_run():
+    """片手だけの行が3行を超えて続かない"""
+    rows = _rows([1], [HandRun(3)])
+    run = 0
+    previous = None
+    for chord in rows:
+        hand = next(index for index, hand in enumerate(HANDS) if chord & chord_mask(hand))
+        run = run + 1 if hand == previous else 1
+        previous = hand
+        assert run <= 3
+
+
+def test_window_bits():
+    """レーン毎のビット列は bit i = i+1 行前"""
+    constraints = ChordConstraints([LaneDensity(2, 5)])
+    for lanes in ([1], [2, 3], [1, 3]):
+        constraints.push(chord_mask(lanes))
+    assert constraints.window == 4 and constraints.filled == 0b111
+    assert constraints.lane_bits[1] == 0b101 and constraints.lane_bits[3] == 0b011
+    # 直近4行で2回使ったレーン1・3は選ばない
+    assert constraints.table(0, 1) == tuple(chord_mask([lane]) for lane in (2, 4, 5, 6, 7))
+
+
+def test_unsatisfiable_falls_back():
+    """全ての和音が除かれる場合は縦連の規則だけの候補表から選ぶ"""
+    assert len(set(_rows([4], {"repeat_gap": 3}, count=200))) > 1
+
+
+def test_bad_spec():
+    for spec in ({"unknown": 1}, {"lane_density": [4, 4]}, {"repeat_gap": 0}, {"hand_run": 0}):
+        with pytest.raises(ValueError):
+            make_constraints(spec)
+
+
+def test_stream_matches_batch_with_constraints():
+    spec = {"lane_density": [2, 4], "hand_run": 4}
+    args = (220, [1, 2], "02_[1, 2]乱打", 8, 0.5)
+    batch = io.StringIO()
+    write_bmson(batch, create_random_bmson(*args, seed=3, duration_minutes=0.5, constraints=spec))
+    stream = io.StringIO()
+    write_bmson_stream(stream, *stream_random_bmson(*args, seed=3, duration_minutes=0.5, constraints=spec))
+    assert stream.getvalue() == batch.getvalue()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""乱打の和音候補表と従来方式の分布の一致確認"""
+import random
+from collections import Counter
+
+from bench_random_chords import legacy_next_chord, total_variation
+from random_patterns import CHORD_LANES, allowed_repeat, chord_mask, transition_table
+
+CASES = [
+    ((), 1),
+    ((3,), 2),
+    ((1, 2), 2),
+    ((2, 4, 6), 3),
+    ((1, 2, 3, 4), 4),
+    ((1, 3, 5, 7), 3),
+]
+
+
+def test_tables_follow_vertical_rule():
+    """候補表の和音は縦連の許可数を超えない"""
+    for prev_mask in range(0, 256, 2):
+        prev_size = len(CHORD_LANES[prev_mask])
+        for chord_size in (1, 2, 3, 4):
+            limit = allowed_repeat(prev_size, chord_size) if prev_size else 0
+            for chord in set(transition_table(prev_mask, chord_size)):
+                assert len(CHORD_LANES[chord]) == chord_size
+                assert bin(chord & prev_mask).count("1") <= limit
+
+
+def test_tables_match_legacy_distribution(samples=20000):
+    """前の和音を固定したときの次の和音の分布が従来方式と一致"""
+    rng = random.Random(0)
+    for prev_lanes, chord_size in CASES:
+        legacy = Counter(
+            chord_mask(legacy_next_chord(rng, [chord_size], [list(prev_lanes)] if prev_lanes else []))
+            for _ in range(samples)
+        )
+        table = Counter(transition_table(chord_mask(prev_lanes), chord_size))
+        distance = total_variation(legacy, table)
+        assert distance < 0.05, f"前{list(prev_lanes)} → {chord_size}鍵: 分布の差 {distance:.4f}"
+
+
+if __name__ == "__main__":
+    test_tables_follow_vertical_rule()
+    test_tables_match_legacy_distribution()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""難易度推定の確認"""
+import pytest
+
+from difficulty import chart_metrics, gauge_total, np
+from generate_bmson import create_bmson
+from generate_random_bmson import create_random_bmson
+from tempo_ladder import create_ladder_bmson, step_sections
+
+
+def test_vectorized_matches_loop():
+    if np is None:
+        pytest.skip("numpy is not installed")
+    bmson = create_random_bmson(180, [1, 2, 3], "1-2-3", scratch_interval=8, seed=4,
+                                include_trash=True, trash_type="8th")
+    vectorized = chart_metrics(bmson, vectorized=True)
+    assert vectorized == pytest.approx(chart_metrics(bmson, vectorized=False))
+    assert vectorized["scratch_nps"] > 0 and vectorized["chord"] > 1.5
+
+
+def test_level_follows_load():
+    """BPM・ゴミ・同時押しが増えるほどレベルが上がり、totalはノート数で増える"""
+    slow = create_bmson(100, seed=1)["info"]
+    fast = create_bmson(220, seed=1)["info"]
+    trash = create_bmson(220, include_trash=True, trash_type="8th", seed=1)["info"]
+    chords = create_random_bmson(220, [1, 2, 3, 4], "1-4", seed=1)["info"]
+    assert 1 <= slow["level"] < fast["level"] < trash["level"] <= chords["level"] <= 12
+    assert slow["total"] < fast["total"] < trash["total"]
+    assert gauge_total(0) == 260.0
+
+
+def test_ladder_rated_with_tempo_changes():
+    """テンポ階段譜面は最後の区間のBPMの速さで評価される"""
+    bmson = create_ladder_bmson(create_bmson, step_sections([100, 220], 0.5), seed=1)
+    assert bmson["info"]["level"] == create_bmson(220, seed=1)["info"]["level"]
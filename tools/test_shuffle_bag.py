@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""シャッフルバッグ（重複なしの選択）の確認"""
+import itertools
+import random
+from collections import Counter
+
+import pytest
+
+from shuffle_bag import ShuffleBag
+from stair_patterns import PATTERN_TYPES, StairPatternGenerator
+from trill_patterns import trill_pattern_generator
+
+
+def test_each_item_once_per_cycle():
+    bag = ShuffleBag(range(50), random.Random(1))
+    for _ in range(4):
+        assert sorted(bag.draw() for _ in range(50)) == list(range(50))
+        assert bag.remaining == 0
+
+
+def test_avoid_seam():
+    """使い切った直後に前の巡の最後と同じ要素を選ばない"""
+    for seed in range(200):
+        bag = ShuffleBag("abc", random.Random(seed), avoid_seam=True)
+        draws = [bag.draw() for _ in range(30)]
+        assert all(first != second for first, second in zip(draws, draws[1:]))
+    # 要素が1種類なら避けようがないのでそのまま
+    assert [ShuffleBag("aa", avoid_seam=True).draw() for _ in range(3)] == ["a"] * 3
+
+
+def test_weights():
+    bag = ShuffleBag("abc", random.Random(2), weights=[3, 1, 0])
+    assert len(bag) == 4
+    for _ in range(10):
+        assert Counter(bag.draw() for _ in range(4)) == {"a": 3, "b": 1}
+    for weights in ([1, 2], [1, -1, 1], [1.5, 1, 1], [0, 0, 0]):
+        with pytest.raises(ValueError):
+            ShuffleBag("abc", weights=weights)
+
+
+def test_large_pool():
+    """数千要素（7鍵の3・4レーンの和音の組のトリル）でも1巡を重複なしで選ぶ"""
+    chords = [chord for size in (3, 4) for chord in itertools.combinations(range(1, 8), size)]
+    pairs = list(itertools.product(chords, chords))
+    bag = ShuffleBag(pairs, random.Random(3), avoid_seam=True)
+    assert len(bag) == 4900
+    for _ in range(2):
+        assert len(set(itertools.islice(bag, len(bag)))) == len(pairs)
+
+
+def test_generators_use_every_pattern_before_repeating():
+    trill = trill_pattern_generator(random.Random(4))
+    pairs = [next(trill) for _ in range(63)]
+    for start in (0, 21, 42):
+        assert len(set(pairs[start:start + 21])) == 21
+
+    # 既定では巡のつなぎ目を避けない（従来の回し方）、指定すれば避ける
+    assert not trill_pattern_generator(random.Random(4)).avoid_seam
+    for seed in range(50):
+        trill = trill_pattern_generator(random.Random(seed), avoid_seam=True)
+        pairs = [next(trill) for _ in range(63)]
+        assert all(first != second for first, second in zip(pairs, pairs[1:]))
+
+    stair = StairPatternGenerator(rng=random.Random(5))
+    types = [stair.pattern_types.draw() for _ in range(3 * len(PATTERN_TYPES))]
+    for start in range(0, len(types), len(PATTERN_TYPES)):
+        assert sorted(types[start:start + len(PATTERN_TYPES)]) == sorted(PATTERN_TYPES)
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""音声ファイルの重複排除の確認"""
+import os
+import tempfile
+
+import sound_assets
+from sound_assets import STORE_NAME, package_sounds
+
+GROUP_SOUNDS = {
+    "01_trill_practice": {"handclap.wav", "metronome.wav", "scratch.wav"},
+    "02_stair_practice": {"handclap.wav", "metronome.wav", "scratch.wav"},
+}
+
+
+def test_each_sound_stored_once():
+    """同じ内容の音声ファイルは1つだけ保存され、曲フォルダからは同じ実体を指す"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        stats, missing = package_sounds(output_dir, GROUP_SOUNDS)
+        assert missing == []
+        assert len(os.listdir(os.path.join(output_dir, STORE_NAME))) == 3
+        for name in GROUP_SOUNDS["01_trill_practice"]:
+            first = os.path.join(output_dir, "01_trill_practice", name)
+            second = os.path.join(output_dir, "02_stair_practice", name)
+            assert os.path.samefile(first, second)
+
+        stats, _ = package_sounds(output_dir, GROUP_SOUNDS)
+        assert stats["linked"] == 0 and stats["unchanged"] == 6
+
+
+def test_falls_back_to_copy(monkeypatch):
+    """リンクできないファイルシステムではコピーで配置する"""
+    def refuse(*args):
+        raise OSError("links not supported")
+
+    monkeypatch.setattr(sound_assets.os, "link", refuse)
+    monkeypatch.setattr(sound_assets.os, "symlink", refuse)
+    with tempfile.TemporaryDirectory() as output_dir:
+        stats, _ = package_sounds(output_dir, GROUP_SOUNDS)
+        assert stats["linked"] == 6 and stats["saved_bytes"] == 0
+        target = os.path.join(output_dir, "01_trill_practice", "handclap.wav")
+        assert os.path.isfile(target) and not os.path.islink(target)
+        assert os.path.getsize(target) == 142971
+
+
+def test_missing_sound_reported():
+    with tempfile.TemporaryDirectory() as output_dir:
+        _, missing = package_sounds(output_dir, {"01_trill_practice": {"no_such.wav"}})
+        assert missing == ["no_such.wav"]
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""段階別計測の確認"""
+import io
+import json
+
+from generate_bmson import create_bmson
+from stage_profile import chart, profiling, stage
+
+
+def test_disabled_is_shared_noop():
+    """無効時は同じ何もしないオブジェクトを返す"""
+    assert stage("pattern") is stage("trash") is chart("a.bmson")
+    with stage("pattern") as timer:
+        timer.count(10)
+
+
+def test_records_stages_per_chart():
+    with profiling(memory=True) as profiler:
+        with chart("trill.bmson"):
+            create_bmson(120, include_trash=True, seed=1)
+    stages = [(record["chart"], record["stage"]) for record in profiler.records if record["type"] == "stage"]
+    assert stages == [("trill.bmson", "pattern"), ("trill.bmson", "assemble"), ("trill.bmson", "trash"),
+                      ("trill.bmson", "difficulty")]
+    chart_record = profiler.records[-1]
+    assert chart_record["type"] == "chart" and chart_record["peak_bytes"] > 0
+    assert profiler.stage_totals()["pattern"]["notes"] == 960
+
+    lines = io.StringIO()
+    profiler.write_jsonl(lines)
+    assert len([json.loads(line) for line in lines.getvalue().splitlines()]) == 5
+    summary = io.StringIO()
+    profiler.write_summary(summary)
+    assert "trill.bmson" in summary.getvalue()
+    assert stage("pattern") is chart("a.bmson")
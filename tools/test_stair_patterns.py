@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""階段パターンの事前計算テーブル・つなぎ目の規則・種類の回し方の確認"""
+import random
+
+from stair_patterns import (PATTERN_MEASURES, PATTERN_NAMES, PATTERN_NOTES, PATTERN_TYPES, TYPE_PATTERNS,
+                            StairPatternGenerator, _pattern_variants)
+
+
+def test_table_matches_pattern_builders():
+    """テーブルは種類毎の全バリエーションを順に並べたもの"""
+    index = 0
+    for pattern_type in PATTERN_TYPES:
+        variants = _pattern_variants(pattern_type)
+        assert TYPE_PATTERNS[pattern_type] == tuple(range(index, index + len(variants)))
+        for name, notes, measures in variants:
+            assert PATTERN_NAMES[index] == name and PATTERN_MEASURES[index] == measures
+            assert PATTERN_NOTES[index] == bytes(notes) and len(notes) == measures * 16
+            assert all(1 <= lane <= 7 for lane in notes)
+            index += 1
+    assert index == len(PATTERN_NAMES) == len(PATTERN_NOTES)
+
+
+def test_seam_drops_repeated_first_note():
+    """前のパターンの最後の音と同じ音で始まる場合は最初の音を削る"""
+    generator = StairPatternGenerator(rng=random.Random(0))
+    up = PATTERN_NAMES.index("large_stair_up")
+    down = PATTERN_NAMES.index("large_stair_down")
+    first = generator._take_notes(up)
+    assert first == PATTERN_NOTES[up] and generator.last_note == first[-1]
+    # 大階段（上り）の最後の音は4、大階段（下り）は7から始まるので削らない
+    assert generator._take_notes(down) == PATTERN_NOTES[down]
+    # 最後の音と同じ音で始まる場合は削る
+    generator.last_note = PATTERN_NOTES[up][0]
+    assert generator._take_notes(up) == PATTERN_NOTES[up][1:]
+
+
+def test_types_rotate_before_repeating():
+    generator = StairPatternGenerator(rng=random.Random(1))
+    indices = [generator.next_pattern_index() for _ in range(4 * len(PATTERN_TYPES))]
+    types = [next(pattern_type for pattern_type, members in TYPE_PATTERNS.items() if index in members)
+             for index in indices]
+    for start in range(0, len(types), len(PATTERN_TYPES)):
+        assert sorted(types[start:start + len(PATTERN_TYPES)]) == sorted(PATTERN_TYPES)
+
+
+def test_generate_measures_matches_iter_measures():
+    """一括生成と小節毎の生成は同じ内容で、小節の頭から始まり縦連しない"""
+    for total_measures in (1, 7, 64):
+        lanes, slots = StairPatternGenerator(rng=random.Random(2)).generate_measures(total_measures)
+        measures = list(StairPatternGenerator(rng=random.Random(2)).iter_measures(total_measures))
+        assert bytes(lanes) == b"".join(chunk for chunk, _ in measures)
+        assert list(slots) == [slot for _, rows in measures for slot in rows]
+        assert max(slots) < total_measures * 16
+        assert all(a < b for a, b in zip(slots, slots[1:]))
+        assert all(a != b for a, b in zip(lanes, lanes[1:]))
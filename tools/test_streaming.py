@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""小節毎の逐次生成の確認（一括生成と同じ内容・一定のメモリ）"""
+import io
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import pytest
+
+from bmson_writer import write_bmson, write_bmson_stream
+from build_all import FAMILIES, list_jobs
+from generate_endurance import STREAM_FUNCTIONS
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_stream_matches_batch():
+    """全バリエーションで逐次生成と一括生成が同じバイト列"""
+    seen = set()
+    for job in list_jobs():
+        if job["variant"] in seen:
+            continue
+        seen.add(job["variant"])
+        _, create, _ = FAMILIES[job["family"]]
+        for compact in (True, False):
+            batch = io.StringIO()
+            write_bmson(batch, create(**job["kwargs"], seed=11, duration_minutes=0.5), compact)
+            stream = io.StringIO()
+            write_bmson_stream(stream, *STREAM_FUNCTIONS[job["family"]](**job["kwargs"], seed=11, duration_minutes=0.5),
+                               compact)
+            assert stream.getvalue() == batch.getvalue(), job["variant"]
+
+
+def _peak_rss_mb(variant, minutes):
+    """耐久譜面を別プロセスで生成し、そのプロセスのピークメモリ（MB）を返す"""
+    with tempfile.TemporaryDirectory() as output_dir:
+        result = subprocess.run(
+            [sys.executable, "generate_endurance.py", variant, "--bpm", "240", "--minutes", str(minutes),
+             "--output", os.path.join(output_dir, "chart.bmson")],
+            cwd=TOOLS_DIR, capture_output=True, text=True, check=True,
+        )
+    return float(re.search(r"peak RSS ([\d.]+) MB", result.stdout).group(1))
+
+
+def test_endurance_memory_is_flat():
+    """60分・BPM240の耐久譜面でもピークメモリが5分の譜面とほぼ同じ"""
+    pytest.importorskip("resource")
+    for variant in ("trill_trash_4th_practice", "random_1_2_3_4_random_practice"):
+        short = _peak_rss_mb(variant, 5)
+        endurance = _peak_rss_mb(variant, 60)
+        assert endurance - short < 4, f"{variant}: 5分 {short:.1f} MB, 60分 {endurance:.1f} MB"
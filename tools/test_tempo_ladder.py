@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""テンポ階段譜面の確認"""
+import json
+
+from bmson_writer import bmson_bytes
+from generate_bmson import create_bmson
+from generate_random_bmson import create_random_bmson
+from tempo_ladder import create_ladder_bmson, ramp_sections, section_events, step_sections
+from validate_bmson import chart_notes
+
+
+def _note_rows(bmson):
+    """書き出したBMSONの全ノートの位置（ソート済み）"""
+    notes, overlay = chart_notes(json.loads(bmson_bytes(bmson)))
+    return sorted(y for y, _ in notes + overlay)
+
+
+def test_step_sections_cover_each_minute():
+    """各区間はそのBPMで指定の長さ以上、かつ小節数の単位に揃う"""
+    sections = step_sections([150, 200, 250], section_minutes=1, measure_unit=2)
+    assert sections == [(150, 38), (200, 50), (250, 64)]
+    for bpm, measures in sections:
+        assert measures * 4 / bpm >= 1
+
+
+def test_bpm_events_at_section_starts():
+    events = section_events([(150, 38), (200, 50), (200, 2), (250, 64)])
+    assert events == [
+        {"y": 0, "bpm": 150.0},
+        {"y": 38 * 960, "bpm": 200.0},
+        {"y": 90 * 960, "bpm": 250.0},
+    ]
+
+
+def test_ramp_reaches_end_bpm():
+    sections = ramp_sections(100, 200, 3, measure_unit=1)
+    bpms = [bpm for bpm, _ in sections]
+    assert bpms[0] == 100 and bpms == sorted(bpms) and 195 < bpms[-1] < 200
+    assert abs(sum(4 / bpm for bpm in bpms) - 3) < 4 / 200
+
+
+def test_ladder_chart_fills_all_sections():
+    """ノートは全区間の最後の小節まで並び、BPMを1つにした譜面と同じ内容になる"""
+    sections = step_sections([120, 180], section_minutes=0.5, measure_unit=2)
+    total = sum(measures for _, measures in sections)
+    random_options = {"chord_sizes": [1, 2], "pattern_name": "1-2"}
+    for create, options in ((create_bmson, {}), (create_random_bmson, random_options)):
+        bmson = create_ladder_bmson(create, sections, seed=3, **options)
+        assert bmson["info"]["init_bpm"] == 120.0
+        assert bmson["info"]["title"].endswith(" BPM120-180")
+        assert [event["bpm"] for event in bmson["bpm_events"]] == [120.0, 180.0]
+        rows = _note_rows(bmson)
+        assert (total - 1) * 960 <= rows[-1] < total * 960
+        assert _note_rows(create(120, seed=3, total_measures=total, **options)) == rows
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""パルス位置と時刻の変換の確認"""
+import random
+
+import pytest
+
+from generate_bmson import create_bmson
+from tempo_ladder import create_ladder_bmson, ramp_sections, step_sections
+from timing import TimingIndex, np, nps_profile
+
+VECTORIZED = [False, True] if np is not None else [False]
+
+
+def _index():
+    """BPM120で始まり、2小節目でBPM240、3小節目の頭で1拍停止する譜面"""
+    return TimingIndex(120, [{"y": 960, "bpm": 240.0}], [{"y": 1920, "duration": 240}])
+
+
+@pytest.mark.parametrize("vectorized", VECTORIZED)
+def test_tempo_change_and_stop(vectorized):
+    index = _index()
+    times = list(index.to_ms([0, 240, 960, 1200, 1920, 2160], vectorized=vectorized))
+    # 1小節目は1拍500ms、2小節目以降は250ms、停止（1拍）はy=1920のノートの後
+    assert times == pytest.approx([0, 500, 2000, 2250, 3000, 3500])
+
+
+@pytest.mark.parametrize("vectorized", VECTORIZED)
+def test_round_trip(vectorized):
+    index = _index()
+    ys = sorted(random.Random(0).randrange(0, 20000) for _ in range(500))
+    times = index.to_ms(ys, vectorized=vectorized)
+    assert list(index.to_pulses(times, vectorized=vectorized)) == pytest.approx(ys)
+    # 停止中の時刻は停止位置のまま
+    assert index.pulse_at(3100) == 1920
+
+
+def test_vectorized_matches_bisect():
+    if np is None:
+        pytest.skip("numpy is not installed")
+    index = TimingIndex(150, [{"y": y, "bpm": 150 + y / 96} for y in range(0, 96000, 1920)])
+    ys = list(range(0, 96000, 60))
+    assert index.to_ms(ys, vectorized=True).tolist() == pytest.approx(index.to_ms(ys, vectorized=False))
+
+
+def test_ladder_sections_last_requested_time():
+    """テンポ階段譜面のbpm_eventsで変換すると、階段の各区間は指定の長さ以上・1単位分未満、ランプは全体で指定の長さ"""
+    sections = step_sections([100, 150, 240], section_minutes=1, measure_unit=2)
+    index = TimingIndex.from_bmson(create_ladder_bmson(create_bmson, sections, seed=0))
+    start = 0
+    for bpm, measures in sections:
+        seconds = (index.measures_ms(start + measures) - index.measures_ms(start)) / 1000
+        assert 60 <= seconds < 60 + 2 * 4 * 60 / bpm
+        start += measures
+
+    sections = ramp_sections(100, 240, 5, measure_unit=1)
+    index = TimingIndex.from_bmson(create_ladder_bmson(create_bmson, sections, seed=0))
+    total = index.measures_ms(len(sections)) / 60000
+    assert 5 <= total < 5 + 4 / 240 * 1.01
+
+
+def test_nps_profile():
+    times = [0, 100, 999, 1000, 2500]
+    for vectorized in VECTORIZED:
+        assert nps_profile(times, vectorized=vectorized) == [3, 1, 1]
+    assert nps_profile([]) == []
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""ゴミノート配置レイヤーの確認（衝突しない・タイミング・NumPy版と逐次生成の一致）"""
+import random
+
+import pytest
+
+from chart_data import NoteColumns
+from random_patterns import RandomPatternGenerator
+from stair_patterns import StairPatternGenerator
+from trash_layer import FUTURE_ROWS, PAST_ROWS, TrashStream, np, place_trash
+from trill_patterns import generate_bmson_notes
+
+STEP = 60  # 16分の間隔（resolution 240）
+
+
+def _bases():
+    """基本譜面（トリル・階段・乱打）のNoteColumns"""
+    trill, _, _ = generate_bmson_notes(180, 1, rng=random.Random(1))
+    lanes, slots = StairPatternGenerator(rng=random.Random(2)).generate_measures(32)
+    stair = NoteColumns(lanes, [slot * STEP for slot in slots])
+    chords, _, _ = RandomPatternGenerator([1, 2, 3], random.Random(3)).generate_notes(180, 1)
+    return {"trill": trill, "stair": stair, "random": chords}
+
+
+def _rows(notes):
+    rows = {}
+    for x, y in zip(notes.x, notes.y):
+        rows.setdefault(y // STEP, set()).add(x)
+    return rows
+
+
+@pytest.mark.parametrize("trash_type, period, phase", [("4th", 4, 2), ("8th", 2, 1)])
+def test_trash_avoids_base_notes(trash_type, period, phase):
+    """ゴミは基本譜面のある行のタイミングにだけ置き、前3行・後2行のレーンと重ならない"""
+    for name, notes in _bases().items():
+        trash = place_trash(notes, trash_type, random.Random(4), vectorized=False)
+        rows = _rows(notes)
+        assert len(trash), name
+        for lane, y in zip(trash.x, trash.y):
+            slot, remainder = divmod(y, STEP)
+            assert remainder == 0 and slot % period == phase and slot in rows
+            assert 1 <= lane <= 7
+            for neighbor in range(slot - PAST_ROWS, slot + FUTURE_ROWS + 1):
+                assert lane not in rows.get(neighbor, ()), (name, slot, neighbor)
+        assert list(trash.y) == sorted(trash.y)
+
+
+def test_trash_skips_full_rows():
+    """除外レーンで全て埋まる行にはゴミを置かない（乱数は1回引く）"""
+    notes = NoteColumns([1, 2, 3, 4, 5, 6, 7, 1], [2 * STEP] * 7 + [6 * STEP])
+    rng = random.Random(5)
+    trash = place_trash(notes, "4th", rng, vectorized=False)
+    assert list(trash.y) == [6 * STEP] and trash.x[0] != 1
+    expected = random.Random(5)
+    expected.random()
+    expected.random()
+    assert rng.random() == expected.random()
+
+
+@pytest.mark.skipif(np is None, reason="NumPyが無い")
+@pytest.mark.parametrize("trash_type", ["4th", "8th"])
+def test_numpy_matches_loop(trash_type):
+    for name, notes in _bases().items():
+        loop = place_trash(notes, trash_type, random.Random(6), vectorized=False)
+        vectorized = place_trash(notes, trash_type, random.Random(6), vectorized=True)
+        assert list(vectorized.x) == list(loop.x) and list(vectorized.y) == list(loop.y), name
+
+
+def _measures(notes, measure=960):
+    """ノート列を小節毎のNoteColumnsに分ける"""
+    parts = {}
+    for x, y in zip(notes.x, notes.y):
+        part = parts.setdefault(y // measure, NoteColumns())
+        part.append(x, y)
+    for index in range(max(parts) + 1):
+        yield parts.get(index, NoteColumns()), (index + 1) * measure
+
+
+@pytest.mark.parametrize("trash_type", ["4th", "8th"])
+def test_stream_matches_batch(trash_type):
+    """小節毎に与えても一括と同じゴミノート"""
+    for name, notes in _bases().items():
+        batch = place_trash(notes, trash_type, random.Random(7), vectorized=False)
+        stream = TrashStream(trash_type, random.Random(7))
+        streamed = NoteColumns()
+        for measure, end_y in _measures(notes):
+            streamed.extend_columns(stream.feed(measure, end_y))
+        streamed.extend_columns(stream.finish())
+        assert list(streamed.x) == list(batch.x) and list(streamed.y) == list(batch.y), name
+
+
+def test_unknown_trash_type():
+    with pytest.raises(ValueError):
+        place_trash(NoteColumns(), "16th", random.Random(0))
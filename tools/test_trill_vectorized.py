@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""トリル譜面のNumPy版とループ版の一致確認"""
+import itertools
+import random
+
+import pytest
+
+from trill_patterns import generate_bmson_notes
+
+pytest.importorskip("numpy")
+
+
+def _same(a, b):
+    return a.to_notes() == b.to_notes()
+
+
+def test_vectorized_matches_loop():
+    """同じレーン組の列ならNumPy版とループ版は同一"""
+    rng = random.Random(0)
+    for bpm in (100, 150, 220):
+        pairs = [tuple(rng.sample(range(1, 8), 2)) for _ in range(200)]
+        loop = generate_bmson_notes(bpm, 2, lane_pairs=pairs, vectorized=False)
+        fast = generate_bmson_notes(bpm, 2, lane_pairs=pairs, vectorized=True)
+        for a, b in zip(loop, fast):
+            assert _same(a, b), f"BPM{bpm}で不一致"
+
+
+def test_endurance_length():
+    """60分の譜面も16分のグリッドを最後まで埋める（速度は benchmark.py で計測）"""
+    pairs = itertools.cycle(itertools.combinations(range(1, 8), 2))
+    notes, scratch_notes, metronome_notes = generate_bmson_notes(240, 60, lane_pairs=pairs, vectorized=True)
+    measures = 240 * 60 // 4
+    assert len(notes) == measures * 16 and notes.y[-1] == (measures * 16 - 1) * 60
+    assert len(scratch_notes) == len(metronome_notes) == measures * 4
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""検証ルール毎の確認（小さなBMSONで各違反を起こす）"""
+import json
+
+from bmson_writer import save_bmson
+from chart_data import NoteColumns, NoteLayers
+from generate_stair_bmson import create_stair_bmson
+from validate_bmson import chart_notes, validate_file, validate_notes
+
+STEP = 60
+
+
+def _bmson(*channels, bpm=120.0):
+    return {
+        "info": {"init_bpm": bpm, "resolution": 240},
+        "bpm_events": [],
+        "stop_events": [],
+        "sound_channels": [{"name": f"{index}.wav", "notes": notes} for index, notes in enumerate(channels)],
+    }
+
+
+def _notes(*pairs):
+    """(x, y) の列をノート辞書のリストにする"""
+    return [{"x": x, "y": y, "l": 0, "c": False} for x, y in pairs]
+
+
+def _counts(bmson):
+    counts, _ = validate_notes(*chart_notes(bmson))
+    return {rule: count for rule, count in counts.items() if count}
+
+
+def test_clean_chart():
+    assert _counts(_bmson(_notes((1, 0), (2, STEP), (1, 2 * STEP), (0, 0), (0, 0)))) == {}
+
+
+def test_vertical_repeat():
+    """隣接する16分の行の縦連は許可数まで（単音同士は0、4鍵＋4鍵は2つまで）"""
+    assert _counts(_bmson(_notes((3, 0), (3, STEP)))) == {"vertical_repeat": 1}
+    # 間に1行あれば縦連ではない
+    assert _counts(_bmson(_notes((3, 0), (3, 2 * STEP)))) == {}
+    four = [1, 2, 3, 4]
+    allowed = _notes(*[(x, 0) for x in four], *[(x, STEP) for x in (1, 2, 5, 6)])
+    assert _counts(_bmson(allowed)) == {}
+    too_many = _notes(*[(x, 0) for x in four], *[(x, STEP) for x in (1, 2, 3, 5)])
+    counts, examples = validate_notes(*chart_notes(_bmson(too_many)))
+    assert counts["vertical_repeat"] == 1
+    assert examples["vertical_repeat"] == [{"y": STEP, "repeats": 3, "allowed": 2}]
+
+
+def test_lane_out_of_range_and_duplicate():
+    bmson = _bmson(_notes((9, 0), (-1, STEP), (2, 4 * STEP), (2, 4 * STEP)))
+    assert _counts(bmson) == {"lane_out_of_range": 2, "duplicate_note": 1}
+    # BGM（レーン0）の重複は許可、スクラッチ（8）は範囲内
+    assert _counts(_bmson(_notes((0, 0), (0, 0), (8, 0)))) == {}
+
+
+def test_overlay_detected_where_y_goes_backwards():
+    """チャンネル内で位置が戻った箇所以降を後から追加された層とみなす"""
+    base = [(1, 0), (2, STEP), (3, 2 * STEP), (4, 3 * STEP)]
+    notes, overlay = chart_notes(_bmson(_notes(*base, (6, STEP), (7, 3 * STEP))))
+    assert notes == [(y, x) for x, y in base] and overlay == [(STEP, 6), (3 * STEP, 7)]
+
+    # 位置順のチャンネル・チャンネルを跨いだ位置の戻りは層にならない
+    assert chart_notes(_bmson(_notes(*base), _notes((6, 0))))[1] == []
+
+    # NoteLayers・NoteColumnsでも同じ
+    columns = NoteColumns([x for x, _ in base], [y for _, y in base])
+    layers = NoteLayers(columns, NoteColumns([6, 7], [STEP, 3 * STEP]))
+    assert chart_notes(_bmson(layers)) == (notes, overlay)
+    assert chart_notes(_bmson(columns)) == (notes, [])
+
+
+def test_trash_collision():
+    """後から追加された層のノートが基本譜面の過去3行〜未来2行のレーンと重なる"""
+    base = _notes((1, 0), (2, STEP), (3, 2 * STEP), (4, 3 * STEP), (5, 4 * STEP), (6, 5 * STEP), (7, 6 * STEP))
+    # 3行目（y=180）に対して過去3行は1-4、未来2行は5-6
+    for lane, expected in [(1, 1), (6, 1), (7, 0)]:
+        counts = _counts(_bmson(base + _notes((lane, 3 * STEP))))
+        assert counts.get("trash_collision", 0) == expected, lane
+    # 層として判別されなければゴミの検査はしない（位置順に並べた同じノート）
+    merged = sorted(base + _notes((7, 3 * STEP)), key=lambda note: note["y"])
+    assert "trash_collision" not in _counts(_bmson(merged))
+
+
+def test_generated_chart_and_short_duration(tmp_path):
+    """生成した譜面は違反なし、--min-seconds より短い譜面は short_duration"""
+    path = str(tmp_path / "chart.bmson")
+    save_bmson(path, create_stair_bmson(150, include_trash=True, seed=3, duration_minutes=0.5))
+    report = validate_file(path)
+    assert report["ok"] and report["seconds"] < 31
+    report = validate_file(path, min_seconds=60)
+    assert not report["ok"] and report["violations"]["short_duration"] == 1
+    assert report["examples"]["short_duration"][0]["required"] == 60
+    json.dumps(report)
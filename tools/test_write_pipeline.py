@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""書き出しパイプラインと一時ファイル経由の保存の確認"""
+import os
+import tempfile
+
+import pytest
+
+from bmson_writer import bmson_bytes, save_bmson
+from generate_bmson import create_bmson
+from write_pipeline import ChartWriter
+
+
+def test_writes_every_chart_in_place():
+    """待ち行列が1つでも全譜面が書かれ、一時ファイルは残らない"""
+    charts = {f"chart_{bpm}.bmson": create_bmson(bpm, seed=bpm) for bpm in range(100, 240, 20)}
+    with tempfile.TemporaryDirectory() as directory:
+        with ChartWriter(threads=2, max_pending=1) as writer:
+            for name, bmson in charts.items():
+                writer.save(os.path.join(directory, name), bmson)
+        assert sorted(os.listdir(directory)) == sorted(charts)
+        for name, bmson in charts.items():
+            with open(os.path.join(directory, name), 'rb') as f:
+                assert f.read() == bmson_bytes(bmson)
+        assert writer.files == len(charts) and "7 files" in writer.summary()
+
+
+def test_write_error_raised_on_close():
+    with tempfile.TemporaryDirectory() as directory:
+        writer = ChartWriter(threads=1)
+        writer.submit(os.path.join(directory, "missing", "chart.bmson"), b"{}")
+        with pytest.raises(FileNotFoundError):
+            writer.close()
+
+
+def test_failed_save_keeps_previous_file():
+    """書き出し中に失敗しても元のファイルは書きかけにならない"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chart.bmson")
+        save_bmson(path, create_bmson(120, seed=1))
+        with open(path, 'rb') as f:
+            previous = f.read()
+
+        broken = create_bmson(120, seed=2)
+        broken["sound_channels"][1]["notes"] = [{"x": 1}]
+        with pytest.raises(KeyError):
+            save_bmson(path, broken)
+        with open(path, 'rb') as f:
+            assert f.read() == previous
+        assert os.listdir(directory) == ["chart.bmson"]
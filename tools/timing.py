@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+パルス位置と時刻（ミリ秒）の変換
+bpm_events・stop_events から区間毎の開始パルス・開始時刻・1パルスの長さを累積配列で持ち、
+ノート列をまとめて二分探索（NumPyがあればsearchsorted）で変換する
+テンポ階段譜面の長さ・秒あたりノート数・長さの検証で共有する
+
+  index = TimingIndex.from_bmson(bmson)
+  times = index.to_ms(ys)
+"""
+import argparse
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:  # NumPyが無い環境ではbisect版のみ
+    np = None
+
+from bmson_reader import BmsonReader
+from chart_data import NoteColumns
+
+BEATS_PER_MEASURE = 4
+
+
+def pulse_ms(bpm, resolution=240):
+    """BPMでの1パルスの長さ（ミリ秒）"""
+    return 60000 / (bpm * resolution)
+
+
+class TimingIndex:
+    """テンポ変化・停止を含む譜面のパルス <-> ミリ秒の変換表
+
+    区間iはパルス ys[i] から始まり、到達時刻 arrive_ms[i]、停止明けの時刻 start_ms[i]、
+    1パルスの長さ ms_per_pulse[i] を持つ（停止は ys[i] ちょうどのノートの後に入る）
+    """
+
+    def __init__(self, init_bpm, bpm_events=(), stop_events=(), resolution=240):
+        self.resolution = resolution
+        changes = {}
+        for event in bpm_events:
+            changes[event["y"]] = event["bpm"]
+        stops = {}
+        for event in stop_events:
+            stops[event["y"]] = stops.get(event["y"], 0) + event["duration"]
+
+        self.ys = [0]
+        self.arrive_ms = [0.0]
+        self.start_ms = [0.0]
+        self.ms_per_pulse = [pulse_ms(changes.get(0, init_bpm), resolution)]
+        for y in sorted(set(changes) | set(stops)):
+            if y < 0:
+                raise ValueError(f"negative event position: {y}")
+            if y > 0:
+                arrive = self.start_ms[-1] + (y - self.ys[-1]) * self.ms_per_pulse[-1]
+                self.ys.append(y)
+                self.arrive_ms.append(arrive)
+                self.start_ms.append(arrive)
+                self.ms_per_pulse.append(pulse_ms(changes[y], resolution) if y in changes else self.ms_per_pulse[-1])
+            # 停止の長さはその位置で有効なBPMでのパルス数
+            self.start_ms[-1] = self.arrive_ms[-1] + stops.get(y, 0) * self.ms_per_pulse[-1]
+        self._arrays = None
+
+    def _numpy(self):
+        """変換表のNumPy配列（初回の一括変換時に作る）"""
+        if self._arrays is None:
+            self._arrays = (np.asarray(self.ys, dtype=np.int64), np.asarray(self.arrive_ms),
+                            np.asarray(self.start_ms), np.asarray(self.ms_per_pulse))
+        return self._arrays
+
+    @classmethod
+    def from_bmson(cls, bmson):
+        """BMSONのinfo.init_bpm・bpm_events・stop_eventsから作る"""
+        info = bmson.get("info", {})
+        return cls(info["init_bpm"], bmson.get("bpm_events") or (), bmson.get("stop_events") or (),
+                   info.get("resolution", 240))
+
+    def ms_at(self, y):
+        """パルス位置 y の時刻（ミリ秒）"""
+        i = bisect_right(self.ys, y) - 1
+        if y == self.ys[i]:
+            return self.arrive_ms[i]
+        return self.start_ms[i] + (y - self.ys[i]) * self.ms_per_pulse[i]
+
+    def pulse_at(self, ms):
+        """時刻 ms（ミリ秒）のパルス位置（停止中はその位置）"""
+        i = bisect_right(self.arrive_ms, ms) - 1
+        return self.ys[i] + max(0.0, ms - self.start_ms[i]) / self.ms_per_pulse[i]
+
+    def to_ms(self, ys, vectorized=None):
+        """パルス位置の列をまとめて時刻に変換
+
+        vectorized: Trueならnumpy（ndarrayを返す）、Falseならbisectのループ（リストを返す）、
+                    Noneならnumpyがあれば使う
+        """
+        if vectorized is None:
+            vectorized = np is not None
+        if not vectorized:
+            return [self.ms_at(y) for y in ys]
+        starts, arrive_ms, start_ms, ms_per_pulse = self._numpy()
+        ys = np.asarray(ys, dtype=np.int64)
+        i = np.searchsorted(starts, ys, side="right") - 1
+        offset = ys - starts[i]
+        return np.where(offset == 0, arrive_ms[i], start_ms[i] + offset * ms_per_pulse[i])
+
+    def to_pulses(self, times, vectorized=None):
+        """時刻（ミリ秒）の列をまとめてパルス位置に変換（vectorizedは to_ms と同じ）"""
+        if vectorized is None:
+            vectorized = np is not None
+        if not vectorized:
+            return [self.pulse_at(ms) for ms in times]
+        starts, arrive_ms, start_ms, ms_per_pulse = self._numpy()
+        times = np.asarray(times, dtype=np.float64)
+        i = np.searchsorted(arrive_ms, times, side="right") - 1
+        return starts[i] + np.maximum(0.0, times - start_ms[i]) / ms_per_pulse[i]
+
+    def measures_ms(self, measures):
+        """先頭から measures 小節の終わりの時刻（ミリ秒）"""
+        return self.ms_at(measures * BEATS_PER_MEASURE * self.resolution)
+
+
+def chart_ys(bmson):
+    """BMSONの全サウンドチャンネルの鍵盤・スクラッチのノート位置
+
+    チャンネルのノートはノート辞書のリスト・NoteColumns・NoteLayersのいずれでもよい
+    """
+    ys = []
+    for channel in bmson.get("sound_channels", []):
+        notes = channel["notes"]
+        if isinstance(notes, NoteColumns):
+            ys.extend(y for x, y in zip(notes.x, notes.y) if x != 0)
+        elif hasattr(notes, "rows"):
+            ys.extend(y for x, y, _, _ in notes.rows() if x != 0)
+        else:
+            ys.extend(note["y"] for note in notes if note["x"] != 0)
+    return ys
+
+
+def nps_profile(times, window_ms=1000, vectorized=None):
+    """時刻（ミリ秒）の列から window_ms 毎のノート数の列を返す"""
+    if vectorized is None:
+        vectorized = np is not None
+    if len(times) == 0:
+        return []
+    if vectorized:
+        buckets = (np.asarray(times, dtype=np.float64) // window_ms).astype(np.int64)
+        return np.bincount(buckets).tolist()
+    counts = [0] * (int(max(times) // window_ms) + 1)
+    for ms in times:
+        counts[int(ms // window_ms)] += 1
+    return counts
+
+
+def chart_timing(bmson, window_ms=1000):
+    """譜面の長さ（最後のノートの時刻、ミリ秒）と秒あたりノート数の列"""
+    ys = chart_ys(bmson)
+    if not ys:
+        return 0.0, []
+    times = TimingIndex.from_bmson(bmson).to_ms(ys)
+    return float(max(times)), nps_profile(times, window_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BMSON譜面の長さと秒あたりノート数を表示")
+    parser.add_argument("paths", nargs="+", help=".bmsonファイル")
+    parser.add_argument("--window", type=float, default=1000, help="ノート数を数える区間の長さ（ミリ秒）")
+    args = parser.parse_args()
+
+    for path in args.paths:
+        with BmsonReader(path) as reader:
+            bmson = reader.to_bmson()
+        duration, profile = chart_timing(bmson, args.window)
+        per_second = 1000 / args.window
+        peak = max(profile, default=0) * per_second
+        mean = sum(profile) / (duration / 1000) if duration > 0 else 0.0
+        minutes, seconds = divmod(duration / 1000, 60)
+        print(f"{path}: {int(minutes)}:{seconds:06.3f}, {sum(profile)} notes, "
+              f"mean {mean:.1f} / peak {peak:.0f} notes/sec")
+
+
+if __name__ == "__main__":
+    main()
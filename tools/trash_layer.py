@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+ゴミノート配置レイヤー
+トリル・階段・乱打のどの基本譜面にも使える共通処理
+- 16分グリッドの各行の使用レーンをビットマスク化
+- 過去3つ・現在・未来2つの行のマスクをORして除外レーンを求める
+- 4分/8分ゴミのタイミングの行ごとに、残りのレーンから1つを一括で選ぶ
+- TrashStream: 小節毎に与えられる基本譜面から同じゴミノートを逐次生成する
+"""
+try:
+    import numpy as np
+except ImportError:  # NumPyが無い環境ではループ版のみ
+    np = None
+
+from chart_data import NoteColumns
+
+# 除外判定に使う前後の行数
+PAST_ROWS = 3
+FUTURE_ROWS = 2
+
+# 鍵盤レーン（1-7）のビット
+KEY_LANES_MASK = 0b11111110
+
+# マスク -> そのマスクに含まれるレーンのタプル
+LANES_BY_MASK = [tuple(lane for lane in range(1, 8) if mask >> lane & 1) for mask in range(256)]
+
+if np is not None:
+    # NumPy版用: マスク -> レーン数, マスク -> レーン（左詰め）
+    _LANE_COUNTS = np.array([len(lanes) for lanes in LANES_BY_MASK], dtype=np.int64)
+    _LANE_TABLE = np.zeros((256, 7), dtype=np.int8)
+    for _mask, _lanes in enumerate(LANES_BY_MASK):
+        _LANE_TABLE[_mask, :len(_lanes)] = _lanes
+
+
+def _trash_slot_filter(trash_type):
+    """16分グリッドの行番号に対するゴミ配置タイミングの (周期, 余り)"""
+    if trash_type == "4th":
+        # 4分音符の位置（2拍目と4拍目）: 拍の中央
+        return 4, 2
+    if trash_type == "8th":
+        # 8分音符の位置（裏拍）
+        return 2, 1
+    raise ValueError(f"未対応のゴミタイプ: {trash_type}")
+
+
+def place_trash(notes, trash_type, rng, resolution=240, vectorized=None):
+    """基本譜面のノート列からゴミノートを生成
+
+    notes: 基本譜面のNoteColumns（鍵盤レーン1-7のノートのみ対象）
+    trash_type: "4th" または "8th"
+    rng: 乱数生成器（random.Random）
+    vectorized: NumPy版を使うか（省略時はNumPyがあれば使う）
+    戻り値: ゴミノートのNoteColumns（位置順）
+    """
+    period, phase = _trash_slot_filter(trash_type)
+    step = resolution // 4
+
+    if vectorized is None:
+        vectorized = np is not None
+    if vectorized:
+        return _place_trash_numpy(notes, period, phase, step, rng)
+    return _place_trash_loop(notes, period, phase, step, rng)
+
+
+def _place_trash_loop(notes, period, phase, step, rng):
+    """ループ版"""
+    rows = {}
+    for x, y in zip(notes.x, notes.y):
+        if 1 <= x <= 7 and y % step == 0:
+            rows[y // step] = rows.get(y // step, 0) | (1 << x)
+
+    trash_notes = NoteColumns()
+    for slot in sorted(rows):
+        if slot % period != phase:
+            continue
+        excluded = 0
+        for neighbor in range(slot - PAST_ROWS, slot + FUTURE_ROWS + 1):
+            excluded |= rows.get(neighbor, 0)
+        lanes = LANES_BY_MASK[~excluded & KEY_LANES_MASK]
+        draw = rng.random()
+        if lanes:
+            trash_notes.append(lanes[int(draw * len(lanes))], slot * step)
+    return trash_notes
+
+
+def _place_trash_numpy(notes, period, phase, step, rng):
+    """NumPy版: 行マスクのスライディングウィンドウとレーン選択を一括で計算"""
+    x = np.frombuffer(notes.x, dtype=np.int8)
+    y = np.frombuffer(notes.y, dtype=np.int32)
+    key = (x >= 1) & (x <= 7) & (y % step == 0)
+    if not key.any():
+        return NoteColumns()
+    slots = (y[key] // step).astype(np.int64)
+    lanes = x[key].astype(np.int64)
+
+    # 各行の使用レーンのマスク（前後に余白を付ける）
+    total_slots = int(slots.max()) + 1
+    grid = np.zeros(total_slots + PAST_ROWS + FUTURE_ROWS, dtype=np.uint8)
+    np.bitwise_or.at(grid, slots + PAST_ROWS, (1 << lanes).astype(np.uint8))
+
+    # 過去3つ〜未来2つの行マスクのOR
+    excluded = np.zeros(total_slots, dtype=np.uint8)
+    for offset in range(PAST_ROWS + FUTURE_ROWS + 1):
+        excluded |= grid[offset:offset + total_slots]
+
+    # ゴミ配置タイミングでノートのある行
+    occupied = grid[PAST_ROWS:PAST_ROWS + total_slots] != 0
+    candidates = np.flatnonzero(occupied & (np.arange(total_slots) % period == phase))
+
+    # 行ごとに1回乱数を引き、使えるレーンから選ぶ
+    draws = np.array([rng.random() for _ in range(candidates.size)])
+    available = (~excluded[candidates]) & KEY_LANES_MASK
+    counts = _LANE_COUNTS[available]
+    placeable = counts > 0
+    picks = (draws[placeable] * counts[placeable]).astype(np.int64)
+    trash_lanes = _LANE_TABLE[available[placeable], picks]
+    return NoteColumns.from_numpy(trash_lanes, candidates[placeable] * step)
+
+
+class TrashStream:
+    """小節単位のゴミノート生成（place_trashと同じ乱数の引き方・同じ結果）
+
+    基本譜面を小節の順に feed し、未来2行まで確定した行のゴミノートを返す
+    保持するのは除外判定に必要な直近の行だけ
+    """
+
+    def __init__(self, trash_type, rng, resolution=240):
+        self.period, self.phase = _trash_slot_filter(trash_type)
+        self.step = resolution // 4
+        self.rng = rng
+        self.rows = {}
+        self.pending = []  # ゴミ配置タイミングでノートのある未確定の行
+
+    def feed(self, notes, end_y):
+        """位置 end_y より前のノートが確定した時点で、配置できるゴミノートを返す"""
+        step = self.step
+        for x, y in zip(notes.x, notes.y):
+            if 1 <= x <= 7 and y % step == 0:
+                slot = y // step
+                if slot not in self.rows:
+                    self.rows[slot] = 0
+                    if slot % self.period == self.phase:
+                        self.pending.append(slot)
+                self.rows[slot] |= 1 << x
+        # end_y より前の行は確定（未来2行も確定した行のゴミを配置できる）
+        return self._resolve(-(-end_y // step) - FUTURE_ROWS)
+
+    def finish(self):
+        """残りの行のゴミノートを返す"""
+        return self._resolve(None)
+
+    def _resolve(self, limit):
+        trash_notes = NoteColumns()
+        self.pending.sort()
+        done = 0
+        for slot in self.pending:
+            if limit is not None and slot >= limit:
+                break
+            excluded = 0
+            for neighbor in range(slot - PAST_ROWS, slot + FUTURE_ROWS + 1):
+                excluded |= self.rows.get(neighbor, 0)
+            lanes = LANES_BY_MASK[~excluded & KEY_LANES_MASK]
+            draw = self.rng.random()
+            if lanes:
+                trash_notes.append(lanes[int(draw * len(lanes))], slot * self.step)
+            done += 1
+        del self.pending[:done]
+
+        # 以降の判定に使わない古い行を捨てる
+        if limit is not None:
+            for slot in [slot for slot in self.rows if slot < limit - PAST_ROWS]:
+                del self.rows[slot]
+        return trash_notes
@@ -3,106 +3,138 @@
 16分トリルパターン設計
 2小節毎に異なる組み合わせで配置
 """
-import random
 import itertools
 
-def trill_pattern_generator():
-    """トリルパターンを無限に生成するジェネレータ"""
-    # 利用可能なレーン（1-7）
-    available_lanes = list(range(1, 8))
-    used_patterns = []
-    
-    # 可能な全ての2つのレーンの組み合わせを生成
-    all_combinations = list(itertools.combinations(available_lanes, 2))
-    
-    while True:
-        # 使用済みパターンを除外した候補を作成
-        candidates = [combo for combo in all_combinations if combo not in used_patterns]
-        
-        # 候補がない場合は使用済みパターンをリセット
-        if not candidates:
-            used_patterns = []
-            candidates = all_combinations.copy()
-        
-        # ランダムに選択
-        selected = random.choice(candidates)
-        used_patterns.append(selected)
-        
-        yield selected
+try:
+    import numpy as np
+except ImportError:  # NumPyが無い環境ではループ版のみ
+    np = None
 
-def generate_bmson_notes(bpm, duration_minutes=2):
-    """BMSONノート配列を生成"""
-    resolution = 240  # 1拍の分解能
+from chart_data import NoteColumns
+from shuffle_bag import ShuffleBag
+
+def trill_pattern_generator(rng=None, avoid_seam=False):
+    """トリルパターンを無限に生成するイテレータ
+    全21通りのレーンの組を使い切るまで重複なし（使い切ったら最初から）
+    rng: 乱数生成器（random.Random、省略時はrandomモジュール）
+    avoid_seam: Trueなら使い切った直後も直前の組を続けない
+    """
+    # 可能な全ての2つのレーンの組み合わせ（1-7）
+    all_combinations = list(itertools.combinations(range(1, 8), 2))
+    return ShuffleBag(all_combinations, rng, avoid_seam=avoid_seam)
+
+def trill_measure_count(bpm, duration_minutes=2, measures_per_pattern=2):
+    """総小節数（duration_minutesを超えるまで2小節単位）"""
     beats_per_measure = 4
-    measures_per_pattern = 2
     
-    # 2分を超えるまで2小節単位で生成
-    # 2分間の総拍数を計算し、2小節単位に切り上げ
+    # 総拍数を計算し、2小節単位に切り上げ
     total_beats = bpm * duration_minutes
-    total_measures = total_beats // beats_per_measure
-    # 2小節単位に切り上げ
+    total_measures = int(total_beats // beats_per_measure)
     if total_measures % measures_per_pattern != 0:
         total_measures = ((total_measures // measures_per_pattern) + 1) * measures_per_pattern
+    return total_measures
+
+def generate_bmson_notes(bpm, duration_minutes=2, lane_pairs=None, vectorized=None, rng=None, total_measures=None):
+    """BMSONノート配列を生成
+    lane_pairs: 2小節毎に使うレーンの組の列（省略時はtrill_pattern_generator(rng)）
+    vectorized: NumPy版を使うか（省略時はNumPyがあれば使う）
+    total_measures: 総小節数（指定時はbpm・duration_minutesより優先、2小節単位）
+    戻り値: (トリル, スクラッチ, メトロノーム) のNoteColumns
+    """
+    measures_per_pattern = 2
+    if total_measures is None:
+        total_measures = trill_measure_count(bpm, duration_minutes, measures_per_pattern)
+    
+    if lane_pairs is None:
+        lane_pairs = trill_pattern_generator(rng)
+    pattern_gen = iter(lane_pairs)
+    pairs = [next(pattern_gen) for _ in range(total_measures // measures_per_pattern)]
+    
+    if vectorized is None:
+        vectorized = np is not None
+    if vectorized:
+        return _generate_trill_numpy(pairs, measures_per_pattern)
+    return _generate_trill_loop(pairs, measures_per_pattern)
+
+def iter_trill_measures(bpm, duration_minutes=2, lane_pairs=None, rng=None, total_measures=None):
+    """1小節ずつ (トリル, スクラッチ, メトロノーム) のNoteColumnsを返すジェネレータ
+    レーンの組は2小節毎に必要になった時点で選ぶ（generate_bmson_notesと同じ結果）
+    """
+    measures_per_pattern = 2
+    if total_measures is None:
+        total_measures = trill_measure_count(bpm, duration_minutes, measures_per_pattern)
     
-    pattern_gen = trill_pattern_generator()
-    notes = []
-    scratch_notes = []
-    metronome_notes = []
+    if lane_pairs is None:
+        lane_pairs = trill_pattern_generator(rng)
+    pattern_gen = iter(lane_pairs)
+    pairs = (next(pattern_gen) for _ in range(total_measures // measures_per_pattern))
+    return _trill_measures(pairs, measures_per_pattern)
+
+def _trill_measures(pairs, measures_per_pattern):
+    """レーンの組の列から1小節ずつノートを配置（小節→拍→16分の順）"""
+    resolution = 240  # 1拍の分解能
+    beats_per_measure = 4
     
     current_y = 0
-    current_pattern = None
+    sixteenth_offsets = [sixteenth * resolution // 4 for sixteenth in range(4)]
     
-    for measure in range(total_measures):
-        # 2小節毎にパターン変更
-        if measure % measures_per_pattern == 0:
-            current_pattern = next(pattern_gen)
+    for lane1, lane2 in pairs:
+        # トリルの2つのレーンを16分音符ごとに交互配置
+        trill_lanes = [lane1, lane2, lane1, lane2]
         
-        # 各小節の16分音符配置
-        for beat in range(beats_per_measure):
-            beat_y = current_y + (beat * resolution)
-            
-            # メトロノーム（4分音符毎）
-            metronome_notes.append({
-                "x": 0,  # BGMチャンネル
-                "y": beat_y,
-                "l": 0,
-                "c": False
-            })
+        # 2小節毎にパターン変更
+        for _ in range(measures_per_pattern):
+            notes = NoteColumns()
+            scratch_notes = NoteColumns()
+            metronome_notes = NoteColumns()
             
-            # 16分音符のトリル配置
-            for sixteenth in range(4):
-                note_y = beat_y + (sixteenth * resolution // 4)
-                # トリルの2つのレーンを交互に配置
-                lane1, lane2 = current_pattern
+            # 各小節の16分音符配置
+            for beat in range(beats_per_measure):
+                beat_y = current_y + (beat * resolution)
                 
-                # 16分音符ごとに交互配置
-                if sixteenth % 2 == 0:
-                    notes.append({
-                        "x": lane1,
-                        "y": note_y,
-                        "l": 0,
-                        "c": False
-                    })
-                else:
-                    notes.append({
-                        "x": lane2,
-                        "y": note_y,
-                        "l": 0,
-                        "c": False
-                    })
-        
-        # 4分音符毎にスクラッチ
-        for beat in range(beats_per_measure):
-            scratch_y = current_y + (beat * resolution)
-            scratch_notes.append({
-                "x": 8,  # スクラッチレーン
-                "y": scratch_y,
-                "l": 0,
-                "c": False
-            })
-        
-        current_y += beats_per_measure * resolution
+                # メトロノーム（4分音符毎、BGMチャンネル）
+                metronome_notes.append(0, beat_y)
+                
+                # 16分音符のトリル配置
+                notes.extend(trill_lanes, [beat_y + offset for offset in sixteenth_offsets])
+            
+            # 4分音符毎にスクラッチ
+            for beat in range(beats_per_measure):
+                scratch_notes.append(8, current_y + (beat * resolution))
+            
+            current_y += beats_per_measure * resolution
+            yield notes, scratch_notes, metronome_notes
+
+def _generate_trill_loop(pairs, measures_per_pattern):
+    """ループ版: 1小節ずつ配置したノートを連結"""
+    notes = NoteColumns()
+    scratch_notes = NoteColumns()
+    metronome_notes = NoteColumns()
+    
+    for measure_notes, measure_scratch, measure_metronome in _trill_measures(pairs, measures_per_pattern):
+        notes.extend_columns(measure_notes)
+        scratch_notes.extend_columns(measure_scratch)
+        metronome_notes.extend_columns(measure_metronome)
+    
+    return notes, scratch_notes, metronome_notes
+
+def _generate_trill_numpy(pairs, measures_per_pattern):
+    """NumPy版: パルス位置をarangeで一括生成し、各ブロックのレーン組を繰り返して配置"""
+    resolution = 240
+    beats_per_measure = 4
+    notes_per_block = measures_per_pattern * beats_per_measure * 4
+    
+    # 2小節ブロック毎のレーン組を (lane1, lane2) × 16 に展開
+    pair_array = np.array(pairs, dtype=np.int8).reshape(-1, 2)
+    lanes = np.tile(pair_array, (1, notes_per_block // 2)).ravel()
+    pulses = np.arange(lanes.size, dtype=np.int32) * (resolution // 4)
+    
+    # メトロノームとスクラッチは4分音符の同じグリッド
+    beat_pulses = np.arange(len(pairs) * measures_per_pattern * beats_per_measure, dtype=np.int32) * resolution
     
+    notes = NoteColumns.from_numpy(lanes, pulses)
+    scratch_notes = NoteColumns.from_numpy(np.full(beat_pulses.size, 8, dtype=np.int8), beat_pulses)
+    metronome_notes = NoteColumns.from_numpy(np.zeros(beat_pulses.size, dtype=np.int8), beat_pulses)
     return notes, scratch_notes, metronome_notes
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+BMSON譜面の検証
+ノートを(位置, レーン)で一度だけソートし、1パスで以下を検査する
+- vertical_repeat: 隣接する16分の行で許可数（前の同時押し数 + 今回 - 6）を超える縦連
+- trash_collision: ゴミノートが基本譜面の過去3つ・現在・未来2つの行のレーンと重なる
+  （ゴミはチャンネル内で基本譜面の後ろに追加された層として判別する）
+- lane_out_of_range: レーン0（BGM）と1-8以外のノート
+- duplicate_note: 同じ (x, y) のノートが複数
+- short_duration: 最後のノートの時刻が --min-seconds に満たない（テンポ変化・停止を含めて計算）
+レポートには譜面の長さと秒あたりノート数（平均・最大）も記録する
+ファイルまたはディレクトリ（配下の全.bmsonを並列に検査）を指定し、結果をJSONで出力する
+ファイルは bmson_reader で読み、ノートは列指向の配列のまま検査する
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from bmson_reader import BmsonReader
+from chart_data import NoteColumns
+from random_patterns import allowed_repeat
+from timing import chart_timing
+
+# 除外判定に使う前後の行数（trash_layerと同じ）
+PAST_ROWS = 3
+FUTURE_ROWS = 2
+
+RULES = ["vertical_repeat", "trash_collision", "lane_out_of_range", "duplicate_note", "short_duration"]
+
+
+def chart_notes(bmson):
+    """全サウンドチャンネルのノートを (y, x) のリストで返す
+
+    戻り値: (基本譜面のノート, ゴミなど後から追加された層のノート)
+    各チャンネルで位置が戻った箇所以降を後から追加された層とみなす
+    チャンネルのノートはノート辞書のリスト・NoteColumns・NoteLayersのいずれでもよい
+    """
+    notes = []
+    overlay = []
+    for channel in bmson.get("sound_channels", []):
+        channel_notes = channel["notes"]
+        if isinstance(channel_notes, NoteColumns):
+            rows = zip(channel_notes.y, channel_notes.x)
+        elif hasattr(channel_notes, "rows"):
+            rows = ((y, x) for x, y, _, _ in channel_notes.rows())
+        else:
+            rows = ((note["y"], note["x"]) for note in channel_notes)
+        target = notes
+        previous_y = None
+        for y, x in rows:
+            if previous_y is not None and y < previous_y:
+                target = overlay
+            target.append((y, x))
+            previous_y = y
+    return notes, overlay
+
+
+def chart_rows(notes):
+    """ソート済みの (y, x) の列から、鍵盤レーン（1-7）の行を (y, マスク) で順に返す"""
+    row_y = None
+    mask = 0
+    for y, x in notes:
+        if not 1 <= x <= 7:
+            continue
+        if y != row_y:
+            if row_y is not None:
+                yield row_y, mask
+            row_y, mask = y, 0
+        mask |= 1 << x
+    if row_y is not None:
+        yield row_y, mask
+
+
+def validate_notes(notes, overlay=(), resolution=240, max_examples=10):
+    """ノート列を検証し、ルール毎の違反数と例（位置）を返す
+
+    notes: 基本譜面の (y, x) のリスト
+    overlay: ゴミノートなど後から追加された層の (y, x) のリスト
+    """
+    step = resolution // 4
+    counts = dict.fromkeys(RULES, 0)
+    examples = {rule: [] for rule in RULES}
+
+    def report(rule, y, detail):
+        counts[rule] += 1
+        if len(examples[rule]) < max_examples:
+            examples[rule].append({"y": y, **detail})
+
+    all_notes = sorted(list(notes) + list(overlay))
+
+    # レーン範囲と重複
+    previous = None
+    for y, x in all_notes:
+        if not 0 <= x <= 8:
+            report("lane_out_of_range", y, {"x": x})
+        if (y, x) == previous and x != 0:
+            report("duplicate_note", y, {"x": x})
+        previous = (y, x)
+
+    # 縦連（隣接する16分の行同士）
+    prev_y, prev_mask = None, 0
+    for y, mask in chart_rows(all_notes):
+        if prev_y is not None and y - prev_y == step:
+            repeats = bin(prev_mask & mask).count("1")
+            limit = allowed_repeat(bin(prev_mask).count("1"), bin(mask).count("1"))
+            if repeats > limit:
+                report("vertical_repeat", y, {"repeats": repeats, "allowed": limit})
+        prev_y, prev_mask = y, mask
+
+    # ゴミノート（基本譜面の過去3つ〜未来2つの行のレーンと重ならない）
+    if overlay:
+        base_masks = dict(chart_rows(sorted(notes)))
+        for y, x in sorted(overlay):
+            if not 1 <= x <= 7:
+                continue
+            window = 0
+            for offset in range(-PAST_ROWS, FUTURE_ROWS + 1):
+                window |= base_masks.get(y + offset * step, 0)
+            if window >> x & 1:
+                report("trash_collision", y, {"x": x})
+
+    return counts, examples
+
+
+def validate_file(path, max_examples=10, min_seconds=None):
+    """1ファイルを検証してレポートを返す
+
+    min_seconds: 指定時は最後のノートの時刻がこれに満たない譜面を short_duration とする
+    """
+    with BmsonReader(path) as reader:
+        bmson = reader.to_bmson()
+    notes, overlay = chart_notes(bmson)
+    resolution = bmson.get("info", {}).get("resolution", 240)
+    counts, examples = validate_notes(notes, overlay, resolution, max_examples)
+
+    duration_ms, profile = chart_timing(bmson)
+    if min_seconds is not None and duration_ms < min_seconds * 1000:
+        counts["short_duration"] = 1
+        examples["short_duration"].append({"seconds": duration_ms / 1000, "required": min_seconds})
+    return {
+        "path": path,
+        "notes": sum(1 for _, x in notes + overlay if x != 0),
+        "seconds": round(duration_ms / 1000, 3),
+        "nps": {
+            "mean": round(sum(profile) * 1000 / duration_ms, 2) if duration_ms > 0 else 0.0,
+            "peak": max(profile, default=0),
+        },
+        "ok": not any(counts.values()),
+        "violations": counts,
+        "examples": {rule: found for rule, found in examples.items() if found},
+    }
+
+
+def collect_paths(targets):
+    """ファイル・ディレクトリの指定から.bmsonファイルを列挙"""
+    paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            for root, _, files in os.walk(target):
+                paths.extend(os.path.join(root, name) for name in files if name.endswith(".bmson"))
+        else:
+            paths.append(target)
+    return sorted(paths)
+
+
+def validate_paths(paths, workers=None, max_examples=10, min_seconds=None):
+    """複数ファイルを並列に検証"""
+    if workers == 1 or len(paths) <= 1:
+        return [validate_file(path, max_examples, min_seconds) for path in paths]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(validate_file, paths, [max_examples] * len(paths),
+                                 [min_seconds] * len(paths), chunksize=8))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BMSON譜面の縦連・ゴミ・レーン・重複・長さを検証")
+    parser.add_argument("targets", nargs="+", help=".bmsonファイルまたはディレクトリ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="ワーカープロセス数（1で直列実行）")
+    parser.add_argument("--output", help="レポートの出力先（省略時は標準出力）")
+    parser.add_argument("--max-examples", type=int, default=10,
+                        help="ルール毎に記録する違反例の数")
+    parser.add_argument("--min-seconds", type=float,
+                        help="最後のノートの時刻がこれに満たない譜面を違反とする")
+    args = parser.parse_args()
+
+    reports = validate_paths(collect_paths(args.targets), args.workers, args.max_examples, args.min_seconds)
+    totals = dict.fromkeys(RULES, 0)
+    for report in reports:
+        for rule, count in report["violations"].items():
+            totals[rule] += count
+    result = {
+        "files": len(reports),
+        "failed": sum(not report["ok"] for report in reports),
+        "violations": totals,
+        "reports": reports,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+    else:
+        json.dump(result, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    print(f"{result['files']} files, {result['failed']} failed: {totals}", file=sys.stderr)
+    sys.exit(1 if result["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
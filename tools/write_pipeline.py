@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+譜面の書き出しパイプライン
+呼び出し側のスレッドが譜面を生成してバイト列にし、書き込みスレッドがファイルへ書く
+（生成・JSON化のCPU処理とディスクへの書き込みを重ねる）
+待ちの譜面数は max_pending までで、超えると save は書き込みが追いつくまで待つ
+各ファイルは一時ファイルに書いてから置き換える（bmson_writer.save_bytes）
+
+  with ChartWriter() as writer:
+      with writer.generating():
+          bmson = create_bmson(...)
+      writer.save(path, bmson)
+  print(writer.summary())
+"""
+import contextlib
+import queue
+import threading
+import time
+
+from bmson_writer import bmson_bytes, save_bytes
+
+# 書き込みスレッドの終了の合図
+_STOP = object()
+
+
+class ChartWriter:
+    """生成と並行してファイルを書き込むスレッドと、待ちの譜面の上限付きの待ち行列
+
+    threads: 書き込みスレッド数
+    max_pending: 書き込み待ちの譜面数の上限（メモリに載るバイト列の数）
+    """
+
+    def __init__(self, threads=2, max_pending=8):
+        self.threads = threads
+        self.max_pending = max_pending
+        self.files = 0
+        self.bytes = 0
+        self.generate_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.write_seconds = 0.0
+        self.wait_seconds = 0.0
+        self.elapsed = 0.0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._errors = []
+        self._start = time.perf_counter()
+        self._workers = [threading.Thread(target=self._run, name=f"chart-writer-{index}", daemon=True)
+                         for index in range(threads)]
+        for worker in self._workers:
+            worker.start()
+
+    def _run(self):
+        """書き込みスレッド: 待ち行列のバイト列をファイルへ書く"""
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            path, data = item
+            start = time.perf_counter()
+            try:
+                save_bytes(path, data)
+            except Exception as error:  # 呼び出し側のスレッドで送出し直す
+                with self._lock:
+                    self._errors.append(error)
+                continue
+            seconds = time.perf_counter() - start
+            with self._lock:
+                self.files += 1
+                self.bytes += len(data)
+                self.write_seconds += seconds
+
+    @contextlib.contextmanager
+    def generating(self):
+        """ブロック内の時間を生成時間として数える"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.generate_seconds += time.perf_counter() - start
+
+    def submit(self, path, data):
+        """バイト列の書き込みを予約（待ち行列が一杯なら空くまで待つ）"""
+        self._raise_error()
+        start = time.perf_counter()
+        self._queue.put((path, data))
+        self.wait_seconds += time.perf_counter() - start
+
+    def save(self, path, bmson, compact=True):
+        """BMSONをバイト列にして書き込みを予約"""
+        start = time.perf_counter()
+        data = bmson_bytes(bmson, compact)
+        self.serialize_seconds += time.perf_counter() - start
+        self.submit(path, data)
+
+    def close(self):
+        """全ての書き込みを終えてスレッドを止める（書き込みの失敗はここで送出）"""
+        if self._workers:
+            for _ in self._workers:
+                self._queue.put(_STOP)
+            for worker in self._workers:
+                worker.join()
+            self._workers = []
+            self.elapsed = time.perf_counter() - self._start
+        self._raise_error()
+
+    def _raise_error(self):
+        with self._lock:
+            if self._errors:
+                raise self._errors[0]
+
+    def summary(self):
+        """生成・JSON化・書き込みの時間の内訳"""
+        return (f"{self.files} files ({self.bytes / 1e6:.1f} MB) in {self.elapsed:.2f}s: "
+                f"generate {self.generate_seconds:.2f}s, serialize {self.serialize_seconds:.2f}s, "
+                f"write {self.write_seconds:.2f}s on {self.threads} threads, "
+                f"waited {self.wait_seconds:.2f}s for the write queue")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.close()
+        else:
+            # 例外時は予約済みの書き込みだけ終えて、元の例外を優先する
+            with contextlib.suppress(Exception):
+                self.close()
+        return False